@@ -0,0 +1,221 @@
+import pandas as pd
+import requests
+
+from database_manager import InsufficientStockError, RESERVATION_TTL
+from pick_route import PICK_COLUMNS
+from pricing_simulator import SCENARIO_COLUMNS
+from sales_cube import TREND_COLUMNS, GENRE_COLUMNS, BEST_SELLER_COLUMNS, COMPARE_COLUMNS
+from stock_alerts import DEFAULT_THRESHOLD
+
+BOOK_COLUMNS = ["id", "title", "author", "genre", "description", "shelf_position", "buy_price", "sell_price", "stock"]
+ORDER_COLUMNS = ["id", "total_qty", "total_amount", "created_at"]
+ORDER_ITEM_COLUMNS = ["id", "title", "quantity", "unit_price", "total"]
+REVENUE_COLUMNS = ["book_id", "title", "quantity", "total_amount", "profit"]
+
+
+def _frame(rows, columns):
+    # Giữ đủ cột kể cả khi không có dòng nào, giống pd.read_sql_query
+    return pd.DataFrame(rows, columns=columns)
+
+
+class RemoteDatabaseManager:
+    """
+    Adapter mỏng có cùng interface với DatabaseManager nhưng gọi tới api_server
+    thay vì mở trực tiếp file SQLite.
+    """
+
+    def __init__(self, base_url, timeout=10):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()  # giữ kết nối keep-alive
+
+    def _request(self, method, path, **kwargs):
+        response = self.session.request(method, f"{self.base_url}{path}", timeout=self.timeout, **kwargs)
+        if response.status_code == 404 and path.startswith("/books/lookup"):
+            return None
+        if response.status_code == 409:
+            body = response.json()
+            raise InsufficientStockError(body["book_id"], body["requested"], body["available"])
+        if response.status_code >= 400:
+            try:
+                message = response.json().get("error", response.text)
+            except ValueError:
+                message = response.text
+            if response.status_code < 500:
+                raise ValueError(message)
+            raise RuntimeError(f"API error {response.status_code}: {message}")
+        return response.json()
+
+    #Books
+    def add_book(self, title, author, genre, description, shelf_position, buy_price, sell_price, stock):
+        self._request("POST", "/books", json={
+            "title": title, "author": author, "genre": genre, "description": description,
+            "shelf_position": shelf_position, "buy_price": buy_price,
+            "sell_price": sell_price, "stock": stock,
+        })
+
+    def import_books(self, books):
+        for book in books:
+            self.add_book(**book)
+        return len(books)
+
+    def delete_book(self, book_id):
+        self._request("DELETE", f"/books/{int(book_id)}")
+
+    def get_books(self):
+        return _frame(self._request("GET", "/books"), BOOK_COLUMNS)
+
+    def find_book(self, title_or_id):
+        return self._request("GET", "/books/lookup", params={"q": str(title_or_id)})
+
+    def get_book_id(self, title):
+        book = self.find_book(title)
+        return book["id"] if book else None
+
+    def get_books_by_genre(self, genre, limit=10):
+        return self._request("GET", "/books/by-genre", params={"genre": genre, "limit": limit})
+
+    def get_book_translations(self, lang, book_ids=None):
+        params = {"lang": lang}
+        if book_ids is not None:
+            params["ids"] = ",".join(str(int(b)) for b in book_ids)
+        # Khoá JSON là chuỗi
+        return {int(k): v for k, v in self._request("GET", "/books/translations", params=params).items()}
+
+    def set_book_translation(self, book_id, lang, **fields):
+        self._request("POST", f"/books/{int(book_id)}/translations", json=dict(fields, lang=lang))
+
+    #Reservations
+    def get_available_stock(self, book_id):
+        return self._request("GET", f"/books/{int(book_id)}/available")["available"]
+
+    def reserve_stock(self, cart_id, book_id, quantity, ttl=RESERVATION_TTL):
+        body = {"cart_id": cart_id, "book_id": int(book_id), "quantity": int(quantity), "ttl": ttl}
+        return self._request("POST", "/reservations", json=body)["remaining"]
+
+    def release_reservations(self, cart_id, book_id=None):
+        params = {"book_id": int(book_id)} if book_id is not None else None
+        return self._request("DELETE", f"/reservations/{cart_id}", params=params)["released"]
+
+    def sweep_expired_reservations(self):
+        # Server tự chạy sweeper riêng
+        return 0
+
+    #Orders
+    def create_order(self, items, cart_id=None):
+        payload = [
+            {k: it[k] for k in ("book_id", "quantity", "unit_price", "total")}
+            for it in items
+        ]
+        return self._request("POST", "/orders", json={"items": payload, "cart_id": cart_id})
+
+    def get_orders(self):
+        return _frame(self._request("GET", "/orders"), ORDER_COLUMNS)
+
+    def get_order_items(self, order_id):
+        return _frame(self._request("GET", f"/orders/{order_id}/items"), ORDER_ITEM_COLUMNS)
+
+    def get_order_history(self, keyword=None):
+        params = {"keyword": keyword} if keyword else None
+        return [tuple(row) for row in self._request("GET", "/orders/history", params=params)]
+
+    def search_orders(self, order_prefix=None, start_date=None, end_date=None,
+                      min_amount=None, max_amount=None, after=None, limit=200, date_prefix=None):
+        params = {
+            "prefix": order_prefix, "date_prefix": date_prefix, "start": start_date, "end": end_date,
+            "min_amount": min_amount, "max_amount": max_amount, "limit": limit,
+        }
+        if after:
+            params["after_created_at"], params["after_id"] = after
+        params = {k: v for k, v in params.items() if v is not None}
+        return [tuple(row) for row in self._request("GET", "/orders/search", params=params)]
+
+    def get_order_details(self, order_id):
+        return [tuple(row) for row in self._request("GET", f"/orders/{order_id}/details")]
+
+    #Reports
+    def get_revenue(self, start_date=None, end_date=None):
+        params = {k: v for k, v in (("start", start_date), ("end", end_date)) if v}
+        return _frame(self._request("GET", "/reports/revenue", params=params), REVENUE_COLUMNS)
+
+    def get_expenses(self, start_date=None, end_date=None):
+        df = self.get_revenue(start_date, end_date)
+        df["total_cost"] = df["total_amount"] - df["profit"]
+        return df[["book_id", "title", "quantity", "total_cost"]]
+
+    def _report(self, path, columns, **params):
+        params = {k: v for k, v in params.items() if v is not None}
+        return _frame(self._request("GET", path, params=params), columns)
+
+    def get_sales_trend(self, grain="month", start_date=None, end_date=None, genre=None):
+        return self._report("/reports/trend", TREND_COLUMNS, grain=grain, start=start_date, end=end_date, genre=genre)
+
+    def get_genre_share(self, start_date=None, end_date=None):
+        return self._report("/reports/genres", GENRE_COLUMNS, start=start_date, end=end_date)
+
+    def get_best_sellers(self, n=10, start_date=None, end_date=None, by="revenue", genre=None):
+        return self._report("/reports/best-sellers", BEST_SELLER_COLUMNS,
+                            n=n, start=start_date, end=end_date, by=by, genre=genre)
+
+    def compare_sales_periods(self, start_date, end_date, by=None):
+        return self._report("/reports/compare", COMPARE_COLUMNS, start=start_date, end=end_date, by=by)
+
+    def simulate_pricing(self, scenarios=None, horizon_days=30):
+        if scenarios is None:
+            return self._report("/reports/pricing", SCENARIO_COLUMNS, horizon=horizon_days)
+        rows = self._request("POST", "/reports/pricing", json={"scenarios": scenarios, "horizon_days": horizon_days})
+        return _frame(rows, SCENARIO_COLUMNS)
+
+    #Recommendations
+    def get_recommendations(self, book_id, k=5):
+        return self._request("GET", f"/books/{int(book_id)}/recommendations", params={"k": k})
+
+    def get_cart_recommendations(self, book_ids, k=5):
+        books = ",".join(str(int(b)) for b in book_ids)
+        return self._request("GET", "/recommendations", params={"books": books, "k": k})
+
+    #Picking
+    def plan_pick_route(self, order_ids):
+        plan = self._request("GET", "/pick-list", params={"orders": ",".join(str(o) for o in order_ids)})
+        return dict(plan, picks=_frame(plan["picks"], PICK_COLUMNS))
+
+    def plan_cart_pick_route(self, items):
+        body = {"items": [{"book_id": int(it["book_id"]), "quantity": int(it["quantity"])} for it in items]}
+        plan = self._request("POST", "/pick-list", json=body)
+        return dict(plan, picks=_frame(plan["picks"], PICK_COLUMNS))
+
+    #Stock alerts
+    def get_low_stock(self):
+        return self._request("GET", "/stock-alerts")
+
+    def get_stock_events(self, after=0, limit=200):
+        return self._request("GET", "/stock-alerts/events", params={"after": after, "limit": limit})
+
+    def get_stock_alert_status(self):
+        return self._request("GET", "/stock-alerts/status")
+
+    def set_reorder_threshold(self, scope, key=None, threshold=DEFAULT_THRESHOLD, reorder_qty=None):
+        body = {"scope": scope, "key": key, "threshold": threshold, "reorder_qty": reorder_qty}
+        self._request("POST", "/stock-alerts/rules", json=body)
+
+    def restock_books(self, items):
+        body = {"items": [{"book_id": int(b), "quantity": int(q)} for b, q in items]}
+        return self._request("POST", "/restock", json=body)["restocked"]
+
+    #Maintenance
+    def get_maintenance_status(self):
+        return self._request("GET", "/maintenance")
+
+    def run_maintenance(self, name):
+        """Yêu cầu server chạy ngay một task bảo trì (chạy nền trên server, xem get_maintenance_status)."""
+        self._request("POST", "/maintenance/run", json={"task": name})
+
+    def data_version(self):
+        return tuple(self._request("GET", "/data-version")["data_version"])
+
+    def table_versions(self, *tables):
+        body = self._request("GET", "/table-versions", params={"tables": ",".join(tables)})
+        return tuple(v if not isinstance(v, list) else tuple(v) for v in body["versions"])
+
+    def close(self):
+        self.session.close()
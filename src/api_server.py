@@ -0,0 +1,673 @@
+"""
+Headless HTTP/JSON server cho nhiều quầy thu ngân (POS) dùng chung một database.
+
+Chạy:  python api_server.py --db bookstore.db --port 8765
+Quầy dùng server:  BOOKSTORE_API_URL=http://127.0.0.1:8765 python main.py
+"""
+import argparse
+import json
+import logging
+import queue
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import instrumentation
+from backup_manager import BackupManager
+from cache_utils import LRUCache
+from database_manager import DatabaseManager, InsufficientStockError, RESERVATION_TTL
+from maintenance import MaintenanceScheduler
+from stock_alerts import DEFAULT_THRESHOLD
+from sync_engine import LocalCentral
+
+
+def _json_default(value):
+    # numpy / pandas scalar -> python scalar
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+def _records(df):
+    return df.to_dict(orient="records")
+
+
+class ReaderPool:
+    """Pool các kết nối chỉ-đọc tới cùng một file database."""
+
+    def __init__(self, db_name, size=4):
+        self._pool = queue.Queue()
+        for _ in range(size):
+            self._pool.put(DatabaseManager(db_name, read_only=True))
+
+    @contextmanager
+    def reader(self):
+        db = self._pool.get()
+        try:
+            yield db
+        finally:
+            self._pool.put(db)
+
+    def close(self):
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+
+
+class BookStoreService:
+    """Một writer duy nhất + các reader dùng chung, với cache cho các truy vấn đọc."""
+
+    def __init__(self, db_name="bookstore.db", readers=4, cache_size=256):
+        self.writer = DatabaseManager(db_name)
+        # WAL cho phép reader đọc song song khi writer đang ghi
+        self.writer.conn.execute("PRAGMA journal_mode=WAL")
+        self._write_lock = threading.Lock()
+        self.readers = ReaderPool(db_name, readers)
+        self.cache = LRUCache(cache_size)
+        # Khoá cache: PRAGMA data_version của một kết nối riêng chỉ đổi khi kết nối khác (writer, tiến trình
+        # khác) commit; total_changes của writer đổi cả khi transaction chưa commit
+        self._version_conn = sqlite3.connect(db_name, check_same_thread=False)
+        self._version_lock = threading.Lock()
+        self.stopped = threading.Event()
+        self._central = None
+        self.maintenance = None  # MaintenanceScheduler, gán bởi make_server
+
+    def _version(self):
+        """Đọc trước khi fn mở snapshot, nên kết quả cache không bao giờ cũ hơn khoá của nó."""
+        with self._version_lock:
+            return self._version_conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _cached_read(self, key, fn):
+        key = (key, self._version())
+        result = self.cache.get(key)
+        if result is None:
+            with self.readers.reader() as db:
+                result = fn(db)
+            self.cache.put(key, result)
+        return result
+
+    # Reads
+    def get_books(self):
+        return self._cached_read(("books",), lambda db: _records(db.get_books()))
+
+    def find_book(self, title_or_id):
+        return self._cached_read(("find_book", title_or_id), lambda db: db.find_book(title_or_id))
+
+    def get_books_by_genre(self, genre, limit=10):
+        return self._cached_read(("by_genre", genre, limit), lambda db: db.get_books_by_genre(genre, limit))
+
+    def get_book_translations(self, lang, book_ids=None):
+        key = ("translations", lang, tuple(book_ids) if book_ids is not None else None)
+        return self._cached_read(key, lambda db: db.get_book_translations(lang, book_ids))
+
+    def get_orders(self):
+        return self._cached_read(("orders",), lambda db: _records(db.get_orders()))
+
+    def get_order_items(self, order_id):
+        return self._cached_read(("order_items", order_id), lambda db: _records(db.get_order_items(order_id)))
+
+    def get_order_history(self, keyword=None):
+        return self._cached_read(("history", keyword), lambda db: db.get_order_history(keyword))
+
+    def search_orders(self, **filters):
+        key = ("search_orders",) + tuple(sorted((k, v if not isinstance(v, list) else tuple(v))
+                                                for k, v in filters.items()))
+        return self._cached_read(key, lambda db: db.search_orders(**filters))
+
+    def get_order_details(self, order_id):
+        return self._cached_read(("details", order_id), lambda db: db.get_order_details(order_id))
+
+    def get_revenue(self, start_date=None, end_date=None):
+        return self._cached_read(
+            ("revenue", start_date, end_date),
+            lambda db: _records(db.get_revenue(start_date, end_date)),
+        )
+
+    # Cube doanh số và ma trận gợi ý nằm trên writer: refresh cần ghi bảng tổng hợp
+    def _writer_read(self, key, fn):
+        key = (key, self._version())
+        result = self.cache.get(key)
+        if result is None:
+            with self._write_lock:
+                result = fn(self.writer)
+            self.cache.put(key, result)
+        return result
+
+    def _cube_read(self, key, fn):
+        return self._writer_read(key, lambda db: _records(fn(db)))
+
+    def get_sales_trend(self, grain="month", start_date=None, end_date=None, genre=None):
+        return self._cube_read(("trend", grain, start_date, end_date, genre),
+                               lambda db: db.get_sales_trend(grain, start_date, end_date, genre))
+
+    def get_genre_share(self, start_date=None, end_date=None):
+        return self._cube_read(("genres", start_date, end_date),
+                               lambda db: db.get_genre_share(start_date, end_date))
+
+    def get_best_sellers(self, n=10, start_date=None, end_date=None, by="revenue", genre=None):
+        return self._cube_read(("best_sellers", n, start_date, end_date, by, genre),
+                               lambda db: db.get_best_sellers(n, start_date, end_date, by, genre))
+
+    def compare_sales_periods(self, start_date, end_date, by=None):
+        return self._cube_read(("compare", start_date, end_date, by),
+                               lambda db: db.compare_sales_periods(start_date, end_date, by))
+
+    def simulate_pricing(self, scenarios=None, horizon_days=30):
+        key = ("pricing", json.dumps(scenarios, sort_keys=True), horizon_days)
+        return self._cube_read(key, lambda db: db.simulate_pricing(scenarios, horizon_days))
+
+    def plan_pick_route(self, order_ids=None, items=None):
+        def plan(db):
+            result = db.plan_pick_route(order_ids) if order_ids else db.plan_cart_pick_route(items)
+            return dict(result, picks=_records(result["picks"]))
+        key = ("pick_route", tuple(order_ids or ()), json.dumps(items, sort_keys=True))
+        return self._writer_read(key, plan)
+
+    def get_recommendations(self, book_id, k=5):
+        return self._writer_read(("recommend", book_id, k), lambda db: db.get_recommendations(book_id, k))
+
+    def get_cart_recommendations(self, book_ids, k=5):
+        key = ("recommend_cart", tuple(sorted(book_ids)), k)
+        return self._writer_read(key, lambda db: db.get_cart_recommendations(book_ids, k))
+
+    def build_recommendations(self):
+        """Dựng ma trận gợi ý lần đầu (lâu với lịch sử lớn) trước khi có request cần tới."""
+        try:
+            with self._write_lock:
+                self.writer.recommender().refresh()
+        except Exception as e:
+            logging.error(f"Building recommendations failed: {e}")
+
+    def get_available_stock(self, book_id):
+        with self.readers.reader() as db:
+            return db.get_available_stock(book_id)
+
+    def get_low_stock(self):
+        return self._cached_read(("low_stock",), lambda db: db.get_low_stock())
+
+    def get_stock_events(self, after=0, limit=200):
+        return self._cached_read(("stock_events", after, limit), lambda db: db.get_stock_events(after, limit))
+
+    def get_stock_alert_status(self):
+        return self._cached_read(("stock_alert_status",), lambda db: db.get_stock_alert_status())
+
+    # Bảo trì: trạng thái đọc từ bảng maintenance_tasks (chung cho mọi tiến trình dùng database này)
+    def get_maintenance_status(self):
+        if self.maintenance is not None:
+            return self.maintenance.status()
+        with self.readers.reader() as db:
+            return db.get_maintenance_status()
+
+    def run_maintenance(self, name):
+        """Chạy ngay một task ở thread nền (VACUUM có thể lâu hơn timeout của client)."""
+        if self.maintenance is None:
+            raise ValueError("Maintenance scheduler is disabled on this server")
+        if name not in self.maintenance.tasks:
+            raise ValueError(f"Unknown maintenance task: {name}")
+        threading.Thread(target=self.maintenance.run, args=(name,), name=f"maintenance-{name}", daemon=True).start()
+
+    def data_version(self):
+        return [self._version()]
+
+    def table_versions(self, tables):
+        with self.readers.reader() as db:
+            return list(db.table_versions(*tables))
+
+    # Writes
+    def add_book(self, **fields):
+        with self._write_lock:
+            self.writer.add_book(**fields)
+        if self.maintenance is not None:
+            self.run_maintenance("translations")  # dịch sẵn sách mới trước khi khách hỏi tới
+
+    def set_book_translation(self, book_id, lang, **fields):
+        with self._write_lock:
+            self.writer.set_book_translation(book_id, lang, **fields)
+
+    def delete_book(self, book_id):
+        with self._write_lock:
+            self.writer.delete_book(book_id)
+
+    def create_order(self, items, cart_id=None):
+        with self._write_lock:
+            return self.writer.create_order(items, cart_id=cart_id)
+
+    def restock_books(self, items):
+        with self._write_lock:
+            return self.writer.restock_books(items)
+
+    def set_reorder_threshold(self, scope, key=None, threshold=DEFAULT_THRESHOLD, reorder_qty=None):
+        with self._write_lock:
+            self.writer.set_reorder_threshold(scope, key, threshold, reorder_qty)
+
+    def reserve_stock(self, cart_id, book_id, quantity, ttl=RESERVATION_TTL):
+        with self._write_lock:
+            return self.writer.reserve_stock(cart_id, book_id, quantity, ttl)
+
+    def release_reservations(self, cart_id, book_id=None):
+        with self._write_lock:
+            return self.writer.release_reservations(cart_id, book_id)
+
+    def sweep_expired_reservations(self):
+        with self._write_lock:
+            return self.writer.sweep_expired_reservations()
+
+    # Sync với các quầy offline (xem sync_engine.py): server là database trung tâm
+    def central(self):
+        if self._central is None:
+            self._central = LocalCentral(self.writer.conn, lock=self._write_lock)
+        return self._central
+
+    def sync_register(self, peer):
+        return self.central().register(peer)
+
+    def sync_push(self, peer, entries, last_seq):
+        return self.central().push(peer, entries, last_seq)
+
+    def sync_pull(self, peer, after, limit, tables):
+        return self.central().pull(peer, after, limit, tables)
+
+    def close(self):
+        self.stopped.set()
+        if self.maintenance is not None:
+            self.maintenance.close()
+        self.readers.close()
+        self._version_conn.close()
+        self.writer.close()
+
+
+class BookStoreRequestHandler(BaseHTTPRequestHandler):
+    service = None  # gán bởi make_server
+
+    routes = [
+        ("GET", r"/health$", "handle_health"),
+        ("GET", r"/data-version$", "handle_data_version"),
+        ("GET", r"/table-versions$", "handle_table_versions"),
+        ("GET", r"/diagnostics$", "handle_diagnostics"),
+        ("GET", r"/books$", "handle_get_books"),
+        ("GET", r"/books/lookup$", "handle_find_book"),
+        ("GET", r"/books/by-genre$", "handle_books_by_genre"),
+        ("GET", r"/books/translations$", "handle_book_translations"),
+        ("POST", r"/books/(\d+)/translations$", "handle_set_book_translation"),
+        ("POST", r"/books$", "handle_add_book"),
+        ("DELETE", r"/books/(\d+)$", "handle_delete_book"),
+        ("GET", r"/orders$", "handle_get_orders"),
+        ("POST", r"/orders$", "handle_create_order"),
+        ("GET", r"/orders/history$", "handle_order_history"),
+        ("GET", r"/orders/search$", "handle_search_orders"),
+        ("GET", r"/orders/([^/]+)/items$", "handle_order_items"),
+        ("GET", r"/orders/([^/]+)/details$", "handle_order_details"),
+        ("GET", r"/reports/revenue$", "handle_revenue"),
+        ("GET", r"/reports/trend$", "handle_sales_trend"),
+        ("GET", r"/reports/genres$", "handle_genre_share"),
+        ("GET", r"/reports/best-sellers$", "handle_best_sellers"),
+        ("GET", r"/reports/compare$", "handle_compare_periods"),
+        ("GET", r"/reports/pricing$", "handle_simulate_pricing"),
+        ("POST", r"/reports/pricing$", "handle_simulate_pricing_scenarios"),
+        ("GET", r"/books/(\d+)/available$", "handle_available_stock"),
+        ("GET", r"/books/(\d+)/recommendations$", "handle_recommendations"),
+        ("GET", r"/recommendations$", "handle_cart_recommendations"),
+        ("POST", r"/reservations$", "handle_reserve_stock"),
+        ("GET", r"/pick-list$", "handle_pick_list"),
+        ("POST", r"/pick-list$", "handle_cart_pick_list"),
+        ("GET", r"/stock-alerts$", "handle_low_stock"),
+        ("GET", r"/stock-alerts/events$", "handle_stock_events"),
+        ("GET", r"/stock-alerts/status$", "handle_stock_alert_status"),
+        ("POST", r"/stock-alerts/rules$", "handle_set_reorder_threshold"),
+        ("POST", r"/restock$", "handle_restock"),
+        ("GET", r"/maintenance$", "handle_maintenance_status"),
+        ("POST", r"/maintenance/run$", "handle_run_maintenance"),
+        ("POST", r"/sync/register$", "handle_sync_register"),
+        ("POST", r"/sync/push$", "handle_sync_push"),
+        ("POST", r"/sync/pull$", "handle_sync_pull"),
+        ("DELETE", r"/reservations/([^/]+)$", "handle_release_reservations"),
+    ]
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def log_message(self, fmt, *args):
+        logging.debug("api: " + fmt % args)
+
+    def _dispatch(self, method):
+        parsed = urlparse(self.path)
+        self.query = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+        if method != "GET" and self.service.maintenance is not None:
+            # Chỉ lệnh ghi (bán hàng, giữ hàng) tính là bận: các quầy poll GET liên tục kể cả khi không ai dùng
+            self.service.maintenance.touch()
+        for route_method, pattern, handler in self.routes:
+            match = re.match(pattern, parsed.path)
+            if route_method == method and match:
+                try:
+                    status, body = getattr(self, handler)(*match.groups())
+                except InsufficientStockError as e:
+                    status, body = 409, {"error": str(e), "book_id": e.book_id,
+                                         "requested": e.requested, "available": e.available}
+                except ValueError as e:
+                    status, body = 400, {"error": str(e)}
+                except Exception as e:
+                    logging.error(f"API error on {method} {self.path}: {e}")
+                    status, body = 500, {"error": str(e)}
+                self._send(status, body)
+                return
+        self._send(404, {"error": f"No route for {method} {parsed.path}"})
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length))
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON body: {e}")
+
+    def _send(self, status, body):
+        payload = json.dumps(body, default=_json_default).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    # Handlers
+    def handle_health(self):
+        return 200, {"status": "ok"}
+
+    def handle_data_version(self):
+        return 200, {"data_version": self.service.data_version()}
+
+    def handle_table_versions(self):
+        tables = [t for t in self.query.get("tables", "").split(",") if t.strip()]
+        return 200, {"tables": tables, "versions": self.service.table_versions(tables)}
+
+    def handle_diagnostics(self):
+        return 200, instrumentation.metrics.snapshot()
+
+    def handle_get_books(self):
+        return 200, self.service.get_books()
+
+    def handle_find_book(self):
+        book = self.service.find_book(self.query.get("q", ""))
+        if book is None:
+            return 404, {"error": "Book not found"}
+        return 200, book
+
+    def handle_books_by_genre(self):
+        return 200, self.service.get_books_by_genre(self.query.get("genre", ""), int(self.query.get("limit", 10)))
+
+    def handle_book_translations(self):
+        lang = self.query.get("lang")
+        if not lang:
+            raise ValueError("lang is required")
+        ids = self.query.get("ids")
+        book_ids = [int(b) for b in ids.split(",") if b.strip()] if ids is not None else None
+        return 200, self.service.get_book_translations(lang, book_ids)
+
+    def handle_set_book_translation(self, book_id):
+        data = self._read_json()
+        lang = data.pop("lang", None)
+        if not lang:
+            raise ValueError("lang is required")
+        self.service.set_book_translation(int(book_id), lang, **data)
+        return 200, {"status": "ok"}
+
+    def handle_add_book(self):
+        data = self._read_json()
+        fields = ("title", "author", "genre", "description", "shelf_position", "buy_price", "sell_price", "stock")
+        missing = [f for f in fields if f not in data]
+        if missing:
+            raise ValueError(f"Missing fields: {', '.join(missing)}")
+        self.service.add_book(**{f: data[f] for f in fields})
+        return 201, {"status": "created"}
+
+    def handle_delete_book(self, book_id):
+        self.service.delete_book(int(book_id))
+        return 200, {"status": "deleted"}
+
+    def handle_get_orders(self):
+        return 200, self.service.get_orders()
+
+    def handle_create_order(self):
+        data = self._read_json()
+        items = data.get("items")
+        if not items:
+            raise ValueError("Order has no items")
+        return 201, self.service.create_order(items, cart_id=data.get("cart_id"))
+
+    def handle_order_history(self):
+        return 200, self.service.get_order_history(self.query.get("keyword") or None)
+
+    def handle_search_orders(self):
+        q = self.query
+        filters = {
+            "order_prefix": q.get("prefix") or None,
+            "date_prefix": q.get("date_prefix") or None,
+            "start_date": q.get("start") or None,
+            "end_date": q.get("end") or None,
+            "min_amount": int(q["min_amount"]) if q.get("min_amount") else None,
+            "max_amount": int(q["max_amount"]) if q.get("max_amount") else None,
+            "limit": int(q.get("limit", 200)),
+        }
+        if q.get("after_created_at") and q.get("after_id"):
+            filters["after"] = (q["after_created_at"], q["after_id"])
+        return 200, self.service.search_orders(**filters)
+
+    def handle_order_items(self, order_id):
+        return 200, self.service.get_order_items(order_id)
+
+    def handle_order_details(self, order_id):
+        return 200, self.service.get_order_details(order_id)
+
+    def handle_revenue(self):
+        return 200, self.service.get_revenue(self.query.get("start"), self.query.get("end"))
+
+    def handle_sales_trend(self):
+        q = self.query
+        return 200, self.service.get_sales_trend(q.get("grain", "month"), q.get("start"), q.get("end"), q.get("genre"))
+
+    def handle_genre_share(self):
+        return 200, self.service.get_genre_share(self.query.get("start"), self.query.get("end"))
+
+    def handle_best_sellers(self):
+        q = self.query
+        return 200, self.service.get_best_sellers(int(q.get("n", 10)), q.get("start"), q.get("end"),
+                                                  q.get("by", "revenue"), q.get("genre"))
+
+    def handle_compare_periods(self):
+        q = self.query
+        if not q.get("start") or not q.get("end"):
+            raise ValueError("start and end are required")
+        return 200, self.service.compare_sales_periods(q["start"], q["end"], q.get("by"))
+
+    def handle_simulate_pricing(self):
+        return 200, self.service.simulate_pricing(None, int(self.query.get("horizon", 30)))
+
+    def handle_simulate_pricing_scenarios(self):
+        data = self._read_json()
+        scenarios = data.get("scenarios")
+        if not isinstance(scenarios, list) or not scenarios:
+            raise ValueError("scenarios must be a non-empty list")
+        return 200, self.service.simulate_pricing(scenarios, int(data.get("horizon_days", 30)))
+
+    def handle_available_stock(self, book_id):
+        return 200, {"book_id": int(book_id), "available": self.service.get_available_stock(int(book_id))}
+
+    def handle_recommendations(self, book_id):
+        return 200, self.service.get_recommendations(int(book_id), int(self.query.get("k", 5)))
+
+    def handle_cart_recommendations(self):
+        books = [int(b) for b in self.query.get("books", "").split(",") if b.strip()]
+        if not books:
+            raise ValueError("books is required (comma-separated book ids)")
+        return 200, self.service.get_cart_recommendations(books, int(self.query.get("k", 5)))
+
+    def handle_reserve_stock(self):
+        data = self._read_json()
+        try:
+            cart_id, book_id, quantity = data["cart_id"], int(data["book_id"]), int(data["quantity"])
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"Invalid reservation: {e}")
+        remaining = self.service.reserve_stock(cart_id, book_id, quantity, float(data.get("ttl", RESERVATION_TTL)))
+        return 201, {"remaining": remaining}
+
+    def handle_pick_list(self):
+        orders = [o for o in self.query.get("orders", "").split(",") if o.strip()]
+        if not orders:
+            raise ValueError("orders is required")
+        return 200, self.service.plan_pick_route(order_ids=orders)
+
+    def handle_cart_pick_list(self):
+        data = self._read_json()
+        try:
+            items = [{"book_id": int(it["book_id"]), "quantity": int(it["quantity"])} for it in data["items"]]
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"Invalid pick list items: {e}")
+        return 200, self.service.plan_pick_route(items=items)
+
+    def handle_low_stock(self):
+        return 200, self.service.get_low_stock()
+
+    def handle_stock_events(self):
+        after, limit = int(self.query.get("after", 0)), min(int(self.query.get("limit", 200)), 1000)
+        return 200, self.service.get_stock_events(after, limit)
+
+    def handle_stock_alert_status(self):
+        return 200, self.service.get_stock_alert_status()
+
+    def handle_set_reorder_threshold(self):
+        data = self._read_json()
+        try:
+            scope, threshold = data["scope"], int(data["threshold"])
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"Invalid reorder rule: {e}")
+        self.service.set_reorder_threshold(scope, data.get("key"), threshold, data.get("reorder_qty"))
+        return 200, {"status": "ok"}
+
+    def handle_restock(self):
+        data = self._read_json()
+        try:
+            items = [(int(it["book_id"]), int(it["quantity"])) for it in data["items"]]
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"Invalid restock: {e}")
+        return 200, {"restocked": self.service.restock_books(items)}
+
+    def handle_maintenance_status(self):
+        return 200, self.service.get_maintenance_status()
+
+    def handle_run_maintenance(self):
+        name = self._read_json().get("task")
+        if not name:
+            raise ValueError("task is required")
+        self.service.run_maintenance(name)
+        return 202, {"task": name, "status": "started"}
+
+    def handle_release_reservations(self, cart_id):
+        book_id = self.query.get("book_id")
+        released = self.service.release_reservations(cart_id, int(book_id) if book_id else None)
+        return 200, {"released": released}
+
+    def _sync_peer(self, data):
+        peer = data.get("peer")
+        if not peer or not isinstance(peer, str):
+            raise ValueError("peer is required")
+        return peer
+
+    def handle_sync_register(self):
+        data = self._read_json()
+        return 200, {"sent_seq": self.service.sync_register(self._sync_peer(data))}
+
+    def handle_sync_push(self):
+        data = self._read_json()
+        entries = data.get("entries")
+        if not isinstance(entries, list):
+            raise ValueError("entries must be a list")
+        return 200, self.service.sync_push(self._sync_peer(data), entries, int(data.get("last_seq", 0)))
+
+    def handle_sync_pull(self):
+        data = self._read_json()
+        tables = tuple(data.get("tables") or ("books",))
+        return 200, self.service.sync_pull(self._sync_peer(data), int(data.get("after", 0)),
+                                           min(int(data.get("limit", 500)), 5000), tables)
+
+
+def _start_reservation_sweeper(service, interval=60):
+    def loop():
+        while not service.stopped.wait(interval):
+            try:
+                swept = service.sweep_expired_reservations()
+                if swept:
+                    logging.info("Released %d expired stock reservations", swept)
+            except Exception as e:
+                logging.error(f"Reservation sweep failed: {e}")
+
+    threading.Thread(target=loop, name="reservation-sweeper", daemon=True).start()
+
+
+def _start_backup_scheduler(service, backups, interval):
+    def loop():
+        while not service.stopped.wait(interval):
+            try:
+                backups.create_backup()
+            except Exception as e:
+                logging.error(f"Scheduled backup failed: {e}")
+
+    threading.Thread(target=loop, name="backup-scheduler", daemon=True).start()
+
+
+def make_server(db_name="bookstore.db", host="127.0.0.1", port=8765, readers=4,
+                backup_dir=None, backup_interval_hours=0, backup_keep=7, maintenance=True):
+    service = BookStoreService(db_name, readers=readers)
+    _start_reservation_sweeper(service)
+    if maintenance:
+        service.maintenance = MaintenanceScheduler(db_name)
+        service.maintenance.start()
+    threading.Thread(target=service.build_recommendations, name="recommender-build", daemon=True).start()
+    if backup_interval_hours:
+        # Writer đã bật WAL: backup đọc snapshot đã commit trên kết nối riêng, không cần giữ _write_lock
+        backups = BackupManager(db_name, backup_dir, keep=backup_keep)
+        _start_backup_scheduler(service, backups, backup_interval_hours * 3600)
+    handler = type("BoundBookStoreRequestHandler", (BookStoreRequestHandler,), {"service": service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server, service
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BookStore headless API server")
+    parser.add_argument("--db", default="bookstore.db")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--backup-dir", help="backup directory (default: backups/ next to the database)")
+    parser.add_argument("--backup-interval-hours", type=float, default=0, help="0 disables scheduled backups")
+    parser.add_argument("--backup-keep", type=int, default=7)
+    parser.add_argument("--no-maintenance", action="store_true",
+                        help="do not run ANALYZE / VACUUM / cube refresh on a schedule in this process")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    server, service = make_server(args.db, args.host, args.port, args.readers,
+                                  args.backup_dir, args.backup_interval_hours, args.backup_keep,
+                                  maintenance=not args.no_maintenance)
+    logging.info(f"BookStore API listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Chuyển đơn hàng cũ (kèm order_items) sang file archive riêng để bookstore.db luôn nhỏ.
+
+    python archive_manager.py --db bookstore.db --older-than-days 365
+
+- Chạy theo từng batch, mỗi batch là một transaction; dừng giữa chừng thì chạy lại là tiếp tục.
+- Tổng hợp archive.daily_sales (ngày × sách) để báo cáo doanh thu vẫn đúng.
+- DatabaseManager tự ATTACH archive khi truy vấn chạm tới khoảng ngày đã archive.
+"""
+import argparse
+import logging
+from datetime import datetime, timedelta
+
+from cache_utils import bump_table_versions
+from database_manager import DatabaseManager
+
+ARCHIVE_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS archive.orders (
+        id TEXT PRIMARY KEY,
+        total_qty INTEGER,
+        total_amount INTEGER,
+        created_at TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS archive.order_items (
+        id INTEGER PRIMARY KEY,
+        order_id TEXT,
+        book_id INTEGER,
+        quantity INTEGER,
+        unit_price INTEGER,
+        total INTEGER
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS archive.daily_sales (
+        day TEXT,
+        book_id INTEGER,
+        quantity INTEGER,
+        total_amount INTEGER,
+        PRIMARY KEY (day, book_id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS archive.idx_archive_orders_created_at ON orders(created_at, id)",
+    "CREATE INDEX IF NOT EXISTS archive.idx_archive_order_items_order_id ON order_items(order_id)",
+]
+
+
+class ArchiveManager:
+    def __init__(self, db):
+        self.db = db
+        self.conn = db.conn
+        self.db.attach_archive(create=True)
+        with self.conn:
+            for statement in ARCHIVE_SCHEMA:
+                self.conn.execute(statement)
+            self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS archive_batch (id TEXT PRIMARY KEY)")
+
+    def archive_orders(self, older_than_days=365, batch_size=1000, max_batches=None):
+        """
+        Chuyển các đơn có created_at trước (hôm nay - older_than_days) sang archive.
+        Trả về số đơn đã chuyển.
+        """
+        cutoff = (datetime.now() - timedelta(days=older_than_days)).strftime("%Y-%m-%d 00:00:00")
+        moved, batches = 0, 0
+        while max_batches is None or batches < max_batches:
+            n = self._archive_batch(cutoff, batch_size)
+            if not n:
+                break
+            moved += n
+            batches += 1
+            logging.info("Archived %d orders (%d total) older than %s", n, moved, cutoff)
+        return moved
+
+    def _archive_batch(self, cutoff, batch_size):
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM temp.archive_batch")
+            conn.execute(
+                "INSERT INTO temp.archive_batch (id) "
+                "SELECT id FROM main.orders WHERE created_at < ? ORDER BY created_at LIMIT ?",
+                (cutoff, batch_size),
+            )
+            n = conn.execute("SELECT COUNT(*) FROM temp.archive_batch").fetchone()[0]
+            if not n:
+                conn.rollback()
+                return 0
+
+            # Batch bị gián đoạn trước đó có thể đã chép sang archive nhưng chưa xoá ở main:
+            # chỉ cộng rollup cho những đơn chưa có trong archive, để chạy lại không bị cộng hai lần.
+            conn.execute("""
+                         INSERT INTO archive.daily_sales (day, book_id, quantity, total_amount)
+                         SELECT substr(o.created_at, 1, 10), oi.book_id, SUM(oi.quantity), SUM(oi.total)
+                         FROM main.orders o
+                                  JOIN main.order_items oi ON oi.order_id = o.id
+                         WHERE o.id IN (SELECT id FROM temp.archive_batch)
+                           AND o.id NOT IN (SELECT id FROM archive.orders)
+                         GROUP BY substr(o.created_at, 1, 10), oi.book_id
+                         ON CONFLICT (day, book_id) DO UPDATE SET
+                             quantity = quantity + excluded.quantity,
+                             total_amount = total_amount + excluded.total_amount
+                         """)
+            conn.execute("""
+                         INSERT OR IGNORE INTO archive.order_items (id, order_id, book_id, quantity, unit_price, total)
+                         SELECT id, order_id, book_id, quantity, unit_price, total
+                         FROM main.order_items
+                         WHERE order_id IN (SELECT id FROM temp.archive_batch)
+                         """)
+            conn.execute("""
+                         INSERT OR IGNORE INTO archive.orders (id, total_qty, total_amount, created_at)
+                         SELECT id, total_qty, total_amount, created_at
+                         FROM main.orders
+                         WHERE id IN (SELECT id FROM temp.archive_batch)
+                         """)
+            newest = conn.execute(
+                "SELECT MAX(created_at) FROM main.orders WHERE id IN (SELECT id FROM temp.archive_batch)"
+            ).fetchone()[0]
+            conn.execute("DELETE FROM main.order_items WHERE order_id IN (SELECT id FROM temp.archive_batch)")
+            conn.execute("DELETE FROM main.orders WHERE id IN (SELECT id FROM temp.archive_batch)")
+            bump_table_versions(conn, "orders", "order_items")
+            conn.execute("""
+                         INSERT INTO main.archive_state (key, value) VALUES ('archived_through', ?)
+                         ON CONFLICT (key) DO UPDATE SET value = MAX(value, excluded.value)
+                         """, (newest,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return n
+
+    def stats(self):
+        live = self.conn.execute("SELECT COUNT(*), MIN(created_at) FROM main.orders").fetchone()
+        archived = self.conn.execute("SELECT COUNT(*), MIN(created_at), MAX(created_at) FROM archive.orders").fetchone()
+        return {
+            "live_orders": live[0],
+            "live_oldest": live[1],
+            "archived_orders": archived[0],
+            "archived_from": archived[1],
+            "archived_through": archived[2],
+            "archive_path": self.db.archive_path,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive old orders to a separate database file")
+    parser.add_argument("--db", default="bookstore.db")
+    parser.add_argument("--older-than-days", type=int, default=365)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--max-batches", type=int, help="stop after N batches (resume later)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    db = DatabaseManager(args.db)
+    manager = ArchiveManager(db)
+    moved = manager.archive_orders(args.older_than_days, args.batch_size, args.max_batches)
+    print(f"Moved {moved} orders to {db.archive_path}")
+    print(manager.stats())
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Sao lưu online bookstore.db bằng SQLite backup API, không cần dừng quầy.
+
+    python backup_manager.py backup --db bookstore.db --dir backups --keep 7
+    python backup_manager.py list --dir backups
+    python backup_manager.py restore backups/bookstore-20250101-230000.db.gz --db bookstore.db
+
+Sao lưu mở kết nối chỉ đọc riêng và chép cả file trong một bước (pages=-1), tức một snapshot nhất quán
+đã commit. Database phải ở chế độ WAL (app và API server đều bật) để quầy vẫn ghi đơn trong lúc sao lưu.
+"""
+import argparse
+import gzip
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+
+class BackupError(Exception):
+    pass
+
+
+class BackupManager:
+    def __init__(self, db_path="bookstore.db", backup_dir=None, keep=7, compress=True):
+        self.db_path = db_path
+        self.backup_dir = backup_dir or os.path.join(os.path.dirname(os.path.abspath(db_path)), "backups")
+        self.keep = keep
+        self.compress = compress
+        self._lock = threading.Lock()
+        self.last_result = None
+
+    def _prefix(self):
+        return os.path.splitext(os.path.basename(self.db_path))[0]
+
+    def create_backup(self, progress=None):
+        """Tạo một bản sao lưu đã kiểm tra integrity. Trả về dict thông tin bản sao lưu."""
+        if not self._lock.acquire(blocking=False):
+            raise BackupError("A backup is already running")
+        try:
+            return self._create_backup(progress)
+        finally:
+            self._lock.release()
+
+    def _create_backup(self, progress):
+        os.makedirs(self.backup_dir, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        target = os.path.join(self.backup_dir, f"{self._prefix()}-{stamp}.db")
+        partial = f"{target}.partial"
+        t0 = time.perf_counter()
+
+        source = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+
+        def on_step(status, remaining, total):
+            if progress:
+                progress(total - remaining, total)
+
+        dest = sqlite3.connect(partial)
+        try:
+            # Một bước trên kết nối riêng: đọc trọn một snapshot, lệnh ghi giữa chừng không làm chép lại từ đầu
+            source.backup(dest, pages=-1, progress=on_step)
+            result = dest.execute("PRAGMA integrity_check").fetchone()[0]
+            if result != "ok":
+                raise BackupError(f"Integrity check failed for {target}: {result}")
+        except Exception:
+            dest.close()
+            os.remove(partial)
+            raise
+        finally:
+            source.close()
+        dest.close()
+
+        if self.compress:
+            with open(partial, "rb") as src, gzip.open(f"{target}.gz.partial", "wb", compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            os.remove(partial)
+            partial, target = f"{target}.gz.partial", f"{target}.gz"
+        os.replace(partial, target)
+
+        self.rotate()
+        self.last_result = {
+            "path": target,
+            "size_bytes": os.path.getsize(target),
+            "seconds": round(time.perf_counter() - t0, 2),
+            "created_at": stamp,
+        }
+        logging.info("Backup written: %s", self.last_result)
+        return self.last_result
+
+    def list_backups(self):
+        """Các bản sao lưu hiện có, mới nhất trước."""
+        if not os.path.isdir(self.backup_dir):
+            return []
+        prefix = f"{self._prefix()}-"
+        names = [n for n in os.listdir(self.backup_dir)
+                 if n.startswith(prefix) and (n.endswith(".db") or n.endswith(".db.gz"))]
+        return [os.path.join(self.backup_dir, n) for n in sorted(names, reverse=True)]
+
+    def rotate(self):
+        """Chỉ giữ lại self.keep bản sao lưu mới nhất."""
+        removed = []
+        for path in self.list_backups()[self.keep:]:
+            os.remove(path)
+            removed.append(path)
+        return removed
+
+    def restore(self, backup_path, target_path=None):
+        """
+        Khôi phục backup_path vào target_path (mặc định db_path) bằng backup API,
+        nên an toàn kể cả khi file đích đang được mở.
+        """
+        target_path = target_path or self.db_path
+        source_path = backup_path
+        tmp = None
+        if backup_path.endswith(".gz"):
+            tmp = f"{target_path}.restore-tmp"
+            with gzip.open(backup_path, "rb") as src, open(tmp, "wb") as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            source_path = tmp
+        try:
+            source = sqlite3.connect(f"file:{source_path}?mode=ro", uri=True)
+            try:
+                result = source.execute("PRAGMA integrity_check").fetchone()[0]
+                if result != "ok":
+                    raise BackupError(f"Backup {backup_path} is corrupt: {result}")
+                dest = sqlite3.connect(target_path)
+                try:
+                    source.backup(dest)
+                finally:
+                    dest.close()
+            finally:
+                source.close()
+        finally:
+            if tmp and os.path.exists(tmp):
+                os.remove(tmp)
+        logging.info("Restored %s into %s", backup_path, target_path)
+        return target_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Online backup and restore for bookstore.db")
+    parser.add_argument("--db", default="bookstore.db")
+    parser.add_argument("--dir", help="backup directory (default: backups/ next to the database)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    backup = sub.add_parser("backup")
+    backup.add_argument("--keep", type=int, default=7)
+    backup.add_argument("--no-compress", action="store_true")
+
+    sub.add_parser("list")
+
+    restore = sub.add_parser("restore")
+    restore.add_argument("backup")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    if args.command == "backup":
+        manager = BackupManager(args.db, args.dir, keep=args.keep, compress=not args.no_compress)
+        print(manager.create_backup())
+    elif args.command == "list":
+        for path in BackupManager(args.db, args.dir).list_backups():
+            print(f"{path}\t{os.path.getsize(path):,} bytes")
+    elif args.command == "restore":
+        print(f"Restored into {BackupManager(args.db, args.dir).restore(args.backup)}")
+
+
+if __name__ == "__main__":
+    main()
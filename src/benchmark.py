@@ -0,0 +1,185 @@
+"""
+Benchmark DatabaseManager và các luồng dữ liệu của UI ở quy mô thực tế.
+
+    python benchmark.py --scale small --output results/base.json
+    python benchmark.py --scale medium --iterations 50 --output results/new.json
+    python benchmark.py --compare results/base.json results/new.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+
+from database_manager import DatabaseManager
+from dataset_generator import generate
+from inventory_manager import optimize_inventory_report
+
+# books, order lines
+SCALES = {
+    "tiny": (200, 2_000),
+    "small": (1_000, 10_000),
+    "medium": (100_000, 1_000_000),
+    "large": (1_000_000, 10_000_000),
+}
+
+# Thao tác chạy trên toàn bộ dữ liệu thì lặp ít hơn
+HEAVY_OPERATIONS = {"get_revenue", "get_books", "history_load", "optimize_inventory"}
+
+
+def _operations(db, n_books, rng):
+    titles = [r[0] for r in db.conn.execute("SELECT title FROM books ORDER BY id LIMIT 1000")]
+
+    def create_order():
+        book_id = rng.randint(1, n_books)
+        db.create_order([{"book_id": book_id, "quantity": 1, "unit_price": 150, "total": 150}])
+
+    def title_lookup():
+        db.find_book(str(rng.randint(1, n_books)))
+        db.find_book_by_title(titles[rng.randrange(len(titles))])
+
+    return {
+        "create_order": create_order,
+        "title_lookup": title_lookup,
+        "get_books": db.get_books,
+        "get_revenue": db.get_revenue,
+        "sales_trend": lambda: db.get_sales_trend("month"),
+        "history_load": db.get_order_history,
+        "optimize_inventory": lambda: optimize_inventory_report(db),
+    }
+
+
+def measure(fn, iterations, warmup=1):
+    for _ in range(warmup):
+        fn()
+    durations = []
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - t0)
+
+    # Đo bộ nhớ đỉnh ở một lần chạy riêng để không ảnh hưởng thời gian
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    ms = np.array(durations) * 1000
+    return {
+        "iterations": iterations,
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "mean_ms": float(ms.mean()),
+        "throughput_per_s": float(iterations / sum(durations)) if sum(durations) else float("inf"),
+        "peak_memory_mb": peak / 1024 / 1024,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+def run(n_books, n_lines, iterations=100, heavy_iterations=5, operations=None, db_path=None, seed=42):
+    workdir = tempfile.mkdtemp(prefix="bookstore-bench-")
+    target = os.path.join(workdir, "bench.db")
+    try:
+        if db_path:
+            shutil.copyfile(db_path, target)
+        else:
+            generate(target, n_books, n_lines, seed=seed, verbose=False)
+
+        db = DatabaseManager(target)
+        n_books = db.conn.execute("SELECT COUNT(*) FROM books").fetchone()[0]
+        n_lines = db.conn.execute("SELECT COUNT(*) FROM order_items").fetchone()[0]
+        ops = _operations(db, n_books, random.Random(seed))
+        results = {}
+        for name, fn in ops.items():
+            if operations and name not in operations:
+                continue
+            n = heavy_iterations if name in HEAVY_OPERATIONS else iterations
+            results[name] = measure(fn, n)
+            r = results[name]
+            print(f"{name:20s} p50 {r['p50_ms']:9.2f} ms  p95 {r['p95_ms']:9.2f} ms  "
+                  f"p99 {r['p99_ms']:9.2f} ms  {r['throughput_per_s']:9.1f}/s  peak {r['peak_memory_mb']:8.1f} MB")
+        db.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "commit": _git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "books": n_books,
+        "order_lines": n_lines,
+        "results": results,
+    }
+
+
+def compare(base_path, new_path, threshold=0.10):
+    """In chênh lệch p50/p95 giữa hai file kết quả; trả về True nếu có regression."""
+    with open(base_path) as f:
+        base = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+
+    print(f"Base {base.get('commit')} vs new {new.get('commit')}")
+    regressed = False
+    for name, new_r in new["results"].items():
+        base_r = base["results"].get(name)
+        if not base_r:
+            continue
+        for metric in ("p50_ms", "p95_ms"):
+            change = (new_r[metric] - base_r[metric]) / base_r[metric] if base_r[metric] else 0
+            flag = ""
+            if change > threshold:
+                flag = "  <-- REGRESSION"
+                regressed = True
+            print(f"{name:20s} {metric}: {base_r[metric]:9.2f} -> {new_r[metric]:9.2f} ms ({change:+.1%}){flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BookStore benchmark suite")
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--books", type=int, help="override number of books")
+    parser.add_argument("--lines", type=int, help="override number of order lines")
+    parser.add_argument("--db", help="benchmark a copy of an existing database instead of generating one")
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--heavy-iterations", type=int, default=5)
+    parser.add_argument("--only", nargs="*", help="operations to run")
+    parser.add_argument("--output", help="write JSON results to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="compare two result files")
+    parser.add_argument("--threshold", type=float, default=0.10, help="regression threshold (fraction)")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, threshold=args.threshold) else 0)
+
+    n_books, n_lines = SCALES[args.scale]
+    report = run(args.books or n_books, args.lines or n_lines, args.iterations, args.heavy_iterations,
+                 args.only, args.db)
+    report["scale"] = args.scale
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+"""
+Dòng lệnh không cần giao diện cho báo cáo, dự báo, nhập / xuất dữ liệu (cron, script kiểm tra).
+
+    python -m bookstore_cli --db bookstore.db revenue --start 2025-01-01 --format csv --out revenue.csv
+    python -m bookstore_cli optimize
+    python -m bookstore_cli forecast "Dế Mèn Phiêu Lưu Ký"
+    python -m bookstore_cli export-history --start 2025-01-01 --out history.csv
+    python -m bookstore_cli import-books new_books.csv
+    python -m bookstore_cli low-stock --fail-if-any        # exit 3 nếu có sách dưới ngưỡng
+    python -m bookstore_cli maintenance --due              # chạy các task bảo trì đến hạn (từ cron)
+
+- Không import tkinter, pyttsx3 hay OpenAI. Các lệnh kiểm tra nhanh (stock, low-stock) chỉ dùng sqlite3
+  nên khởi động không phải chờ pandas; các lệnh báo cáo import DatabaseManager khi cần.
+- --api URL (hoặc BOOKSTORE_API_URL) chạy qua api_server thay vì mở file SQLite.
+- Kết quả in ra stdout (hoặc --out) dạng json (mặc định), csv hoặc text; lỗi in ra stderr.
+- Exit code: 0 thành công, 1 lỗi, 2 sai cú pháp lệnh, 3 điều kiện kiểm tra không đạt.
+"""
+import argparse
+import csv
+import io
+import json
+import logging
+import os
+import sqlite3
+import sys
+from types import SimpleNamespace
+
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_CHECK_FAILED = 3
+
+IMPORT_FIELDS = ("title", "author", "genre", "description", "shelf_position", "buy_price", "sell_price", "stock")
+HISTORY_COLUMNS = ["order_id", "total_qty", "total_amount", "created_at"]
+
+
+class CheckFailed(Exception):
+    """Lệnh chạy xong nhưng điều kiện kiểm tra không đạt (exit 3); kết quả vẫn được in."""
+
+    def __init__(self, result):
+        super().__init__("check failed")
+        self.result = result
+
+
+def _json_default(value):
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+def _rows(data):
+    """DataFrame / list dict / dict -> list dict."""
+    if hasattr(data, "to_dict"):
+        return data.to_dict(orient="records")
+    if isinstance(data, dict):
+        return [data]
+    return list(data)
+
+
+def render(data, fmt):
+    if isinstance(data, str):
+        return data if fmt == "text" else json.dumps({"report": data}, ensure_ascii=False, indent=2)
+    if fmt == "json":
+        payload = data if isinstance(data, dict) else _rows(data)
+        return json.dumps(payload, default=_json_default, ensure_ascii=False, indent=2)
+    rows = _rows(data)
+    if not rows:
+        return ""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=list(rows[0]), delimiter="," if fmt == "csv" else "\t",
+                            lineterminator="\n")
+    writer.writeheader()
+    writer.writerows(rows)
+    return buffer.getvalue().rstrip("\n")
+
+
+# Kết nối
+def open_db(args, read_only=True):
+    """DatabaseManager (hoặc RemoteDatabaseManager với --api); import muộn vì kéo theo pandas."""
+    if args.api:
+        from api_client import RemoteDatabaseManager
+        return RemoteDatabaseManager(args.api)
+    from database_manager import DatabaseManager
+    _require_db(args.db)
+    return DatabaseManager(args.db, read_only=read_only)
+
+
+def open_lite(args):
+    """Kết nối sqlite3 chỉ-đọc, không qua DatabaseManager, cho các lệnh kiểm tra nhanh."""
+    _require_db(args.db)
+    conn = sqlite3.connect(f"file:{args.db}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    return SimpleNamespace(conn=conn, read_only=True, close=conn.close)
+
+
+def _require_db(path):
+    # sqlite3 tạo file rỗng khi mở đường dẫn sai: báo lỗi thay vì ra báo cáo trống
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Database not found: {path}")
+
+
+# Commands
+def cmd_revenue(args):
+    db = open_db(args)
+    try:
+        return db.get_revenue(args.start, args.end)
+    finally:
+        db.close()
+
+
+def cmd_trend(args):
+    # Cube doanh số cần ghi bảng tổng hợp khi cập nhật
+    db = open_db(args, read_only=False)
+    try:
+        return db.get_sales_trend(args.grain, args.start, args.end, args.genre)
+    finally:
+        db.close()
+
+
+def cmd_best_sellers(args):
+    db = open_db(args, read_only=False)
+    try:
+        return db.get_best_sellers(args.n, args.start, args.end, args.by, args.genre)
+    finally:
+        db.close()
+
+
+def cmd_optimize(args):
+    from inventory_manager import optimize_inventory_report
+    db = open_db(args)
+    try:
+        return optimize_inventory_report(db)
+    finally:
+        db.close()
+
+
+def cmd_analyze_profit(args):
+    from inventory_manager import analyze_profit
+    db = open_db(args)
+    try:
+        return analyze_profit(db)
+    finally:
+        db.close()
+
+
+def cmd_forecast(args):
+    from inventory_manager import check_inventory
+    db = open_db(args)
+    try:
+        if db.get_book_id(args.title) is None:
+            raise ValueError(f"Book not found: {args.title}")
+        return check_inventory(db, args.title)
+    finally:
+        db.close()
+
+
+def cmd_export_history(args):
+    """Toàn bộ lịch sử đơn (hoặc một khoảng ngày), đọc theo trang keyset."""
+    db = open_db(args)
+    rows, after = [], None
+    try:
+        while True:
+            page = db.search_orders(start_date=args.start, end_date=args.end, after=after, limit=5000)
+            rows.extend(dict(zip(HISTORY_COLUMNS, row)) for row in page)
+            if len(page) < 5000:
+                return rows
+            after = (page[-1][3], page[-1][0])
+    finally:
+        db.close()
+
+
+def cmd_import_books(args):
+    """CSV có header IMPORT_FIELDS; dòng nào lỗi thì không nhập gì cả."""
+    books, errors = [], []
+    with open(args.file, newline="", encoding="utf-8-sig") as f:
+        for line, row in enumerate(csv.DictReader(f), start=2):
+            missing = [field for field in IMPORT_FIELDS if not (row.get(field) or "").strip()
+                       and field not in ("description", "shelf_position")]
+            if missing:
+                errors.append(f"line {line}: missing {', '.join(missing)}")
+                continue
+            book = {field: (row.get(field) or "").strip() for field in IMPORT_FIELDS}
+            bad = [field for field in ("buy_price", "sell_price", "stock") if not book[field].lstrip("-").isdigit()]
+            if bad:
+                errors.append(f"line {line}: not a whole number: {', '.join(bad)}")
+                continue
+            books.append(dict(book, buy_price=int(book["buy_price"]), sell_price=int(book["sell_price"]),
+                              stock=int(book["stock"])))
+    if errors:
+        raise ValueError("Invalid rows, nothing imported:\n" + "\n".join(errors))
+    if args.dry_run:
+        return {"valid": len(books), "imported": 0}
+    db = open_db(args, read_only=False)
+    try:
+        return {"valid": len(books), "imported": db.import_books(books)}
+    finally:
+        db.close()
+
+
+def cmd_stock(args):
+    if args.api:
+        db = open_db(args)
+        book = db.find_book(args.title_or_id)
+    else:
+        db = open_lite(args)
+        key = args.title_or_id.strip()
+        query = "SELECT id, title, genre, shelf_position, sell_price, stock FROM books WHERE "
+        query += "id = ?" if key.isdigit() else "LOWER(title) = LOWER(?)"
+        row = db.conn.execute(query, (int(key) if key.isdigit() else key,)).fetchone()
+        book = dict(row) if row else None
+    db.close()
+    if book is None:
+        raise ValueError(f"Book not found: {args.title_or_id}")
+    if args.min is not None and book["stock"] < args.min:
+        raise CheckFailed(book)
+    return book
+
+
+def cmd_low_stock(args):
+    if args.api:
+        db = open_db(args)
+        rows = db.get_low_stock()
+    else:
+        from stock_alerts import StockAlerts
+        db = open_lite(args)
+        installed = db.conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'low_stock'").fetchone()
+        if not installed:
+            # Database chưa từng mở bằng bản có cảnh báo tồn kho: mở có quyền ghi để tạo trigger + tập low_stock
+            db.close()
+            db = open_db(args, read_only=False)
+        rows = StockAlerts(db).low_stock()
+    db.close()
+    if args.fail_if_any and rows:
+        raise CheckFailed(rows)
+    return rows
+
+
+def cmd_maintenance(args):
+    """Trạng thái lịch bảo trì; --run / --due chạy task ngay trong tiến trình này (exit 3 nếu có task lỗi)."""
+    if args.api:
+        db = open_db(args)
+        for name in args.run or ():
+            db.run_maintenance(name)
+        return db.get_maintenance_status()
+    if not (args.run or args.due):
+        from maintenance import read_status
+        db = open_lite(args)
+        rows = read_status(db.conn)
+        db.close()
+        return rows
+    from maintenance import MaintenanceScheduler
+    _require_db(args.db)
+    scheduler = MaintenanceScheduler(args.db)
+    try:
+        unknown = [name for name in args.run or () if name not in scheduler.tasks]
+        if unknown:
+            raise ValueError(f"Unknown maintenance task: {', '.join(unknown)} (tasks: {', '.join(scheduler.tasks)})")
+        names = args.run or scheduler.due()
+        results = [scheduler.run(name, force=bool(args.run)) for name in names]
+    finally:
+        scheduler.close()
+    # None: tiến trình khác (app, api_server) đang chạy task đó
+    rows = [row or {"name": name, "last_status": "claimed by another process"} for name, row in zip(names, results)]
+    if any(row.get("last_status") == "error" for row in rows):
+        raise CheckFailed(rows)
+    return rows
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="bookstore_cli", description="Headless bookstore reports and batch jobs")
+    parser.add_argument("--db", default=os.getenv("BOOKSTORE_DB", "bookstore.db"))
+    parser.add_argument("--api", default=os.getenv("BOOKSTORE_API_URL"), help="use an api_server instead of --db")
+    parser.add_argument("--format", choices=["json", "csv", "text"], default="json")
+    parser.add_argument("--out", help="write the result to this file instead of stdout")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log warnings such as slow queries")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def dated(name, fn, help_text):
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument("--start", help="YYYY-MM-DD")
+        p.add_argument("--end", help="YYYY-MM-DD")
+        p.set_defaults(fn=fn)
+        return p
+
+    dated("revenue", cmd_revenue, "revenue and profit per book")
+    p = dated("trend", cmd_trend, "sales trend from the sales cube")
+    p.add_argument("--grain", default="month", choices=["day", "week", "month", "quarter"])
+    p.add_argument("--genre")
+    p = dated("best-sellers", cmd_best_sellers, "top books from the sales cube")
+    p.add_argument("-n", type=int, default=10)
+    p.add_argument("--by", default="revenue", choices=["revenue", "quantity", "profit"])
+    p.add_argument("--genre")
+    sub.add_parser("optimize", help="inventory optimization report").set_defaults(fn=cmd_optimize)
+    sub.add_parser("analyze-profit", help="profit summary").set_defaults(fn=cmd_analyze_profit)
+    p = sub.add_parser("forecast", help="demand forecast and restock suggestion for a book")
+    p.add_argument("title")
+    p.set_defaults(fn=cmd_forecast)
+    dated("export-history", cmd_export_history, "export order history")
+    p = sub.add_parser("import-books", help=f"import books from a CSV with columns {', '.join(IMPORT_FIELDS)}")
+    p.add_argument("file")
+    p.add_argument("--dry-run", action="store_true", help="validate only")
+    p.set_defaults(fn=cmd_import_books)
+    p = sub.add_parser("stock", help="stock of one book (fast check)")
+    p.add_argument("title_or_id")
+    p.add_argument("--min", type=int, help="exit 3 if stock is below this")
+    p.set_defaults(fn=cmd_stock)
+    p = sub.add_parser("low-stock", help="books at or below their reorder threshold (fast check)")
+    p.add_argument("--fail-if-any", action="store_true", help="exit 3 if any book is low")
+    p.set_defaults(fn=cmd_low_stock)
+    p = sub.add_parser("maintenance", help="maintenance schedule status, or run tasks now")
+    p.add_argument("--run", nargs="+", metavar="TASK", help="run these tasks now (e.g. analyze vacuum)")
+    p.add_argument("--due", action="store_true", help="run the tasks that are due")
+    p.set_defaults(fn=cmd_maintenance)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(stream=sys.stderr, level=logging.WARNING if args.verbose else logging.ERROR,
+                        format="%(levelname)s - %(message)s")
+    code = EXIT_OK
+    try:
+        result = args.fn(args)
+    except CheckFailed as e:
+        result, code = e.result, EXIT_CHECK_FAILED
+    except Exception as e:
+        print(f"error: {e}", file=sys.stderr)
+        return EXIT_ERROR
+    output = render(result, args.format)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8", newline="") as f:
+            f.write(output + "\n")
+    else:
+        try:
+            print(output)
+        except BrokenPipeError:
+            pass  # stdout đóng sớm (| head): không coi là lỗi
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,426 @@
+"""
+Nhiều chi nhánh: mỗi chi nhánh một file database riêng, báo cáo toàn chuỗi đọc song song.
+
+    python branch_manager.py add HN "Hà Nội" branches/hn.db
+    python branch_manager.py summary --start 2025-01-01 --end 2025-03-31
+    python branch_manager.py where "Dế Mèn"
+
+    chain = ChainReporter(BranchRegistry.load("branches.json"))
+    chain.branch_summary(start, end)     # doanh số + tồn kho từng chi nhánh
+    chain.sales_trend("month")           # cộng dồn cả chuỗi (by_branch=True: tách theo chi nhánh)
+    chain.best_sellers(10)
+    chain.where_is("de men")             # chi nhánh nào còn sách này
+
+- Quầy của chi nhánh chỉ mở file của mình (BOOKSTORE_BRANCH=HN, xem local_db_path), nên bán hàng
+  không phụ thuộc số chi nhánh hay dữ liệu của chi nhánh khác.
+- Báo cáo chuỗi chạy trên từng chi nhánh song song, dùng cube doanh số (sales_daily) của chính chi
+  nhánh đó rồi gộp bằng pandas; không có file chung chứa toàn bộ đơn hàng.
+- Sách không có ID chung giữa các chi nhánh nên được gộp theo tên (đã chuẩn hoá, bỏ dấu).
+- Tra tồn kho liên chi nhánh dùng chỉ mục gộp (chain_index.db) cập nhật qua ATTACH; chi nhánh có
+  table_versions("books") không đổi thì không đọc lại.
+"""
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from database_manager import DatabaseManager
+from intent_router import normalize
+from sales_cube import TREND_COLUMNS, GENRE_COLUMNS
+
+DEFAULT_REGISTRY = os.getenv("BOOKSTORE_BRANCHES", "branches.json")
+
+SUMMARY_COLUMNS = ["branch", "name", "quantity", "revenue", "profit", "titles", "stock_units", "stock_value"]
+CHAIN_BEST_SELLER_COLUMNS = ["title", "genre", "quantity", "revenue", "profit", "branches"]
+WHERE_COLUMNS = ["branch", "name", "book_id", "title", "author", "sell_price", "stock"]
+
+INDEX_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS branch_books (
+        branch TEXT,
+        book_id INTEGER,
+        title_key TEXT,
+        title TEXT,
+        author TEXT,
+        genre TEXT,
+        sell_price INTEGER,
+        stock INTEGER,
+        PRIMARY KEY (branch, book_id)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_branch_books_title ON branch_books(title_key, stock)",
+    """
+    CREATE TABLE IF NOT EXISTS branch_index_state (
+        branch TEXT PRIMARY KEY,
+        books_version INTEGER
+    )
+    """,
+]
+
+
+class BranchRegistry:
+    """
+    Danh sách chi nhánh lưu trong một file JSON:
+    {"branches": {"HN": {"name": "Hà Nội", "db": "hn.db"}}, "index": "chain_index.db"}
+    Đường dẫn tương đối tính từ thư mục chứa file registry.
+    """
+
+    def __init__(self, path=DEFAULT_REGISTRY, branches=None, index="chain_index.db"):
+        self.path = path
+        self.branches = branches or {}
+        self.index = index
+
+    @classmethod
+    def load(cls, path=None):
+        path = path or DEFAULT_REGISTRY
+        if not os.path.exists(path):
+            return cls(path)
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(path, data.get("branches", {}), data.get("index", "chain_index.db"))
+
+    def save(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"branches": self.branches, "index": self.index}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+
+    def _resolve(self, path):
+        return os.path.join(os.path.dirname(os.path.abspath(self.path)), path)
+
+    @property
+    def codes(self):
+        return sorted(self.branches)
+
+    def add(self, code, name, db_path):
+        self.branches[code] = {"name": name, "db": db_path}
+        self.save()
+
+    def remove(self, code):
+        if self.branches.pop(code, None) is None:
+            raise KeyError(f"Unknown branch {code!r}")
+        self.save()
+
+    def name(self, code):
+        return self.branches[code]["name"]
+
+    def db_path(self, code):
+        if code not in self.branches:
+            raise KeyError(f"Unknown branch {code!r}, registered: {', '.join(self.codes) or 'none'}")
+        return self._resolve(self.branches[code]["db"])
+
+    @property
+    def index_path(self):
+        return self._resolve(self.index)
+
+
+def local_db_path(default="bookstore.db"):
+    """File database của quầy này: chi nhánh BOOKSTORE_BRANCH trong registry, không có thì default."""
+    code = os.getenv("BOOKSTORE_BRANCH")
+    if not code:
+        return default
+    return BranchRegistry.load().db_path(code)
+
+
+class ChainReporter:
+    def __init__(self, registry, workers=4, read_only=False):
+        """
+        read_only=False: mở chi nhánh có quyền ghi để cube doanh số được cập nhật tăng dần trước khi đọc;
+        read_only=True: chỉ đọc cube như chi nhánh đã lưu (có thể trễ hơn đơn mới nhất).
+        """
+        self.registry = registry
+        self.workers = workers
+        self.read_only = read_only
+        self.errors = {}
+        self._dbs = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self._index_lock = threading.Lock()
+        self._index = None
+        self._title_keys = {}  # tên sách -> tên chuẩn hoá, dùng lại giữa các báo cáo
+
+    # Branches
+    def _branch(self, code):
+        with self._lock:
+            if code not in self._dbs:
+                path = self.registry.db_path(code)
+                if not os.path.exists(path):
+                    raise FileNotFoundError(f"Database of branch {code} not found: {path}")
+                self._dbs[code] = DatabaseManager(path, read_only=self.read_only)
+                self._locks[code] = threading.Lock()
+            return self._dbs[code], self._locks[code]
+
+    def _per_branch(self, fn):
+        """
+        Chạy fn(db) trên mọi chi nhánh song song, trả về {code: kết quả}.
+        Chi nhánh lỗi (file thiếu, đang khoá...) được ghi vào self.errors và bỏ qua.
+        """
+        def run(code):
+            db, lock = self._branch(code)
+            with lock:
+                return fn(db)
+
+        results = {}
+        self.errors = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {code: pool.submit(run, code) for code in self.registry.codes}
+        for code, future in futures.items():
+            try:
+                results[code] = future.result()
+            except Exception as e:
+                logging.error(f"Branch {code} failed: {e}")
+                self.errors[code] = str(e)
+        return results
+
+    # Reports
+    def branch_summary(self, start_date=None, end_date=None):
+        """Số bán/doanh thu/lợi nhuận trong khoảng ngày và tồn kho hiện tại của từng chi nhánh."""
+        def summary(db):
+            sales = db.get_sales_trend("quarter", start_date, end_date)
+            stock = db.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(stock), 0), COALESCE(SUM(stock * buy_price), 0) FROM books"
+            ).fetchone()
+            return [int(sales["quantity"].sum()), int(sales["revenue"].sum()), int(sales["profit"].sum()), *stock]
+
+        rows = [[code, self.registry.name(code), *values] for code, values in self._per_branch(summary).items()]
+        return pd.DataFrame(rows, columns=SUMMARY_COLUMNS)
+
+    def _concat(self, frames):
+        frames = [df.assign(branch=code) for code, df in frames.items() if not df.empty]
+        return pd.concat(frames, ignore_index=True) if frames else None
+
+    def sales_trend(self, grain="month", start_date=None, end_date=None, genre=None, by_branch=False):
+        data = self._concat(self._per_branch(lambda db: db.get_sales_trend(grain, start_date, end_date, genre)))
+        if data is None:
+            return pd.DataFrame(columns=(["branch"] if by_branch else []) + TREND_COLUMNS)
+        if by_branch:
+            return data[["branch"] + TREND_COLUMNS].sort_values(["period", "branch"], ignore_index=True)
+        return data.groupby("period", as_index=False)[TREND_COLUMNS[1:]].sum()[TREND_COLUMNS]
+
+    def genre_share(self, start_date=None, end_date=None):
+        data = self._concat(self._per_branch(lambda db: db.get_genre_share(start_date, end_date)))
+        if data is None:
+            return pd.DataFrame(columns=GENRE_COLUMNS)
+        data = data.groupby("genre", as_index=False)[["quantity", "revenue", "profit"]].sum()
+        data["share"] = data["revenue"] / data["revenue"].sum() if data["revenue"].sum() else 0.0
+        return data.sort_values("revenue", ascending=False, ignore_index=True)[GENRE_COLUMNS]
+
+    def best_sellers(self, n=10, start_date=None, end_date=None, by="revenue"):
+        """
+        Top-n toàn chuỗi, gộp sách theo tên đã chuẩn hoá. Mỗi chi nhánh trả về đủ các sách có bán
+        (top-n từng nơi cộng lại không chắc là top-n của cả chuỗi).
+        """
+        data = self._concat(self._per_branch(lambda db: db.get_best_sellers(sys.maxsize, start_date, end_date, by)))
+        if data is None:
+            return pd.DataFrame(columns=CHAIN_BEST_SELLER_COLUMNS)
+        titles = data["title"].unique()
+        missing = [t for t in titles if t not in self._title_keys]
+        self._title_keys.update(zip(missing, map(normalize, missing)))
+        data["title_key"] = data["title"].map(self._title_keys)
+        merged = data.groupby("title_key", as_index=False).agg(
+            title=("title", "first"), genre=("genre", "first"), quantity=("quantity", "sum"),
+            revenue=("revenue", "sum"), profit=("profit", "sum"), branches=("branch", "nunique"),
+        )
+        return merged.nlargest(n, by).reset_index(drop=True)[CHAIN_BEST_SELLER_COLUMNS]
+
+    # Merged stock index
+    def _index_conn(self):
+        if self._index is None:
+            conn = sqlite3.connect(self.registry.index_path, check_same_thread=False)
+            conn.create_function("title_key", 1, lambda title: normalize(title or ""), deterministic=True)
+            with conn:
+                for statement in INDEX_SCHEMA:
+                    conn.execute(statement)
+            self._index = conn
+        return self._index
+
+    @staticmethod
+    def _books_version(path):
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            row = conn.execute("SELECT version FROM table_versions WHERE name = 'books'").fetchone()
+            return row[0] if row else None
+        except sqlite3.OperationalError:
+            return None  # database cũ chưa có table_versions: luôn đọc lại
+        finally:
+            conn.close()
+
+    def _index_branch(self, conn, code):
+        """Đồng bộ sách của một chi nhánh vào chỉ mục gộp; chỉ ghi các dòng thay đổi."""
+        path = self.registry.db_path(code)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Database of branch {code} not found: {path}")
+        version = self._books_version(path)
+        row = conn.execute("SELECT books_version FROM branch_index_state WHERE branch = ?", (code,)).fetchone()
+        if version is not None and row and row[0] == version:
+            return False
+
+        conn.execute("ATTACH DATABASE ? AS branch", (path,))
+        try:
+            with conn:
+                conn.execute("""
+                             UPDATE branch_books
+                             SET stock = b.stock, sell_price = b.sell_price, author = b.author, genre = b.genre,
+                                 title_key = CASE WHEN branch_books.title IS b.title THEN branch_books.title_key
+                                                  ELSE title_key(b.title) END,
+                                 title = b.title
+                             FROM branch.books b
+                             WHERE branch_books.branch = ? AND branch_books.book_id = b.id
+                               AND (branch_books.stock IS NOT b.stock OR branch_books.sell_price IS NOT b.sell_price
+                                 OR branch_books.title IS NOT b.title OR branch_books.author IS NOT b.author
+                                 OR branch_books.genre IS NOT b.genre)
+                             """, (code,))
+                conn.execute("""
+                             INSERT INTO branch_books (branch, book_id, title_key, title, author, genre, sell_price, stock)
+                             SELECT ?, b.id, title_key(b.title), b.title, b.author, b.genre, b.sell_price, b.stock
+                             FROM branch.books b
+                             WHERE NOT EXISTS (SELECT 1 FROM branch_books x WHERE x.branch = ? AND x.book_id = b.id)
+                             """, (code, code))
+                conn.execute("DELETE FROM branch_books WHERE branch = ? AND book_id NOT IN (SELECT id FROM branch.books)",
+                             (code,))
+                conn.execute(
+                    "INSERT INTO branch_index_state (branch, books_version) VALUES (?, ?) "
+                    "ON CONFLICT (branch) DO UPDATE SET books_version = excluded.books_version",
+                    (code, version),
+                )
+        finally:
+            conn.execute("DETACH DATABASE branch")
+        return True
+
+    def refresh_index(self):
+        """Cập nhật chỉ mục gộp cho các chi nhánh đã thay đổi; trả về danh sách chi nhánh đã đọc lại."""
+        with self._index_lock:
+            conn = self._index_conn()
+            refreshed = []
+            self.errors = {}
+            for code in self.registry.codes:
+                try:
+                    if self._index_branch(conn, code):
+                        refreshed.append(code)
+                except Exception as e:
+                    logging.error(f"Indexing branch {code} failed: {e}")
+                    self.errors[code] = str(e)
+            # Chi nhánh đã bị gỡ khỏi registry
+            placeholders = ",".join("?" * len(self.registry.codes))
+            with conn:
+                conn.execute(f"DELETE FROM branch_books WHERE branch NOT IN ({placeholders})", self.registry.codes)
+                conn.execute(f"DELETE FROM branch_index_state WHERE branch NOT IN ({placeholders})", self.registry.codes)
+            return refreshed
+
+    def where_is(self, title, in_stock=True, limit=50, refresh=True):
+        """
+        Chi nhánh nào có sách này: khớp đúng tên trước, không có thì theo tiền tố, rồi theo chuỗi con.
+        Tên được chuẩn hoá (chữ thường, bỏ dấu) nên "de men" khớp "Dế Mèn".
+        """
+        if refresh:
+            self.refresh_index()
+        key = normalize(title)
+        if not key:
+            return pd.DataFrame(columns=WHERE_COLUMNS)
+        stock_filter = " AND stock > 0" if in_stock else ""
+        conditions = [
+            ("title_key = ?", (key,)),
+            ("title_key >= ? AND title_key < ?", (key, key[:-1] + chr(ord(key[-1]) + 1))),
+            ("title_key LIKE ?", (f"%{key}%",)),
+        ]
+        with self._index_lock:
+            conn = self._index_conn()
+            for condition, params in conditions:
+                rows = conn.execute(
+                    f"SELECT branch, book_id, title, author, sell_price, stock FROM branch_books "
+                    f"WHERE {condition}{stock_filter} ORDER BY title_key, stock DESC LIMIT ?",
+                    (*params, limit),
+                ).fetchall()
+                if rows:
+                    break
+        names = {code: self.registry.name(code) for code in self.registry.codes}
+        return pd.DataFrame(
+            [(branch, names.get(branch, branch), *rest) for branch, *rest in rows], columns=WHERE_COLUMNS
+        )
+
+    def close(self):
+        for db in self._dbs.values():
+            db.close()
+        self._dbs.clear()
+        if self._index is not None:
+            self._index.close()
+            self._index = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage branches and run chain-wide reports")
+    parser.add_argument("--registry", default=DEFAULT_REGISTRY)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--read-only", action="store_true", help="use branch rollups as stored, do not refresh them")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    add = sub.add_parser("add")
+    add.add_argument("code")
+    add.add_argument("name")
+    add.add_argument("db")
+    remove = sub.add_parser("remove")
+    remove.add_argument("code")
+    sub.add_parser("list")
+
+    for name in ("summary", "trend", "genres", "best-sellers"):
+        report = sub.add_parser(name)
+        report.add_argument("--start")
+        report.add_argument("--end")
+        if name == "trend":
+            report.add_argument("--grain", default="month")
+            report.add_argument("--by-branch", action="store_true")
+        if name == "best-sellers":
+            report.add_argument("-n", type=int, default=10)
+            report.add_argument("--by", default="revenue")
+
+    where = sub.add_parser("where")
+    where.add_argument("title")
+    where.add_argument("--all", action="store_true", help="include branches with no stock")
+    sub.add_parser("index")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    registry = BranchRegistry.load(args.registry)
+
+    if args.command == "add":
+        registry.add(args.code, args.name, args.db)
+        print(f"Added {args.code} -> {registry.db_path(args.code)}")
+        return
+    if args.command == "remove":
+        registry.remove(args.code)
+        print(f"Removed {args.code}")
+        return
+    if args.command == "list":
+        for code in registry.codes:
+            print(f"{code}\t{registry.name(code)}\t{registry.db_path(code)}")
+        return
+
+    chain = ChainReporter(registry, workers=args.workers, read_only=args.read_only)
+    try:
+        if args.command == "summary":
+            result = chain.branch_summary(args.start, args.end)
+        elif args.command == "trend":
+            result = chain.sales_trend(args.grain, args.start, args.end, by_branch=args.by_branch)
+        elif args.command == "genres":
+            result = chain.genre_share(args.start, args.end)
+        elif args.command == "best-sellers":
+            result = chain.best_sellers(args.n, args.start, args.end, args.by)
+        elif args.command == "where":
+            result = chain.where_is(args.title, in_stock=not args.all)
+        else:
+            result = f"Re-indexed: {', '.join(chain.refresh_index()) or 'nothing changed'}"
+        print(result.to_string(index=False) if isinstance(result, pd.DataFrame) else result)
+        for code, error in chain.errors.items():
+            print(f"! {code}: {error}")
+    finally:
+        chain.close()
+
+
+if __name__ == "__main__":
+    main()
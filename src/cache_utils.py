@@ -0,0 +1,52 @@
+import sqlite3
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Small least-recently-used cache used for chart renders and report data."""
+
+    def __init__(self, max_size=16):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def discard_where(self, predicate):
+        """Xoá các mục có predicate(key, value) đúng; trả về số mục đã xoá."""
+        with self._lock:
+            keys = [key for key, value in self._data.items() if predicate(key, value)]
+            for key in keys:
+                del self._data[key]
+        return len(keys)
+
+
+def bump_table_versions(conn, *tables):
+    """
+    Tăng version của các bảng (xem DatabaseManager.table_versions) một lần cho cả transaction ghi:
+    gọi bên trong transaction, sau các câu lệnh ghi. Database chưa có bảng table_versions thì bỏ qua.
+    """
+    if not tables:
+        return
+    try:
+        conn.execute(f"UPDATE table_versions SET version = version + 1 WHERE name IN ({', '.join('?' * len(tables))})",
+                     tables)
+    except sqlite3.OperationalError:
+        pass
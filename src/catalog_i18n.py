@@ -0,0 +1,234 @@
+"""
+Bản dịch sẵn của danh mục sách (tên, thể loại, mô tả) cho các ngôn ngữ cửa hàng phục vụ, để trả lời
+khách bằng tiếng Việt mà không phải gọi dịch qua mạng ở mỗi câu hỏi.
+
+    translator = CatalogTranslator(db)              # ngôn ngữ: BOOKSTORE_LANGUAGES (mặc định "vi")
+    translator.translate_pending()                  # dịch theo batch các sách mới / vừa sửa
+    translator.localized("vi", [12, 40])            # {12: {"title", "genre", "description"}, ...}
+    python catalog_i18n.py --db bookstore.db translate
+    python catalog_i18n.py --db bookstore.db set 12 vi --title "Mã sạch"
+
+- Danh mục gốc bằng tiếng Anh (SOURCE_LANG); bản dịch nằm trong book_translations, khoá (lang, book_id).
+- Trigger xoá bản dịch máy khi title / genre / description của sách đổi, nên "cần dịch" chỉ là các sách
+  chưa có hàng bản dịch (anti join). Bản dịch tay (source = 'manual') được giữ nguyên.
+- Mỗi request dịch gộp nhiều chuỗi (mỗi chuỗi một dòng, tới MAX_CHARS ký tự); chuỗi trùng nhau và
+  thể loại đã dịch trước đó không dịch lại. Được chạy bởi task "translations" của maintenance.py.
+- Mất mạng thì sách còn nằm trong danh sách chờ; chỗ đọc dùng lại văn bản gốc.
+"""
+import argparse
+import os
+import sqlite3
+
+SOURCE_LANG = "en"
+LANGUAGES = [lang.strip() for lang in os.getenv("BOOKSTORE_LANGUAGES", "vi").split(",")
+             if lang.strip() and lang.strip() != SOURCE_LANG]
+LANGUAGE_NAMES = {"en": "English", "vi": "Vietnamese", "fr": "French", "zh-CN": "Chinese", "ja": "Japanese",
+                  "ko": "Korean"}
+FIELDS = ("title", "genre", "description")
+MAX_CHARS = 4500  # giới hạn một request của Google Translate là 5000 ký tự
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS book_translations (
+        lang TEXT NOT NULL,
+        book_id INTEGER NOT NULL,
+        title TEXT,
+        genre TEXT,
+        description TEXT,
+        source TEXT NOT NULL DEFAULT 'machine',
+        updated_at TEXT,
+        PRIMARY KEY (lang, book_id)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS book_translations_stale
+    AFTER UPDATE OF title, genre, description ON books
+    WHEN NEW.title IS NOT OLD.title OR NEW.genre IS NOT OLD.genre OR NEW.description IS NOT OLD.description
+    BEGIN
+        DELETE FROM book_translations WHERE book_id = NEW.id AND source = 'machine';
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS book_translations_delete
+    AFTER DELETE ON books
+    BEGIN
+        DELETE FROM book_translations WHERE book_id = OLD.id;
+    END
+    """,
+]
+
+
+def google_translate_batch(texts, dest, src=SOURCE_LANG, max_chars=MAX_CHARS):
+    """Dịch list chuỗi (không rỗng, một dòng) bằng ít request nhất có thể."""
+    from deep_translator import GoogleTranslator
+
+    translator = GoogleTranslator(source=src, target=dest)
+    result = []
+    for chunk in _chunks(texts, max_chars):
+        lines = (translator.translate("\n".join(chunk)) or "").split("\n")
+        if len(lines) != len(chunk):
+            # Bản dịch gộp / tách dòng: dịch riêng từng chuỗi của chunk này
+            lines = [translator.translate(text) or text for text in chunk]
+        result.extend(line.strip() for line in lines)
+    return result
+
+
+def _clean(text):
+    """Một dòng, khoảng trắng gọn: các chuỗi được gộp theo dòng trong một request."""
+    return " ".join(str(text or "").split())
+
+
+def _chunks(texts, max_chars):
+    chunk, size = [], 0
+    for text in texts:
+        if chunk and size + len(text) + 1 > max_chars:
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(text[:max_chars])
+        size += len(text) + 1
+    if chunk:
+        yield chunk
+
+
+class CatalogTranslator:
+    """translate_batch(texts, lang) -> list bản dịch cùng thứ tự (mặc định google_translate_batch)."""
+
+    def __init__(self, db, languages=None, translate_batch=None):
+        self.db = db
+        self.conn = db.conn
+        self.languages = LANGUAGES if languages is None else languages
+        self.translate_batch = translate_batch or google_translate_batch
+        if not db.read_only:
+            with self.conn:
+                for statement in SCHEMA:
+                    self.conn.execute(statement)
+
+    # Dịch
+    def pending(self, lang, limit=-1, after=0):
+        """Sách chưa có bản dịch sang lang, id > after: [(id, title, genre, description)]."""
+        return self.conn.execute("""
+            SELECT b.id, b.title, b.genre, b.description FROM books b
+            WHERE b.id > ? AND NOT EXISTS (SELECT 1 FROM book_translations t WHERE t.lang = ? AND t.book_id = b.id)
+            ORDER BY b.id LIMIT ?
+        """, (after, lang, limit)).fetchall()
+
+    def _known_genres(self, lang):
+        """Thể loại gốc -> bản dịch đã có (không dịch lại ở mỗi batch)."""
+        return dict(self.conn.execute("""
+            SELECT b.genre, MAX(t.genre) FROM book_translations t JOIN books b ON b.id = t.book_id
+            WHERE t.lang = ? AND b.genre IS NOT NULL GROUP BY b.genre
+        """, (lang,)).fetchall())
+
+    def translate_pending(self, languages=None, batch_size=200):
+        """Dịch mọi sách đang chờ, mỗi batch một transaction (dừng giữa chừng thì lần sau làm tiếp). Trả về số hàng đã ghi."""
+        written = 0
+        for lang in languages or self.languages:
+            genres = self._known_genres(lang)
+            position = 0  # keyset theo id: mỗi batch đọc tiếp, không quét lại các sách đã dịch
+            while True:
+                rows = self.pending(lang, batch_size, position)
+                if not rows:
+                    break
+                position = rows[-1][0]
+                texts = {_clean(text) for row in rows for text in (row[1], row[3])}
+                texts |= {_clean(genre) for _, _, genre, _ in rows if genre not in genres}
+                texts = sorted(texts - {""})
+                translated = dict(zip(texts, self.translate_batch(texts, lang))) if texts else {}
+
+                def local(text):
+                    return translated.get(_clean(text)) or text
+
+                for _, _, genre, _ in rows:
+                    if genre and genre not in genres:
+                        genres[genre] = local(genre)
+
+                values = [(lang, book_id, local(title), genres.get(genre, genre), local(description))
+                          for book_id, title, genre, description in rows]
+                with self.conn:
+                    # DO NOTHING: bản dịch tay vừa được ghi trong lúc đang dịch thì giữ bản tay
+                    self.conn.executemany("""
+                        INSERT INTO book_translations (lang, book_id, title, genre, description, updated_at)
+                        VALUES (?, ?, ?, ?, ?, datetime('now', 'localtime'))
+                        ON CONFLICT(lang, book_id) DO NOTHING
+                    """, values)
+                written += len(values)
+        return written
+
+    def set_translation(self, book_id, lang, **fields):
+        """Bản dịch tay (title / genre / description); trường không truyền giữ bản dịch hiện có hoặc văn bản gốc."""
+        unknown = set(fields) - set(FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown translation fields: {', '.join(sorted(unknown))}")
+        current = self.localized(lang, [book_id]).get(book_id)
+        if current is None:
+            row = self.conn.execute("SELECT title, genre, description FROM books WHERE id = ?", (book_id,)).fetchone()
+            if row is None:
+                raise ValueError(f"Book {book_id} not found")
+            current = dict(zip(FIELDS, row))
+        values = {field: fields.get(field) or current[field] for field in FIELDS}
+        with self.conn:
+            self.conn.execute("""
+                INSERT OR REPLACE INTO book_translations (lang, book_id, title, genre, description, source, updated_at)
+                VALUES (?, ?, ?, ?, ?, 'manual', datetime('now', 'localtime'))
+            """, (lang, book_id, values["title"], values["genre"], values["description"]))
+
+    # Đọc
+    def localized(self, lang, book_ids=None):
+        """{book_id: {"title", "genre", "description"}} của các sách đã dịch (book_ids=None: cả danh mục)."""
+        query = "SELECT book_id, title, genre, description FROM book_translations WHERE lang = ?"
+        params = [lang]
+        if book_ids is not None:
+            book_ids = [int(b) for b in book_ids]
+            if not book_ids:
+                return {}
+            query += f" AND book_id IN ({','.join('?' * len(book_ids))})"
+            params += book_ids
+        try:
+            rows = self.conn.execute(query, params).fetchall()
+        except sqlite3.OperationalError:
+            return {}  # database cũ mở read-only, chưa có bảng
+        return {row[0]: dict(zip(FIELDS, row[1:])) for row in rows}
+
+    def coverage(self):
+        """{lang: {"translated": n, "pending": m}} cho các ngôn ngữ đang phục vụ."""
+        total = self.conn.execute("SELECT COUNT(*) FROM books").fetchone()[0]
+        result = {}
+        for lang in self.languages:
+            done = self.conn.execute(
+                "SELECT COUNT(*) FROM book_translations WHERE lang = ?", (lang,)
+            ).fetchone()[0]
+            result[lang] = {"translated": done, "pending": total - done}
+        return result
+
+
+def main():
+    from database_manager import DatabaseManager
+
+    parser = argparse.ArgumentParser(description="Pre-translated catalog fields")
+    parser.add_argument("--db", default="bookstore.db")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("translate", help="translate new and edited books")
+    sub.add_parser("status", help="translated / pending books per language")
+    p = sub.add_parser("set", help="set a manual translation")
+    p.add_argument("book_id", type=int)
+    p.add_argument("lang")
+    for field in FIELDS:
+        p.add_argument(f"--{field}")
+    args = parser.parse_args()
+
+    db = DatabaseManager(args.db)
+    translator = db.catalog_translator()
+    try:
+        if args.command == "translate":
+            print(f"Translated {translator.translate_pending()} books")
+        elif args.command == "set":
+            translator.set_translation(args.book_id, args.lang,
+                                       **{f: getattr(args, f) for f in FIELDS if getattr(args, f)})
+        for lang, counts in translator.coverage().items():
+            print(f"{lang}: {counts['translated']} translated, {counts['pending']} pending")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,56 +1,84 @@
-import logging
-import os
-import pyttsx3
-from openai import OpenAI
+import re
 
-# Initialize OpenAI client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+from catalog_i18n import LANGUAGE_NAMES
+from instrumentation import timed
+from llm_gateway import LLMGateway
 
-# Initialize voice engine
-engine = pyttsx3.init()
-engine.setProperty("rate", 160)
-engine.setProperty("voice", engine.getProperty("voices")[1].id)  # choose voice (0=male, 1=female depending on system)
+# Một gateway dùng chung: giữ kết nối, timeout, retry, giới hạn đồng thời, circuit breaker
+gateway = LLMGateway()
 
+CUSTOMER_FALLBACK = (
+    "Sorry, our assistant is busy right now. "
+    "Please ask a staff member or try again in a moment."
+)
+MANAGEMENT_FALLBACK = "The AI assistant is unavailable right now. Please try again later."
 
-def speak_text(text: str, lang: str = "en"):
-    """Convert text to speech."""
-    try:
-        engine.say(text)
-        engine.runAndWait()
-    except Exception as e:
-        logging.error(f"Speech error: {str(e)}")
+CUSTOMER_PROMPT = (
+    "You are a friendly bookstore assistant. "
+    "You help customers find books, suggest books by genre, "
+    "and answer basic questions about the bookstore."
+)
 
 
-def chat_with_customer(question: str) -> str:
-    """Customer chatbot - friendly assistant for book shopping."""
-    system_prompt = (
-        "You are a friendly bookstore assistant. "
-        "You help customers find books, suggest books by genre, "
-        "and answer basic questions about the bookstore."
-    )
+def _customer_messages(question, lang="en", context=None):
+    """
+    Trả lời thẳng bằng ngôn ngữ của khách (không dịch câu hỏi / câu trả lời qua mạng);
+    context: thông tin sách đã dịch sẵn để model không phải tự dịch tên, thể loại.
+    """
+    prompt = CUSTOMER_PROMPT + f" Always reply in {LANGUAGE_NAMES.get(lang, lang)}."
+    if context:
+        prompt += f"\nCatalog information for this question:\n{context}"
+    return [
+        {"role": "system", "content": prompt},
+        {"role": "user", "content": question}
+    ]
 
-    try:
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": question}
-        ]
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=messages,
-            max_tokens=200
-        )
-        reply = response.choices[0].message.content.strip()
-        speak_text(reply, lang="en")  # speak out the reply
-        return reply
-    except Exception as e:
-        logging.error(f"chat_with_customer error: {str(e)}")
-        return "Sorry, something went wrong. Please try again."
 
+# Hết câu: . ! ? … (có thể kèm ngoặc/nháy) rồi khoảng trắng, hoặc xuống dòng
+_SENTENCE_END = re.compile(r'(?<=[.!?…])["\')\]]*\s+|\n+')
 
-def chat_with_management(question: str, context: str = "") -> str:
+
+class SentenceBuffer:
+    """Gom token stream thành câu hoàn chỉnh để đọc từng câu."""
+
+    def __init__(self, on_sentence):
+        self.on_sentence = on_sentence
+        self._buffer = ""
+
+    def feed(self, text):
+        self._buffer += text
+        *sentences, self._buffer = _SENTENCE_END.split(self._buffer)
+        for sentence in sentences:
+            if sentence.strip():
+                self.on_sentence(sentence.strip())
+
+    def flush(self):
+        rest, self._buffer = self._buffer.strip(), ""
+        if rest:
+            self.on_sentence(rest)
+
+
+@timed("llm.customer_stream")
+def stream_customer(question: str, on_text, on_sentence=None, lang: str = "en", context: str = None) -> str:
     """
-    Staff chatbot - bookstore management assistant.
+    Customer chatbot, streamed, trả lời thẳng bằng lang.
+    on_text nhận từng token ngay khi tới; on_sentence nhận từng câu đã xong. Trả về toàn bộ câu trả lời.
     """
+    messages = _customer_messages(question, lang, context)
+    buffer = SentenceBuffer(on_sentence) if on_sentence else None
+
+    def delta(text):
+        on_text(text)
+        if buffer:
+            buffer.feed(text)
+
+    reply = gateway.stream(messages, delta, max_tokens=200, fallback=CUSTOMER_FALLBACK)
+    if buffer:
+        buffer.flush()
+    return reply
+
+
+def _management_messages(question, context):
     system_prompt = (
         "You are a bookstore management assistant. "
         "You ONLY answer questions about:\n"
@@ -62,17 +90,22 @@ def chat_with_management(question: str, context: str = "") -> str:
         f"Current data: {context}"
     )
 
-    conversation = [
+    return [
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": question}
     ]
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=conversation,
-            max_tokens=200
-        )
-        return response.choices[0].message.content
-    except Exception as e:
-        return f"Error: {e}"
+
+@timed("llm.management")
+def chat_with_management(question: str, context: str = "") -> str:
+    """
+    Staff chatbot - bookstore management assistant.
+    """
+    return gateway.chat(_management_messages(question, context), max_tokens=200, fallback=MANAGEMENT_FALLBACK)
+
+
+@timed("llm.management_stream")
+def stream_management(question: str, context: str, on_text) -> str:
+    """Staff chatbot, streamed: on_text nhận từng token ngay khi tới."""
+    return gateway.stream(_management_messages(question, context), on_text, max_tokens=200,
+                          fallback=MANAGEMENT_FALLBACK)
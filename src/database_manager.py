@@ -1,15 +1,74 @@
+import os
+import re
 import sqlite3
+import time
 import pandas as pd
 from datetime import datetime
-import uuid
+
+from cache_utils import bump_table_versions
+from catalog_i18n import CatalogTranslator
+from instrumentation import InstrumentedConnection, instrument_connection
+from maintenance import read_status
+from order_ids import new_order_id, normalize_order_id, resolve_order_id
+from pick_route import PickPlanner
+from pricing_simulator import PricingSimulator
+from recommender import Recommender
+from sales_cube import SalesCube
+from stock_alerts import DEFAULT_THRESHOLD, StockAlerts
+
+# Từ khoá tìm đơn dạng ngày ("2024", "2024-05", "2024-05-01"), dùng chung với ô tìm kiếm History
+DATE_PREFIX = re.compile(r"^\d{4}(-\d{2}){0,2}$")
+
+
+def _prefix_upper_bound(prefix):
+    """Chuỗi nhỏ nhất lớn hơn mọi chuỗi bắt đầu bằng prefix (dùng cho truy vấn khoảng)."""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+BOOK_FIELDS = ("title", "author", "genre", "description", "shelf_position", "buy_price", "sell_price", "stock")
+
+# Các bảng được đếm phiên bản (xem table_versions)
+VERSIONED_TABLES = ("books", "orders", "order_items")
+
+# Thời gian giữ hàng trong giỏ (giây) trước khi tự động nhả
+RESERVATION_TTL = 15 * 60
+
+
+class InsufficientStockError(ValueError):
+    """Không đủ hàng để giữ cho giỏ; available là số lượng còn có thể giữ."""
+
+    def __init__(self, book_id, requested, available):
+        super().__init__(f"Only {available} copies of book {book_id} available, {requested} requested")
+        self.book_id = book_id
+        self.requested = requested
+        self.available = available
 
 
 class DatabaseManager:
-    def __init__(self, db_name="bookstore.db"):
-        self.conn = sqlite3.connect(db_name, check_same_thread=False)
+    def __init__(self, db_name="bookstore.db", read_only=False):
+        self.db_name = db_name
+        self.read_only = read_only
+        self.archive_path = f"{os.path.splitext(db_name)[0]}_archive.db"
+        self._archive_attached = False
+        self._sales_cube = None
+        self._recommender = None
+        self._pricing_simulator = None
+        self._stock_alerts = None
+        self._pick_planner = None
+        self._catalog_translator = None
+        if read_only:
+            self.conn = sqlite3.connect(f"file:{db_name}?mode=ro", uri=True, check_same_thread=False,
+                                        factory=InstrumentedConnection)
+        else:
+            self.conn = sqlite3.connect(db_name, check_same_thread=False, factory=InstrumentedConnection)
+        instrument_connection(self.conn)
         self.conn.row_factory = sqlite3.Row
         self.cursor = self.conn.cursor()
-        self.create_tables()
+        if not read_only:
+            self.create_tables()
+            # Trigger cảnh báo tồn kho / đánh dấu bản dịch cũ phải có trước lần ghi books đầu tiên
+            self.stock_alerts()
+            self.catalog_translator()
 
     def create_tables(self):
         """Tạo các bảng cần thiết"""
@@ -49,6 +108,49 @@ class DatabaseManager:
                                 )
                             """)
 
+        # Giữ hàng cho giỏ đang mở (dùng chung giữa các quầy)
+        self.cursor.execute("""
+                            CREATE TABLE IF NOT EXISTS reservations (
+                                                                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                                                                    cart_id TEXT NOT NULL,
+                                                                    book_id INTEGER NOT NULL,
+                                                                    quantity INTEGER NOT NULL,
+                                                                    expires_at REAL NOT NULL,
+                                                                    FOREIGN KEY(book_id) REFERENCES books(id) ON DELETE CASCADE
+                                )
+                            """)
+        # Covering index: SUM(quantity) của các hold còn hạn chỉ đọc index, không đọc bảng
+        self.cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_reservations_book_expiry ON reservations(book_id, expires_at, quantity)"
+        )
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_reservations_cart ON reservations(cart_id)")
+
+        # Lịch sử đơn: keyset theo created_at, chi tiết đơn theo order_id
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_created_at ON orders(created_at, id)")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_order_items_order_id ON order_items(order_id)")
+
+        # Chatbot liệt kê sách theo thể loại, nhiều tồn kho trước (không cần sort)
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_books_genre_stock ON books(genre, stock)")
+
+        # Phiên bản từng bảng: mỗi transaction ghi tăng version một lần (bump_table_versions, kể cả ở
+        # tiến trình khác), UI so version để biết dữ liệu một tab đã cũ hay chưa
+        self.cursor.execute("""
+                            CREATE TABLE IF NOT EXISTS table_versions (
+                                                                    name TEXT PRIMARY KEY,
+                                                                    version INTEGER NOT NULL DEFAULT 0
+                                )
+                            """)
+        for table in VERSIONED_TABLES:
+            self.cursor.execute("INSERT OR IGNORE INTO table_versions (name) VALUES (?)", (table,))
+
+        # Trạng thái archive (xem archive_manager.py)
+        self.cursor.execute("""
+                            CREATE TABLE IF NOT EXISTS archive_state (
+                                                                    key TEXT PRIMARY KEY,
+                                                                    value TEXT
+                                )
+                            """)
+
         self.conn.commit()
 
     #Books
@@ -58,16 +160,39 @@ class DatabaseManager:
             "INSERT INTO books (title, author, genre, description, shelf_position, buy_price, sell_price, stock) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
             (title, author, genre, description, shelf_position, buy_price, sell_price, stock)
         )
+        bump_table_versions(self.conn, "books")
         self.conn.commit()
 
     def delete_book(self, book_id):
         self.conn.execute("DELETE FROM books WHERE id = ?", (book_id,))
+        bump_table_versions(self.conn, "books")
         self.conn.commit()
 
     def get_books(self):
         df = pd.read_sql_query("SELECT * FROM books", self.conn)
         return df
 
+    def import_books(self, books):
+        """Thêm nhiều sách trong một transaction; books là list dict có đủ BOOK_FIELDS."""
+        rows = [tuple(book[field] for field in BOOK_FIELDS) for book in books]
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT INTO books ({', '.join(BOOK_FIELDS)}) VALUES ({', '.join('?' * len(BOOK_FIELDS))})", rows
+            )
+            bump_table_versions(self.conn, "books")
+        return len(rows)
+
+    def restock_books(self, items):
+        """Nhập thêm hàng: items là list (book_id, quantity), cộng vào tồn kho trong một transaction."""
+        items = [(int(book_id), int(quantity)) for book_id, quantity in items]
+        if any(quantity <= 0 for _, quantity in items):
+            raise ValueError("Restock quantity must be positive")
+        with self.conn:
+            self.conn.executemany("UPDATE books SET stock = stock + ? WHERE id = ?",
+                                  [(quantity, book_id) for book_id, quantity in items])
+            bump_table_versions(self.conn, "books")
+        return len(items)
+
     def find_book_by_title(self, title):
         query = """
                     SELECT title, author, description, shelf_position, sell_price, stock
@@ -77,37 +202,171 @@ class DatabaseManager:
         row = self.conn.execute(query, (title,)).fetchone()
         return row
 
+    def get_book_id(self, title):
+        row = self.conn.execute("SELECT id FROM books WHERE LOWER(title) = LOWER(?)", (title,)).fetchone()
+        return row[0] if row else None
+
+    def find_book(self, title_or_id):
+        """Tìm sách theo ID hoặc Title (không phân biệt hoa thường)."""
+        title_or_id = str(title_or_id).strip()
+        if title_or_id.isdigit():
+            row = self.conn.execute(
+                "SELECT id, title, buy_price, sell_price, stock FROM books WHERE id = ?",
+                (int(title_or_id),),
+            ).fetchone()
+        else:
+            row = self.conn.execute(
+                "SELECT id, title, buy_price, sell_price, stock FROM books WHERE LOWER(title) = LOWER(?)",
+                (title_or_id,),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def get_books_by_genre(self, genre, limit=10):
+        """Sách còn hàng của một thể loại, nhiều tồn kho trước."""
+        rows = self.conn.execute(
+            "SELECT id, title, sell_price, stock FROM books WHERE genre = ? AND stock > 0 ORDER BY stock DESC LIMIT ?",
+            (genre, limit),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    #Reservations
+    def _active_holds(self, book_id, now):
+        row = self.conn.execute(
+            "SELECT COALESCE(SUM(quantity), 0) FROM reservations WHERE book_id = ? AND expires_at > ?",
+            (book_id, now),
+        ).fetchone()
+        return row[0]
+
+    def get_available_stock(self, book_id):
+        """Tồn kho trừ đi số lượng đang được giữ bởi tất cả các giỏ còn hạn."""
+        row = self.conn.execute("SELECT stock FROM books WHERE id = ?", (book_id,)).fetchone()
+        if not row:
+            return 0
+        return (row[0] or 0) - self._active_holds(book_id, time.time())
+
+    def reserve_stock(self, cart_id, book_id, quantity, ttl=RESERVATION_TTL):
+        """
+        Giữ quantity cuốn cho cart_id. Kiểm tra và ghi trong cùng một transaction
+        IMMEDIATE nên hai quầy không thể cùng giữ cuốn cuối cùng.
+        Trả về số lượng còn lại sau khi giữ.
+        """
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.conn.execute("SELECT stock FROM books WHERE id = ?", (book_id,)).fetchone()
+            if not row:
+                raise ValueError(f"Book ID {book_id} not found in books table")
+            available = (row[0] or 0) - self._active_holds(book_id, now)
+            if quantity > available:
+                raise InsufficientStockError(book_id, quantity, max(available, 0))
+
+            self.conn.execute(
+                "INSERT INTO reservations (cart_id, book_id, quantity, expires_at) VALUES (?, ?, ?, ?)",
+                (cart_id, book_id, quantity, now + ttl),
+            )
+            # Giỏ còn hoạt động thì gia hạn toàn bộ hàng đang giữ
+            self.conn.execute("UPDATE reservations SET expires_at = ? WHERE cart_id = ?", (now + ttl, cart_id))
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return available - quantity
+
+    def release_reservations(self, cart_id, book_id=None):
+        """Nhả hàng đang giữ của một giỏ (hoặc chỉ của một cuốn trong giỏ)."""
+        with self.conn:
+            if book_id is None:
+                cur = self.conn.execute("DELETE FROM reservations WHERE cart_id = ?", (cart_id,))
+            else:
+                cur = self.conn.execute(
+                    "DELETE FROM reservations WHERE cart_id = ? AND book_id = ?", (cart_id, book_id)
+                )
+        return cur.rowcount
+
+    def sweep_expired_reservations(self):
+        """Xoá các hold đã hết hạn, trả về số dòng đã xoá."""
+        with self.conn:
+            cur = self.conn.execute("DELETE FROM reservations WHERE expires_at <= ?", (time.time(),))
+        return cur.rowcount
+
     #Orders
-    def create_order(self, items):
-        """Tạo 1 order mới cùng order_items"""
-        order_id = str(uuid.uuid4())[:8]
+    def create_order(self, items, cart_id=None):
+        """Tạo 1 order mới cùng order_items (và nhả hàng đang giữ của cart_id nếu có)"""
         total_qty = sum(it["quantity"] for it in items)
         total_amount = sum(it["total"] for it in items)
+        # Tạo trước transaction: lần đầu còn phải CREATE TABLE
+        recommender = self.recommender()
+
+        for attempt in range(3):
+            # Mã tăng theo thời gian (order_ids.py): chèn vào cuối index khoá chính
+            order_id = new_order_id()
+            try:
+                self._insert_order(order_id, items, total_qty, total_amount, cart_id, recommender)
+                break
+            except sqlite3.IntegrityError as e:
+                # Hai tiến trình cùng mã quầy sinh trùng mã trong cùng mili giây: lấy mã kế tiếp
+                if "orders.id" not in str(e) or attempt == 2:
+                    raise
+
+        return {"order_id": order_id, "total_qty": total_qty, "total_amount": total_amount}
+
+    def _insert_order(self, order_id, items, total_qty, total_amount, cart_id, recommender):
+        """
+        Kiểm tra tồn kho và ghi đơn trong cùng một transaction IMMEDIATE: hold của giỏ có thể đã hết hạn
+        và quầy khác đã giữ / bán mất cuốn cuối, khi đó báo InsufficientStockError và không ghi gì.
+        """
+        now = time.time()
+        wanted = {}
+        for it in items:
+            wanted[it["book_id"]] = wanted.get(it["book_id"], 0) + it["quantity"]
+
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            for book_id, quantity in wanted.items():
+                # Kiểm tra book_id tồn tại
+                row = self.conn.execute("SELECT stock FROM books WHERE id = ?", (book_id,)).fetchone()
+                if not row:
+                    raise ValueError(f"Book ID {book_id} not found in books table")
+                # Hàng các giỏ khác đang giữ không bán được; hàng của chính giỏ này thì được
+                held = self.conn.execute(
+                    "SELECT COALESCE(SUM(quantity), 0) FROM reservations"
+                    " WHERE book_id = ? AND expires_at > ? AND cart_id IS NOT ?",
+                    (book_id, now, cart_id),
+                ).fetchone()[0]
+                available = (row[0] or 0) - held
+                if quantity > available:
+                    raise InsufficientStockError(book_id, quantity, max(available, 0))
 
-        with self.conn:
             self.conn.execute(
                 "INSERT INTO orders (id, total_qty, total_amount, created_at) VALUES (?, ?, ?, ?)",
                 (order_id, total_qty, total_amount, datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
             )
 
             for it in items:
-                # Kiểm tra book_id tồn tại
-                book = self.conn.execute("SELECT id FROM books WHERE id = ?", (it["book_id"],)).fetchone()
-                if not book:
-                    raise ValueError(f"Book ID {it['book_id']} not found in books table")
-
                 self.conn.execute(
                     "INSERT INTO order_items (order_id, book_id, quantity, unit_price, total) VALUES (?, ?, ?, ?, ?)",
                     (order_id, it["book_id"], it["quantity"], it["unit_price"], it["total"]),
                 )
 
-                # Giảm tồn kho
-                self.conn.execute(
-                    "UPDATE books SET stock = stock - ? WHERE id = ?",
-                    (it["quantity"], it["book_id"]),
+                # Giảm tồn kho; điều kiện stock >= ? là chốt chặn cuối, không bao giờ xuống âm
+                cur = self.conn.execute(
+                    "UPDATE books SET stock = stock - ? WHERE id = ? AND stock >= ?",
+                    (it["quantity"], it["book_id"], it["quantity"]),
                 )
+                if cur.rowcount == 0:
+                    raise InsufficientStockError(it["book_id"], it["quantity"], 0)
 
-        return {"order_id": order_id, "total_qty": total_qty, "total_amount": total_amount}
+            # Hàng đã bán thì không cần giữ nữa
+            if cart_id:
+                self.conn.execute("DELETE FROM reservations WHERE cart_id = ?", (cart_id,))
+
+            # Cộng giỏ này vào ma trận "mua cùng" trong cùng transaction
+            recommender.record_new_orders()
+            bump_table_versions(self.conn, "books", "orders", "order_items")
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
 
     def get_orders(self):
         df = pd.read_sql_query("SELECT * FROM orders", self.conn)
@@ -126,29 +385,284 @@ class DatabaseManager:
         )
         return df
 
-    #Reports
-    def get_revenue(self, start_date=None, end_date=None):
+    def search_orders(self, order_prefix=None, start_date=None, end_date=None,
+                      min_amount=None, max_amount=None, after=None, limit=200, date_prefix=None):
+        """
+        Tìm đơn hàng, mới nhất trước. Đọc total_qty/total_amount có sẵn trong orders
+        (create_order đã lưu), không cần JOIN/GROUP BY order_items.
+        - order_prefix: tiền tố mã đơn, tìm theo khoảng trên index khoá chính. Mã gõ tay được chuẩn hoá
+          (chữ thường, O/I/L, dấu gạch) và mã cũ in trên hoá đơn được đổi sang mã mới.
+        - start_date/end_date: "YYYY-MM-DD" hoặc "YYYY-MM-DD HH:MM:SS".
+        - date_prefix: "2024", "2024-05" hoặc "2024-05-01".
+        - after: (created_at, order_id) của dòng cuối trang trước (keyset pagination).
+        Trả về list (order_id, total_qty, total_amount, created_at).
+        """
+        where = ""
+        params = []
+        # ATTACH archive trước khi tra mã cũ: ánh xạ của đơn đã archive nằm trong archive.order_id_map
+        spans_archive = self._spans_archive(start_date or date_prefix)
+        if order_prefix:
+            # Giữ cả chuỗi gốc: database chưa chuyển đổi còn mã cũ dạng hex chữ thường
+            prefixes = sorted({order_prefix, resolve_order_id(self.conn, order_prefix),
+                               resolve_order_id(self.conn, normalize_order_id(order_prefix))})
+            where += " AND (" + " OR ".join("(id >= ? AND id < ?)" for _ in prefixes) + ")"
+            for prefix in prefixes:
+                params += [prefix, _prefix_upper_bound(prefix)]
+        if date_prefix:
+            where += " AND created_at >= ? AND created_at < ?"
+            params += [date_prefix, _prefix_upper_bound(date_prefix)]
+        if start_date:
+            where += " AND created_at >= ?"
+            params.append(start_date)
+        if end_date:
+            where += " AND created_at <= ?"
+            params.append(end_date if len(end_date) > 10 else f"{end_date} 23:59:59")
+        if min_amount is not None:
+            where += " AND total_amount >= ?"
+            params.append(min_amount)
+        if max_amount is not None:
+            where += " AND total_amount <= ?"
+            params.append(max_amount)
+        if after:
+            where += " AND (created_at, id) < (?, ?)"
+            params += list(after)
+
+        select = "SELECT id AS order_id, total_qty, total_amount, created_at FROM {table} WHERE 1=1" + where
+        query = select.format(table="orders")
+        if spans_archive:
+            query += " UNION ALL " + select.format(table="archive.orders")
+            params = params * 2
+        query += " ORDER BY created_at DESC, order_id DESC"
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        return [tuple(row) for row in self.conn.execute(query, params).fetchall()]
+
+    def get_order_history(self, keyword=None, limit=None):
+        """
+        Danh sách đơn hàng (order_id, total_qty, total_amount, created_at), mới nhất trước.
+        keyword dạng ngày ("2024", "2024-05", "2024-05-01") lọc theo ngày, ngược lại là tiền tố mã đơn.
+        """
+        if not keyword:
+            return self.search_orders(limit=limit)
+        if DATE_PREFIX.match(keyword):
+            return self.search_orders(date_prefix=keyword, limit=limit)
+        return self.search_orders(order_prefix=keyword, limit=limit)
+
+    def get_order_details(self, order_id):
+        """Chi tiết từng dòng của một đơn: (title, quantity, unit_price, total)."""
         query = """
-                SELECT b.id as book_id, b.title,
-                       SUM(oi.quantity) as quantity,
-                       SUM(oi.total) as total_amount,
-                       SUM((b.sell_price - b.buy_price) * oi.quantity) as profit
-                FROM order_items oi
+                SELECT b.title,
+                       oi.quantity,
+                       CASE WHEN oi.unit_price IS NULL OR oi.unit_price = 0
+                                THEN b.sell_price ELSE oi.unit_price END as unit_price,
+                       (oi.quantity * CASE WHEN oi.unit_price IS NULL OR oi.unit_price = 0
+                                               THEN b.sell_price ELSE oi.unit_price END) as total
+                FROM {table} oi
                          JOIN books b ON oi.book_id = b.id
-                         JOIN orders o ON oi.order_id = o.id
-                WHERE 1=1 \
+                WHERE oi.order_id = ?
                 """
+        rows = self.conn.execute(query.format(table="order_items"), (order_id,)).fetchall()
+        if not rows:
+            spans_archive = self._spans_archive(None)
+            # Mã in trên hoá đơn trước khi đổi sang dạng mới (order_ids.py), kể cả đơn đã archive
+            order_id = resolve_order_id(self.conn, order_id)
+            rows = self.conn.execute(query.format(table="order_items"), (order_id,)).fetchall()
+            if not rows and spans_archive:
+                rows = self.conn.execute(query.format(table="archive.order_items"), (order_id,)).fetchall()
+        return [tuple(row) for row in rows]
+
+    #Archive
+    def archive_horizon(self):
+        """created_at mới nhất đã được chuyển sang archive (None nếu chưa archive gì)."""
+        try:
+            row = self.conn.execute("SELECT value FROM archive_state WHERE key = 'archived_through'").fetchone()
+        except sqlite3.OperationalError:
+            return None
+        return row[0] if row else None
+
+    def attach_archive(self, create=False):
+        """ATTACH file archive với tên schema "archive" (chỉ một lần cho mỗi kết nối)."""
+        if self._archive_attached:
+            return True
+        if not create and not os.path.exists(self.archive_path):
+            return False
+        if self.read_only:
+            self.conn.execute("ATTACH DATABASE ? AS archive", (f"file:{self.archive_path}?mode=ro",))
+        else:
+            self.conn.execute("ATTACH DATABASE ? AS archive", (self.archive_path,))
+        self._archive_attached = True
+        return True
+
+    def _spans_archive(self, start_date):
+        """True nếu truy vấn bắt đầu từ start_date cần đọc cả dữ liệu đã archive."""
+        horizon = self.archive_horizon()
+        if horizon is None or (start_date and start_date > horizon):
+            return False
+        return self.attach_archive()
+
+    #Reports
+    def get_revenue(self, start_date=None, end_date=None):
+        """
+        Doanh thu/lợi nhuận theo sách. Đơn đã archive được đọc từ bảng tổng hợp theo ngày
+        archive.daily_sales (độ chi tiết ngày) khi khoảng thời gian chạm tới chúng.
+        """
+        live = """
+               SELECT oi.book_id, oi.quantity, oi.total
+               FROM order_items oi
+                        JOIN orders o ON oi.order_id = o.id
+               WHERE 1=1 \
+               """
         params = []
         if start_date:
-            query += " AND o.created_at >= ?"
+            live += " AND o.created_at >= ?"
             params.append(start_date)
         if end_date:
-            query += " AND o.created_at <= ?"
+            live += " AND o.created_at <= ?"
             params.append(end_date)
 
-        query += " GROUP BY b.id, b.title"
+        lines = live
+        if self._spans_archive(start_date):
+            lines += " UNION ALL SELECT book_id, quantity, total_amount FROM archive.daily_sales WHERE 1=1"
+            if start_date:
+                lines += " AND day >= ?"
+                params.append(start_date[:10])
+            if end_date:
+                lines += " AND day <= ?"
+                params.append(end_date[:10])
+
+        query = f"""
+                SELECT b.id as book_id, b.title,
+                       SUM(l.quantity) as quantity,
+                       SUM(l.total) as total_amount,
+                       SUM((b.sell_price - b.buy_price) * l.quantity) as profit
+                FROM ({lines}) l
+                         JOIN books b ON l.book_id = b.id
+                GROUP BY b.id, b.title
+                """
         df = pd.read_sql_query(query, self.conn, params=params)
         return df
 
+    def get_expenses(self, start_date=None, end_date=None):
+        """Giá vốn hàng đã bán theo sách (total_cost = doanh thu - lợi nhuận)."""
+        df = self.get_revenue(start_date, end_date)
+        df["total_cost"] = df["total_amount"] - df["profit"]
+        return df[["book_id", "title", "quantity", "total_cost"]]
+
+    def sales_cube(self):
+        """Cube doanh số ngày × sách, tạo khi cần lần đầu (xem sales_cube.py)."""
+        if self._sales_cube is None:
+            self._sales_cube = SalesCube(self)
+        return self._sales_cube
+
+    def get_sales_trend(self, grain="month", start_date=None, end_date=None, genre=None):
+        return self.sales_cube().trend(grain, start_date, end_date, genre)
+
+    def get_genre_share(self, start_date=None, end_date=None):
+        return self.sales_cube().genre_share(start_date, end_date)
+
+    def get_best_sellers(self, n=10, start_date=None, end_date=None, by="revenue", genre=None):
+        return self.sales_cube().top_books(n, start_date, end_date, by, genre)
+
+    def compare_sales_periods(self, start_date, end_date, by=None):
+        return self.sales_cube().compare_periods(start_date, end_date, by)
+
+    def pricing_simulator(self):
+        """Mô phỏng what-if giá/nhập hàng trên cube doanh số (xem pricing_simulator.py)."""
+        if self._pricing_simulator is None:
+            self._pricing_simulator = PricingSimulator(self)
+        return self._pricing_simulator
+
+    def simulate_pricing(self, scenarios=None, horizon_days=30):
+        return self.pricing_simulator().run(scenarios, horizon_days)
+
+    #Recommendations
+
+    def recommender(self):
+        """Ma trận "thường được mua cùng", tạo khi cần lần đầu (xem recommender.py)."""
+        if self._recommender is None:
+            self._recommender = Recommender(self)
+        return self._recommender
+
+    def get_recommendations(self, book_id, k=5):
+        return self.recommender().for_book(book_id, k)
+
+    def get_cart_recommendations(self, book_ids, k=5):
+        return self.recommender().for_cart(book_ids, k)
+
+    #Picking
+
+    def pick_planner(self):
+        """Lộ trình lấy hàng theo sơ đồ cửa hàng (xem pick_route.py, store_layout.py)."""
+        if self._pick_planner is None:
+            self._pick_planner = PickPlanner(self)
+        return self._pick_planner
+
+    def plan_pick_route(self, order_ids):
+        return self.pick_planner().plan_orders(order_ids)
+
+    def plan_cart_pick_route(self, items):
+        return self.pick_planner().plan_items(items)
+
+    #Stock alerts
+
+    def stock_alerts(self):
+        """Tập sách sắp hết hàng do trigger duy trì (xem stock_alerts.py)."""
+        if self._stock_alerts is None:
+            self._stock_alerts = StockAlerts(self)
+        return self._stock_alerts
+
+    def get_low_stock(self):
+        return self.stock_alerts().low_stock()
+
+    def get_stock_events(self, after=0, limit=200):
+        return self.stock_alerts().events(after, limit)
+
+    def get_stock_alert_status(self):
+        """Số sách dưới ngưỡng và seq sự kiện mới nhất (cho badge cảnh báo)."""
+        alerts = self.stock_alerts()
+        return {"count": alerts.count(), "last_seq": alerts.last_seq()}
+
+    def set_reorder_threshold(self, scope, key=None, threshold=DEFAULT_THRESHOLD, reorder_qty=None):
+        self.stock_alerts().set_rule(scope, key, threshold, reorder_qty)
+
+    #Translations
+
+    def catalog_translator(self):
+        """Bản dịch sẵn tên / thể loại / mô tả sách (xem catalog_i18n.py)."""
+        if self._catalog_translator is None:
+            self._catalog_translator = CatalogTranslator(self)
+        return self._catalog_translator
+
+    def get_book_translations(self, lang, book_ids=None):
+        return self.catalog_translator().localized(lang, book_ids)
+
+    def set_book_translation(self, book_id, lang, **fields):
+        self.catalog_translator().set_translation(book_id, lang, **fields)
+
+    def translate_catalog(self):
+        """Dịch các sách mới / vừa sửa sang mọi ngôn ngữ phục vụ (gọi mạng; chạy ở nền)."""
+        return self.catalog_translator().translate_pending()
+
+    #Maintenance
+
+    def get_maintenance_status(self):
+        """Lần chạy trước / kế tiếp của các task bảo trì (xem maintenance.py); [] nếu chưa có lịch."""
+        return read_status(self.conn)
+
+    def data_version(self):
+        """Token thay đổi mỗi khi database được ghi (bởi kết nối này hoặc tiến trình khác)."""
+        pragma_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        return pragma_version, self.conn.total_changes
+
+    def table_versions(self, *tables):
+        """Phiên bản của từng bảng trong tables; chỉ đổi khi chính các bảng đó bị ghi."""
+        try:
+            rows = dict(self.conn.execute("SELECT name, version FROM table_versions").fetchall())
+        except sqlite3.OperationalError:
+            # Database cũ mở read-only, chưa có bảng: dùng version chung
+            return (self.data_version(),) * len(tables)
+        return tuple(rows.get(table) for table in tables)
+
     def close(self):
         self.conn.close()
\ No newline at end of file
@@ -0,0 +1,191 @@
+"""
+Sinh database mẫu có tính quyết định (cùng seed -> cùng dữ liệu) ở quy mô lớn.
+
+    python dataset_generator.py --books 100000 --lines 10000000 --output big.db
+    python dataset_generator.py --books 20 --lines 15 --output bookstore.db --overwrite
+
+- Độ phổ biến của sách theo phân phối Zipf.
+- Số đơn theo mùa (tựu trường, Tết, cuối năm) và theo ngày trong tuần, nhiều năm.
+- Kích thước giỏ hàng thực tế (đa số 1-3 cuốn).
+- Mã đơn dạng mới (order_ids.py) sinh từ thời điểm tạo đơn, mã quầy 0 như đơn đã chuyển đổi.
+- Ghi bằng executemany trong các transaction lớn vào file mới rồi đổi tên.
+"""
+import argparse
+import os
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from database_manager import DatabaseManager
+from instrumentation import uninstrument_connection
+from order_ids import MIGRATED_TERMINAL, OrderIdGenerator
+
+SAMPLE_TITLES = [
+    "Python for Beginners", "Advanced Python", "Machine Learning 101", "Deep Learning Basics",
+    "Artificial Intelligence", "Data Science with Python", "SQL Mastery", "Web Development with Flask",
+    "Django for Professionals", "Effective Java", "C++ Primer", "Clean Code",
+    "Refactoring", "Design Patterns", "Algorithms Unlocked", "Computer Networks",
+    "Operating System Concepts", "Discrete Mathematics", "Linear Algebra", "Probability and Statistics"
+]
+GENRES = ["Programming", "AI", "Math", "Software Engineering", "Data",
+          "Fiction", "Children", "Self-help", "History", "Textbook"]
+ADJECTIVES = ["Practical", "Modern", "Hidden", "Complete", "Little", "Silent", "Essential", "Lost",
+              "Gentle", "Brief", "Wild", "Applied", "Secret", "Golden", "Everyday", "Quiet"]
+NOUNS = ["Algorithms", "Garden", "River", "Systems", "Stories", "Mathematics", "Journey", "Patterns",
+         "Kingdom", "Networks", "Habits", "Empire", "Statistics", "Forest", "Compilers", "Letters"]
+
+# Hệ số theo tháng: Tết (1-2), tựu trường (8-9), cuối năm (12)
+MONTH_FACTORS = np.array([1.3, 1.4, 0.9, 0.85, 0.9, 1.0, 1.05, 1.5, 1.45, 0.95, 1.0, 1.35])
+WEEKDAY_FACTORS = np.array([0.85, 0.85, 0.9, 0.95, 1.1, 1.4, 1.3])  # Mon..Sun
+# Giờ mở cửa 8h-21h, đông vào trưa và tối
+HOUR_WEIGHTS = np.array([0, 0, 0, 0, 0, 0, 0, 0, 3, 5, 6, 7, 8, 6, 5, 5, 6, 8, 10, 10, 7, 4, 0, 0], dtype=float)
+QUANTITIES = np.array([1, 2, 3, 5])
+QUANTITY_WEIGHTS = np.array([0.8, 0.13, 0.05, 0.02])
+
+DEFAULT_END_DATE = "2025-12-31"
+
+
+def _book_rows(rng, n_books):
+    genre_idx = rng.integers(0, len(GENRES), n_books)
+    buy = rng.integers(40, 150, n_books)
+    sell = (buy * rng.uniform(1.2, 2.2, n_books)).astype(np.int64)
+    stock = rng.integers(0, 200, n_books)
+    shelf = rng.integers(1, 41, n_books)
+    adj = rng.integers(0, len(ADJECTIVES), n_books)
+    noun = rng.integers(0, len(NOUNS), n_books)
+    for i in range(n_books):
+        if i < len(SAMPLE_TITLES):
+            title = SAMPLE_TITLES[i]
+        else:
+            title = f"{ADJECTIVES[adj[i]]} {NOUNS[noun[i]]} {i + 1}"
+        yield (i + 1, title, f"Author {(i * 7919) % max(n_books // 3, 1) + 1}", GENRES[genre_idx[i]],
+               f"Description for {title}", f"Shelf {shelf[i]}", int(buy[i]), int(sell[i]), int(stock[i]))
+
+
+def _order_times(rng, n_orders, end_date, years):
+    """Timestamp (giây) của n_orders đơn, đã sắp xếp, theo mùa + ngày trong tuần + giờ."""
+    end = datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1)
+    start = end - timedelta(days=int(365 * years))
+    n_days = (end - start).days
+    days = np.arange(n_days)
+    dates = [start + timedelta(days=int(d)) for d in days]
+    months = np.array([d.month - 1 for d in dates])
+    weekdays = np.array([d.weekday() for d in dates])
+    # Tăng trưởng nhẹ ~10%/năm
+    growth = 1.0 + 0.1 * days / 365
+    weights = MONTH_FACTORS[months] * WEEKDAY_FACTORS[weekdays] * growth
+    day_pick = rng.choice(n_days, size=n_orders, p=weights / weights.sum())
+    hours = rng.choice(24, size=n_orders, p=HOUR_WEIGHTS / HOUR_WEIGHTS.sum())
+    seconds = day_pick * 86400 + hours * 3600 + rng.integers(0, 3600, n_orders)
+    seconds.sort()
+    return start, seconds
+
+
+def generate(output, books=1000, lines=10_000, seed=42, years=3, end_date=DEFAULT_END_DATE,
+             zipf_s=1.1, mean_basket=2.2, batch_size=200_000, overwrite=False, verbose=True):
+    """Sinh database mới tại output. Trả về (số đơn, số dòng)."""
+    if os.path.exists(output) and not overwrite:
+        raise FileExistsError(f"{output} already exists (use overwrite=True)")
+
+    t0 = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    tmp_path = f"{output}.building"
+    for path in (tmp_path, f"{tmp_path}-journal"):
+        if os.path.exists(path):
+            os.remove(path)
+
+    db = DatabaseManager(tmp_path)
+    conn = uninstrument_connection(db.conn)
+    # File tạm: không cần journal/fsync, lỗi thì chỉ việc sinh lại
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+
+    with conn:
+        conn.executemany(
+            "INSERT INTO books (id, title, author, genre, description, shelf_position, buy_price, sell_price, stock) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            _book_rows(rng, books),
+        )
+    sell_prices = np.array([r[0] for r in conn.execute("SELECT sell_price FROM books ORDER BY id")], dtype=np.int64)
+
+    # Kích thước giỏ: 1 + Poisson, cắt ở 12 cuốn
+    sizes = np.minimum(1 + rng.poisson(max(mean_basket - 1, 0.01), int(lines / mean_basket * 1.2) + 10), 12)
+    cut = int(np.searchsorted(np.cumsum(sizes), lines)) + 1
+    sizes = sizes[:cut]
+    sizes[-1] -= int(sizes.sum() - lines)
+    sizes = sizes[sizes > 0]
+    n_orders = len(sizes)
+
+    start, seconds = _order_times(rng, n_orders, end_date, years)
+
+    # Zipf bị chặn: hạng r có xác suất ~ 1/r^s, hạng -> book_id được xáo trộn
+    popularity = 1.0 / np.arange(1, books + 1) ** zipf_s
+    popularity /= popularity.sum()
+    rank_to_book = rng.permutation(books) + 1
+
+    # Mã quầy 0: không trùng mã với đơn do các quầy thật bán sau này
+    id_generator = OrderIdGenerator(MIGRATED_TERMINAL)
+    written = 0
+    order_start = 0
+    while order_start < n_orders:
+        # Gom các đơn sao cho mỗi transaction có khoảng batch_size dòng
+        order_end = min(int(np.searchsorted(np.cumsum(sizes[order_start:]), batch_size)) + order_start + 1, n_orders)
+        chunk_sizes = sizes[order_start:order_end]
+        n_lines = int(chunk_sizes.sum())
+
+        book_ids = rank_to_book[rng.choice(books, size=n_lines, p=popularity)]
+        qty = rng.choice(QUANTITIES, size=n_lines, p=QUANTITY_WEIGHTS)
+        unit_price = sell_prices[book_ids - 1]
+        totals = qty * unit_price
+        offsets = np.concatenate(([0], np.cumsum(chunk_sizes)[:-1]))
+        order_qty = np.add.reduceat(qty, offsets)
+        order_amount = np.add.reduceat(totals, offsets)
+
+        moments = [start + timedelta(seconds=int(s)) for s in seconds[order_start:order_end]]
+        order_ids = [id_generator.next_id(int(moment.timestamp() * 1000)) for moment in moments]
+        created = [moment.strftime("%Y-%m-%d %H:%M:%S") for moment in moments]
+        line_order_ids = np.repeat(np.array(order_ids), chunk_sizes)
+
+        with conn:
+            conn.executemany(
+                "INSERT INTO orders (id, total_qty, total_amount, created_at) VALUES (?, ?, ?, ?)",
+                zip(order_ids, order_qty.tolist(), order_amount.tolist(), created),
+            )
+            conn.executemany(
+                "INSERT INTO order_items (order_id, book_id, quantity, unit_price, total) VALUES (?, ?, ?, ?, ?)",
+                zip(line_order_ids.tolist(), book_ids.tolist(), qty.tolist(), unit_price.tolist(), totals.tolist()),
+            )
+        written += n_lines
+        order_start = order_end
+        if verbose:
+            print(f"  {written:,}/{lines:,} order lines ({time.perf_counter() - t0:.1f}s)")
+
+    conn.execute("ANALYZE")
+    db.close()
+    os.replace(tmp_path, output)
+    if verbose:
+        print(f"Generated {books:,} books, {n_orders:,} orders, {written:,} lines -> {output} "
+              f"in {time.perf_counter() - t0:.1f}s")
+    return n_orders, written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deterministic synthetic bookstore dataset generator")
+    parser.add_argument("--output", default="bookstore.db")
+    parser.add_argument("--books", type=int, default=1000)
+    parser.add_argument("--lines", type=int, default=10_000, help="number of order lines")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--years", type=float, default=3)
+    parser.add_argument("--end-date", default=DEFAULT_END_DATE, help="last order date (YYYY-MM-DD)")
+    parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent for book popularity")
+    parser.add_argument("--basket", type=float, default=2.2, help="mean basket size")
+    parser.add_argument("--overwrite", action="store_true")
+    args = parser.parse_args()
+
+    generate(args.output, args.books, args.lines, args.seed, args.years, args.end_date,
+             args.zipf, args.basket, overwrite=args.overwrite)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""
+Đo thời gian SQL, chatbot, dịch, TTS và các handler UI.
+
+- Histogram độ trễ trong bộ nhớ (bucket theo thang log).
+- span()/timed() để đo một đoạn code hoặc một hàm.
+- InstrumentedConnection: factory cho sqlite3.connect, đo mọi câu lệnh; câu chậm
+  được ghi vào logger "bookstore.slow_sql" kèm EXPLAIN QUERY PLAN. executemany INSERT ... VALUES
+  (nạp hàng loạt) chỉ được đo, không ghi log chậm: thời gian tỉ lệ số dòng, không có plan để xem.
+- dump() trả về báo cáo dạng text cho panel Diagnostics.
+"""
+import functools
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+SLOW_QUERY_MS = float(os.getenv("BOOKSTORE_SLOW_QUERY_MS", "50"))
+PROGRESS_STEPS = 1000  # gọi progress handler sau mỗi 1000 lệnh VM của SQLite
+
+slow_sql_logger = logging.getLogger("bookstore.slow_sql")
+
+# Biên trên các bucket (ms): 0.05ms * sqrt(2)^i, tới ~50 giây
+_BUCKET_BOUNDS = [0.05 * 2 ** (i / 2) for i in range(41)]
+
+
+class LatencyHistogram:
+    """Histogram độ trễ với bucket cố định, đủ nhẹ để ghi ở mọi lời gọi."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = [0] * (len(_BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, ms):
+        index = 0
+        while index < len(_BUCKET_BOUNDS) and ms > _BUCKET_BOUNDS[index]:
+            index += 1
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total_ms += ms
+            self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, q):
+        """Ước lượng percentile q (0-100) bằng biên trên của bucket chứa nó."""
+        with self._lock:
+            if not self.count:
+                return 0.0
+            target = self.count * q / 100
+            seen = 0
+            for index, n in enumerate(self.counts):
+                seen += n
+                if seen >= target:
+                    bound = _BUCKET_BOUNDS[index] if index < len(_BUCKET_BOUNDS) else self.max_ms
+                    return min(bound, self.max_ms)
+            return self.max_ms
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "mean_ms": self.total_ms / self.count if self.count else 0.0,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+            "max_ms": self.max_ms,
+        }
+
+
+class Metrics:
+    def __init__(self, slow_log_size=50):
+        self._lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.slow_queries = deque(maxlen=slow_log_size)
+
+    def histogram(self, name):
+        hist = self.histograms.get(name)
+        if hist is None:
+            with self._lock:
+                hist = self.histograms.setdefault(name, LatencyHistogram())
+        return hist
+
+    def record(self, name, ms):
+        self.histogram(name).record(ms)
+
+    def increment(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+            self.slow_queries.clear()
+
+    def snapshot(self):
+        return {
+            "histograms": {name: h.snapshot() for name, h in sorted(self.histograms.items())},
+            "counters": dict(sorted(self.counters.items())),
+            "slow_queries": list(self.slow_queries),
+        }
+
+
+metrics = Metrics()
+
+
+@contextmanager
+def span(name):
+    """Đo thời gian một đoạn code: with span("ui.open_profit_tab"): ..."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.record(name, (time.perf_counter() - t0) * 1000)
+
+
+def timed(name):
+    """Decorator đo thời gian mỗi lần gọi hàm."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# SQL
+_local = threading.local()
+
+
+def _statement_kind(sql):
+    words = sql.lstrip().split(None, 1)
+    return words[0].upper() if words else "?"
+
+
+def _is_bulk_insert(sql):
+    return _statement_kind(sql) in ("INSERT", "REPLACE") and "SELECT" not in sql.upper()
+
+
+def _on_progress():
+    _local.vm_steps = getattr(_local, "vm_steps", 0) + PROGRESS_STEPS
+    return 0  # 0 = tiếp tục chạy
+
+
+def _on_trace(statement):
+    metrics.increment("sql.statements")
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    def _timed(self, method, sql, *args, bulk=False):
+        steps_before = getattr(_local, "vm_steps", 0)
+        t0 = time.perf_counter()
+        try:
+            return method(self, sql, *args)
+        finally:
+            ms = (time.perf_counter() - t0) * 1000
+            self._sql, self._params, self._elapsed_ms = sql, args[0] if args else (), ms
+            self._vm_steps = getattr(_local, "vm_steps", 0) - steps_before
+            self._slow_logged = bulk
+            metrics.record(f"sql.{_statement_kind(sql).lower()}", ms)
+            self._check_slow()
+
+    def execute(self, sql, parameters=()):
+        return self._timed(sqlite3.Cursor.execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._timed(sqlite3.Cursor.executemany, sql, seq_of_parameters, bulk=_is_bulk_insert(sql))
+
+    def fetchall(self):
+        # SELECT chỉ thực sự chạy khi lấy dòng, nên thời gian fetch cũng được tính
+        steps_before = getattr(_local, "vm_steps", 0)
+        t0 = time.perf_counter()
+        rows = super().fetchall()
+        if getattr(self, "_sql", None) is not None:
+            ms = (time.perf_counter() - t0) * 1000
+            metrics.record("sql.fetch", ms)
+            self._elapsed_ms += ms
+            self._vm_steps += getattr(_local, "vm_steps", 0) - steps_before
+            self._check_slow()
+        return rows
+
+    def _check_slow(self):
+        if self._elapsed_ms < SLOW_QUERY_MS or self._slow_logged:
+            return
+        self._slow_logged = True
+        plan = explain_query_plan(self.connection, self._sql, self._params)
+        entry = {
+            "at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "ms": round(self._elapsed_ms, 2),
+            "vm_steps": self._vm_steps,
+            "sql": " ".join(self._sql.split()),
+            "plan": plan,
+        }
+        metrics.slow_queries.append(entry)
+        metrics.increment("sql.slow")
+        slow_sql_logger.warning("Slow query %.1f ms (~%d VM steps): %s%s", entry["ms"], entry["vm_steps"],
+                                entry["sql"], f" | plan: {' / '.join(plan)}" if plan else "")
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Dùng: sqlite3.connect(path, factory=InstrumentedConnection)."""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def explain_query_plan(conn, sql, params=()):
+    kind = _statement_kind(sql)
+    if kind not in ("SELECT", "WITH", "UPDATE", "DELETE", "INSERT", "REPLACE"):
+        return []
+    if _is_bulk_insert(sql):
+        return []
+    try:
+        # Cursor thường (không instrument) để không đệ quy vào chính nó
+        cur = sqlite3.Cursor(conn)
+        if isinstance(params, (list, tuple, dict)):
+            cur.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        else:
+            cur.execute(f"EXPLAIN QUERY PLAN {sql}")
+        return [row[-1] for row in cur.fetchall()]
+    except sqlite3.Error as e:
+        return [f"(explain failed: {e})"]
+
+
+def instrument_connection(conn):
+    """Gắn trace/progress hook vào kết nối (đếm câu lệnh và số bước VM)."""
+    conn.set_trace_callback(_on_trace)
+    conn.set_progress_handler(_on_progress, PROGRESS_STEPS)
+    return conn
+
+
+def uninstrument_connection(conn):
+    """Gỡ trace/progress hook (kết nối nạp dữ liệu hàng loạt: hook gọi Python sau mỗi 1000 lệnh VM)."""
+    conn.set_trace_callback(None)
+    conn.set_progress_handler(None, 0)
+    return conn
+
+
+def dump():
+    """Báo cáo text cho panel Diagnostics / ghi ra file."""
+    snap = metrics.snapshot()
+    lines = ["== Latency (ms) ==",
+             f"{'name':32s} {'count':>7s} {'mean':>9s} {'p50':>9s} {'p95':>9s} {'p99':>9s} {'max':>9s}"]
+    for name, h in snap["histograms"].items():
+        lines.append(f"{name:32s} {h['count']:7d} {h['mean_ms']:9.2f} {h['p50_ms']:9.2f} "
+                     f"{h['p95_ms']:9.2f} {h['p99_ms']:9.2f} {h['max_ms']:9.2f}")
+    lines.append("")
+    lines.append("== Counters ==")
+    for name, value in snap["counters"].items():
+        lines.append(f"{name:32s} {value}")
+    lines.append("")
+    lines.append(f"== Slow queries (>= {SLOW_QUERY_MS:.0f} ms, most recent last) ==")
+    for q in snap["slow_queries"]:
+        lines.append(f"[{q['at']}] {q['ms']} ms, ~{q['vm_steps']} VM steps")
+        lines.append(f"  {q['sql']}")
+        for step in q["plan"]:
+            lines.append(f"    plan: {step}")
+    return "\n".join(lines)
+
+
+def dump_to_file(path="diagnostics.txt"):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(dump())
+    return path
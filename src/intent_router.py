@@ -0,0 +1,391 @@
+"""
+Trả lời offline các câu hỏi thường gặp của khách (còn hàng / giá / vị trí kệ / thể loại)
+bằng tiếng Anh và tiếng Việt, không gọi LLM và không cần mạng.
+
+    router = IntentRouter(db)
+    reply = router.answer("Sách Clean Code giá bao nhiêu?")   # None -> chuyển cho LLM
+
+- Tên sách và thể loại được tìm bằng index theo cụm từ (đã bỏ dấu), rồi thay bằng <book>/<genre>.
+- Intent được chọn bằng luật từ khoá (regex) + bộ phân loại Naive Bayes nhỏ viết bằng NumPy.
+- Tồn kho và giá luôn đọc trực tiếp từ database theo id (truy vấn khoá chính).
+- Tên / thể loại / mô tả trả lời theo ngôn ngữ của khách lấy từ bản dịch sẵn (catalog_i18n.py), nạp
+  cùng index: không gọi dịch qua mạng. Tên sách và thể loại đã dịch cũng tìm được trong câu hỏi.
+"""
+import logging
+import re
+import time
+import unicodedata
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from catalog_i18n import LANGUAGES
+from instrumentation import metrics
+
+INTENTS = ("info", "stock", "price", "shelf", "genre", "none")
+MAX_TITLE_TOKENS = 12
+
+# Mẫu câu huấn luyện (đã bỏ dấu), <book>/<genre> là chỗ của tên sách/thể loại
+TRAINING_EXAMPLES = {
+    "stock": [
+        "do you have <book>", "is <book> in stock", "have you got <book>", "any copies of <book> left",
+        "is <book> available", "<book> in stock", "can i buy <book>", "do you sell <book>",
+        "is there any <book> left", "still have <book>",
+        "co sach <book> khong", "con <book> khong", "<book> con hang khong", "cua hang co ban <book> khong",
+        "con cuon <book> nao khong", "<book> het hang chua", "minh muon mua <book>", "co <book> khong",
+        "shop con <book> khong", "con bao nhieu cuon <book>",
+    ],
+    "price": [
+        "how much is <book>", "what is the price of <book>", "<book> price", "how much does <book> cost",
+        "price of <book>", "what does <book> cost", "how much for <book>", "<book> how much",
+        "<book> gia bao nhieu", "gia sach <book>", "<book> bao nhieu tien", "sach <book> gia the nao",
+        "cho hoi gia <book>", "<book> may tien", "gia cua <book> la bao nhieu", "mua <book> het bao nhieu",
+    ],
+    "shelf": [
+        "where is <book>", "where can i find <book>", "which shelf is <book> on", "where do you keep <book>",
+        "location of <book>", "<book> which aisle", "where is <book> located", "find <book> in store",
+        "<book> o dau", "sach <book> nam o ke nao", "tim <book> o dau", "<book> de o ke nao",
+        "vi tri sach <book>", "<book> o cho nao", "ke nao co <book>", "lay <book> o dau",
+    ],
+    "genre": [
+        "what <genre> books do you have", "show me <genre> books", "do you have any <genre>", "books in <genre>",
+        "what do you have in <genre>", "recommend <genre> books", "what genres do you have", "list <genre> titles",
+        "any good <genre> books", "which categories do you sell",
+        "co sach <genre> nao khong", "sach the loai <genre>", "cho xem sach <genre>", "co nhung sach <genre> nao",
+        "the loai <genre> co gi", "cua hang co nhung the loai nao", "goi y sach <genre>", "sach <genre> nao hay",
+    ],
+    "none": [
+        "hello", "hi there", "what are your opening hours", "can you recommend a good novel", "tell me a joke",
+        "do you offer gift wrapping", "what is the meaning of life", "thanks", "who wrote the best fantasy series",
+        "can i pay by card", "do you deliver", "what is your return policy", "who is the author of harry potter",
+        "xin chao", "cam on", "cua hang mo cua may gio", "goi y cho toi mot cuon sach hay", "ban la ai",
+        "co giao hang khong", "thanh toan bang the duoc khong", "doi tra sach the nao", "ke chuyen cuoi di",
+    ],
+}
+
+# Luật từ khoá có độ chính xác cao (trên văn bản đã bỏ dấu)
+RULES = {
+    "stock": re.compile(r"\b(do you have|have you got|in stock|available|any copies|con hang|het hang|"
+                        r"con bao nhieu|con cuon|co ban)\b"),
+    "price": re.compile(r"\b(how much|price|cost|gia|bao nhieu tien|may tien)\b"),
+    "shelf": re.compile(r"\b(where|which shelf|shelf|aisle|located|location|o dau|ke nao|cho nao|vi tri)\b"),
+    "genre": re.compile(r"\b(genres?|categor(y|ies)|the loai)\b"),
+}
+
+TEMPLATES = {
+    "en": {
+        "in_stock": "Yes, we have '{title}' in stock: {n} copies available.",
+        "out_of_stock": "Sorry, '{title}' is currently out of stock.",
+        "price": "'{title}' costs {price:,} VND.",
+        "shelf": "You can find '{title}' at {shelf}.",
+        "genre": "In {genre} we have: {titles}.",
+        "genre_empty": "Sorry, we have no {genre} books in stock right now.",
+        "genres": "Our genres: {genres}.",
+        "also_bought": "Customers who bought it also bought: {titles}.",
+        "info": "📚 {title}\n✍️ Author: {author}\n📖 Genre: {genre}\n📝 Description: {description}\n"
+                "📌 Shelf Position: {shelf}\n💰 Price: {price:,} VND\n📦 Stock: {n}",
+    },
+    "vi": {
+        "in_stock": "Dạ, cửa hàng còn {n} cuốn '{title}'.",
+        "out_of_stock": "Xin lỗi, '{title}' hiện đã hết hàng.",
+        "price": "'{title}' có giá {price:,} VNĐ.",
+        "shelf": "'{title}' nằm ở {shelf}.",
+        "genre": "Thể loại {genre} hiện có: {titles}.",
+        "genre_empty": "Xin lỗi, hiện không còn sách thể loại {genre}.",
+        "genres": "Các thể loại của cửa hàng: {genres}.",
+        "also_bought": "Khách mua cuốn này cũng hay mua: {titles}.",
+        "info": "📚 {title}\n✍️ Tác giả: {author}\n📖 Thể loại: {genre}\n📝 Mô tả: {description}\n"
+                "📌 Vị trí: {shelf}\n💰 Giá: {price:,} VNĐ\n📦 Tồn kho: {n}",
+    },
+}
+
+# Tên thể loại tiếng Việt (đã bỏ dấu) -> genre trong database
+GENRE_ALIASES = {
+    "lich su": "History", "thieu nhi": "Children", "tieu thuyet": "Fiction", "van hoc": "Fiction",
+    "toan": "Math", "toan hoc": "Math", "lap trinh": "Programming", "ky nang song": "Self-help",
+    "phat trien ban than": "Self-help", "giao trinh": "Textbook", "sach giao khoa": "Textbook",
+    "du lieu": "Data", "khoa hoc du lieu": "Data", "tri tue nhan tao": "AI",
+    "ky thuat phan mem": "Software Engineering", "cong nghe phan mem": "Software Engineering",
+}
+
+_VI_CHARS = set("ăâđêôơưĂÂĐÊÔƠƯ")
+_VI_WORDS = {"khong", "sach", "gia", "bao", "nhieu", "dau", "con", "cuon", "cua", "hang", "nao", "loai"}
+
+
+def normalize(text):
+    """Chữ thường, bỏ dấu tiếng Việt, bỏ dấu câu."""
+    text = text.lower().replace("đ", "d")
+    text = "".join(c for c in unicodedata.normalize("NFD", text) if unicodedata.category(c) != "Mn")
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", text).split())
+
+
+def detect_language(text, tokens):
+    if any(c in _VI_CHARS for c in text):
+        return "vi"
+    if any(unicodedata.category(c) == "Mn" for c in unicodedata.normalize("NFD", text)):
+        return "vi"
+    return "vi" if sum(t in _VI_WORDS for t in tokens) >= 2 else "en"
+
+
+def _features(tokens):
+    return tokens + [f"{a}_{b}" for a, b in zip(tokens, tokens[1:])]
+
+
+class NaiveBayesClassifier:
+    """Multinomial Naive Bayes trên unigram + bigram, làm mịn Laplace."""
+
+    def __init__(self, alpha=1.0):
+        self.alpha = alpha
+
+    def fit(self, examples):
+        self.classes = list(examples)
+        docs = [(_features(text.split()), c) for c, texts in examples.items() for text in texts]
+        self.vocab = {f: i for i, f in enumerate(sorted({f for feats, _ in docs for f in feats}))}
+        counts = np.zeros((len(self.classes), len(self.vocab)))
+        class_docs = np.zeros(len(self.classes))
+        for feats, c in docs:
+            k = self.classes.index(c)
+            class_docs[k] += 1
+            for f in feats:
+                counts[k, self.vocab[f]] += 1
+        smoothed = counts + self.alpha
+        self.feature_log_prob = np.log(smoothed / smoothed.sum(axis=1, keepdims=True))
+        self.class_log_prior = np.log(class_docs / class_docs.sum())
+        return self
+
+    def predict_proba(self, tokens):
+        idx = [self.vocab[f] for f in _features(tokens) if f in self.vocab]
+        scores = self.class_log_prior + self.feature_log_prob[:, idx].sum(axis=1)
+        probs = np.exp(scores - scores.max())
+        return dict(zip(self.classes, probs / probs.sum()))
+
+
+class CatalogIndex:
+    """
+    Index tên sách/thể loại theo cụm từ đã chuẩn hoá, dựng từ db.get_books().
+    translations: {lang: {book_id: {"title", "genre", "description"}}} (db.get_book_translations).
+    """
+
+    def __init__(self, books_df, translations=None):
+        self.books = {}
+        self.titles = {}
+        self.genres = {}
+        self.localized = translations or {}
+        self.genre_names = {}  # {lang: {genre gốc: genre đã dịch}}
+        for row in books_df.itertuples(index=False):
+            self.books[int(row.id)] = row
+            key = tuple(normalize(str(row.title)).split())
+            if key:
+                self.titles.setdefault(key[:MAX_TITLE_TOKENS], int(row.id))
+            if row.genre:
+                self.genres.setdefault(tuple(normalize(str(row.genre)).split()), row.genre)
+        # Tên gốc được ưu tiên; tên đã dịch chỉ thêm khi không trùng
+        for lang, books in self.localized.items():
+            names = self.genre_names.setdefault(lang, {})
+            for book_id, fields in books.items():
+                row = self.books.get(book_id)
+                if row is None:
+                    continue
+                key = tuple(normalize(str(fields.get("title") or "")).split())
+                if key:
+                    self.titles.setdefault(key[:MAX_TITLE_TOKENS], book_id)
+                if row.genre and fields.get("genre"):
+                    names.setdefault(row.genre, fields["genre"])
+                    self.genres.setdefault(tuple(normalize(fields["genre"]).split()), row.genre)
+        known = set(self.genres.values())
+        for alias, genre in GENRE_ALIASES.items():
+            if genre in known:
+                self.genres.setdefault(tuple(alias.split()), genre)
+
+    def text(self, book_id, lang, field, default=None):
+        """Trường đã dịch của sách; chưa có bản dịch thì trả về default (văn bản gốc)."""
+        return (self.localized.get(lang, {}).get(book_id) or {}).get(field) or default
+
+    def genre_name(self, genre, lang):
+        return self.genre_names.get(lang, {}).get(genre, genre)
+
+    def extract(self, tokens):
+        """Tìm cụm dài nhất khớp tên sách (rồi thể loại); trả về (book_id, genre, tokens đã thay thế)."""
+        book_id = genre = None
+        out, i = [], 0
+        while i < len(tokens):
+            match = None
+            for size in range(min(MAX_TITLE_TOKENS, len(tokens) - i), 0, -1):
+                span = tuple(tokens[i:i + size])
+                if book_id is None and span in self.titles:
+                    match = ("<book>", size, self.titles[span])
+                    break
+                if genre is None and span in self.genres:
+                    match = ("<genre>", size, self.genres[span])
+                    break
+            if match is None:
+                out.append(tokens[i])
+                i += 1
+                continue
+            placeholder, size, value = match
+            if placeholder == "<book>":
+                book_id = value
+            else:
+                genre = value
+            out.append(placeholder)
+            i += size
+        return book_id, genre, out
+
+
+@dataclass
+class Intent:
+    name: str
+    confidence: float
+    lang: str
+    source: str
+    slots: dict = field(default_factory=dict)
+
+
+class IntentRouter:
+    def __init__(self, db, min_confidence=0.6, languages=None, rebuild=None):
+        self.db = db
+        self.languages = LANGUAGES if languages is None else languages
+        self.min_confidence = min_confidence
+        self.model = NaiveBayesClassifier().fit(TRAINING_EXAMPLES)
+        # rebuild(generation): dựng index ở nền rồi gọi install_index; None thì dựng tại chỗ ở câu hỏi kế tiếp
+        self.rebuild = rebuild
+        self.index = None
+        self.generation = 0
+
+    def invalidate(self):
+        """
+        Gọi sau khi thêm/xoá sách hoặc đổi bản dịch (bán hàng không cần: giá và tồn kho luôn đọc trực tiếp).
+        Có rebuild thì index cũ vẫn được dùng tới khi bản mới dựng xong.
+        """
+        self.generation += 1
+        if self.rebuild is None:
+            self.index = None
+        else:
+            self.rebuild(self.generation)
+
+    def build_index(self, db):
+        """
+        Dựng index từ kết nối db (ví dụ ctx.db của job nền lúc mở app), không đụng tới self.db.
+        Kết quả được giao cho install_index trên thread của router.
+        """
+        translations = {lang: db.get_book_translations(lang) for lang in self.languages}
+        return CatalogIndex(db.get_books(), translations)
+
+    def install_index(self, index, generation):
+        """generation: self.generation lúc gửi job dựng; đã invalidate() sau đó thì bỏ bản cũ này."""
+        if generation == self.generation:
+            self.index = index
+
+    def _catalog(self):
+        if self.index is None:
+            self.index = self.build_index(self.db)
+        return self.index
+
+    def classify(self, text):
+        tokens = normalize(text).split()
+        lang = detect_language(text, tokens)
+        book_id, genre, masked = self._catalog().extract(tokens)
+        slots = {k: v for k, v in (("book_id", book_id), ("genre", genre)) if v is not None}
+        if book_id is not None and masked == ["<book>"]:
+            return Intent("info", 1.0, lang, "title", slots)
+
+        masked_text = " ".join(masked)
+        hits = [name for name, pattern in RULES.items() if pattern.search(masked_text)]
+        probs = self.model.predict_proba(masked)
+        if hits:
+            name = max(hits, key=probs.get)
+            intent = Intent(name, max(probs[name], 0.9 if len(hits) == 1 else probs[name]), lang, "rule", slots)
+        else:
+            name = max(probs, key=probs.get)
+            intent = Intent(name, float(probs[name]), lang, "model", slots)
+
+        # Hỏi "còn sách X" nhưng X là một thể loại
+        if intent.name in ("stock", "price", "shelf") and book_id is None and genre is not None:
+            intent.name = "genre"
+        if intent.name in ("stock", "price", "shelf") and book_id is None:
+            intent.name = "none"
+        if intent.source == "model" and intent.confidence < self.min_confidence:
+            intent.name = "none"
+        return intent
+
+    def answer(self, text, lang=None):
+        """Câu trả lời cục bộ, hoặc None nếu nên chuyển cho LLM."""
+        t0 = time.perf_counter()
+        intent = self.classify(text)
+        reply = None if intent.name == "none" else self._reply(intent, lang or intent.lang)
+        metrics.record("intent.answer", (time.perf_counter() - t0) * 1000)
+        metrics.increment(f"intent.{intent.name if reply else 'fallback'}")
+        return reply
+
+    def title(self, book_id, lang, default=None):
+        """Tên sách cho khách: bản dịch kèm tên gốc (tên in trên bìa) nếu khác nhau."""
+        index = self._catalog()
+        snapshot = index.books.get(book_id)
+        original = default or (snapshot.title if snapshot is not None else None)
+        local = index.text(book_id, lang, "title", original)
+        return f"{local} ({original})" if original and local != original else local
+
+    def customer_context(self, text, lang):
+        """Thông tin (đã dịch sẵn) về sách / thể loại được nhắc tới, làm ngữ cảnh cho LLM; None nếu không có."""
+        intent = self.classify(text)
+        if "book_id" in intent.slots:
+            return self._reply(Intent("info", 1.0, lang, "context", intent.slots), lang)
+        if "genre" in intent.slots:
+            return self._reply(Intent("genre", 1.0, lang, "context", intent.slots), lang)
+        return None
+
+    def _reply(self, intent, lang):
+        t = TEMPLATES.get(lang, TEMPLATES["en"])
+        index = self._catalog()
+        if intent.name == "genre":
+            genre = intent.slots.get("genre")
+            if genre is None:
+                genres = sorted({index.genre_name(g, lang) for g in index.genres.values()})
+                return t["genres"].format(genres=", ".join(genres))
+            rows = self.db.get_books_by_genre(genre, limit=8)
+            if not rows:
+                return t["genre_empty"].format(genre=index.genre_name(genre, lang))
+            titles = ", ".join(f"{self.title(r['id'], lang, r['title'])} ({r['sell_price']:,})" for r in rows)
+            return t["genre"].format(genre=index.genre_name(genre, lang), titles=titles)
+
+        book_id = intent.slots["book_id"]
+        book = self.db.find_book(book_id)
+        if book is None:
+            self.invalidate()  # sách vừa bị xoá
+            return None
+        snapshot = index.books.get(book_id)
+        shelf = snapshot.shelf_position if snapshot is not None else "?"
+        title = self.title(book_id, lang, book["title"])
+        if intent.name == "price":
+            return t["price"].format(title=title, price=book["sell_price"])
+        if intent.name == "shelf":
+            return t["shelf"].format(title=title, shelf=shelf)
+
+        available = self.db.get_available_stock(book_id)
+        if intent.name == "info":
+            genre = getattr(snapshot, "genre", "?")
+            reply = t["info"].format(title=title, author=getattr(snapshot, "author", "?"),
+                                     genre=index.genre_name(genre, lang), shelf=shelf,
+                                     description=index.text(book_id, lang, "description",
+                                                            getattr(snapshot, "description", "")),
+                                     price=book["sell_price"], n=available)
+        elif available > 0:
+            reply = t["in_stock"].format(title=title, n=available)
+        else:
+            reply = t["out_of_stock"].format(title=title)
+        return reply + self._also_bought(book_id, t, lang)
+
+    def _also_bought(self, book_id, t, lang, k=3):
+        """Gợi ý upsell "thường được mua cùng"; rỗng nếu chưa có dữ liệu."""
+        recommender = getattr(self.db, "recommender", None)
+        if recommender is not None and not recommender().ready:
+            return ""  # ma trận đang được dựng ở job nền, không chặn câu trả lời
+        try:
+            rows = self.db.get_recommendations(book_id, k)
+        except Exception as e:
+            logging.error(f"Recommendations for book {book_id} failed: {e}")
+            return ""
+        if not rows:
+            return ""
+        titles = ", ".join(f"{self.title(r['id'], lang, r['title'])} ({r['sell_price']:,})" for r in rows)
+        return "\n" + t["also_bought"].format(titles=titles)
@@ -48,4 +48,73 @@ def check_inventory(db, title):
         return quantity
     if quantity > 0:
         return f"Suggested restock: {quantity} copies of '{title}'."
-    return f"No additional stock needed for '{title}'."
\ No newline at end of file
+    return f"No additional stock needed for '{title}'."
+
+
+def optimize_inventory_report(db, progress=None):
+    """
+    Build the inventory optimization suggestions text from sales and stock.
+    progress(done, total, message) is called every 500 books (it may raise to cancel).
+    """
+    revenue_df = db.get_revenue()
+    result = "📊 Inventory Optimization Suggestions:\n\n"
+    inventory = db.get_books()
+
+    unsold_books = []  # list of books that have not been sold
+
+    if not revenue_df.empty:
+        # Calculate sales per book
+        sales = revenue_df.groupby("book_id").agg(
+            {"quantity": "sum", "total_amount": "sum", "profit": "sum"}
+        ).reset_index()
+        sales = sales.merge(inventory, left_on="book_id", right_on="id", how="right")
+
+        for i, (_, row) in enumerate(sales.iterrows()):
+            if progress and i % 500 == 0:
+                progress(i, len(sales), f"{i:,}/{len(sales):,} books")
+            title = row["title"]
+            sold = row["quantity"] if pd.notna(row["quantity"]) else 0
+            stock = row["stock"]
+            buy_price = row["buy_price"]
+            sell_price = row["sell_price"]
+
+            # Profit margin %
+            margin = (sell_price - buy_price) / sell_price * 100 if sell_price > 0 else 0
+
+            # Assume sales data for the last 30 days
+            daily_sales = sold / 30 if sold > 0 else 0
+            days_to_sell = stock / daily_sales if daily_sales > 0 else float("inf")
+
+            if sold == 0:
+                unsold_books.append(title)
+                result += f"❌ {title}: No sales → suggest discount to {int(sell_price*0.7)} VND or stop importing.\n"
+                continue
+
+            if days_to_sell > 90:
+                new_price = int(sell_price * 0.85)
+                result += f"⚠️ {title}: Slow selling (stock lasts {days_to_sell:.0f} days) → reduce price to {new_price} VND.\n"
+
+            elif 30 <= days_to_sell <= 90:
+                result += f"ℹ️ {title}: Average selling (stock lasts {days_to_sell:.0f} days) → keep current price {sell_price} VND.\n"
+
+            elif days_to_sell < 30:
+                suggest_import = int(daily_sales * 60)  # import for ~2 months demand
+                total_cost = suggest_import * buy_price
+                result += f"🔥 {title}: Fast selling (may run out in {days_to_sell:.0f} days) → suggest importing {suggest_import} copies (~{total_cost} VND cost).\n"
+
+            # Profit margin comments
+            if margin < 10:
+                result += f"   💡 Low profit margin ({margin:.1f}%) → consider raising price or discontinuing.\n"
+            elif margin > 40:
+                result += f"   💰 High profit margin ({margin:.1f}%) → should promote more.\n"
+
+    else:
+        result += "No sales data available for optimization."
+
+    # List unsold books
+    if unsold_books:
+        result += "\n📕 Unsold books list:\n"
+        for t in unsold_books:
+            result += f" - {t}\n"
+
+    return result
@@ -0,0 +1,242 @@
+"""
+Chạy báo cáo/phân tích nặng ở thread nền để quầy không bị đứng.
+
+    jobs = JobRunner(root, db_factory=lambda: DatabaseManager("bookstore.db"), on_status=status_bar.update)
+    jobs.submit("profit", load_profit, start, end, key=(start, end, data_version), on_done=render)
+
+- Mỗi worker thread có kết nối database riêng (ctx.db), không dùng chung kết nối của quầy.
+- Tiến độ, kết quả từng phần (ctx.emit) và kết quả cuối được đẩy vào queue, UI thread lấy ra bằng
+  root.after (không gọi Tk từ thread nền).
+- Hủy: ctx.progress()/ctx.check_cancelled() ném JobCancelled; câu SQL đang chạy bị conn.interrupt().
+- Cùng (name, key) đang chạy thì gộp vào job cũ; kết quả cuối cùng được cache theo (name, key).
+"""
+import itertools
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from cache_utils import LRUCache
+from instrumentation import metrics
+
+POLL_MS = 100
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobContext:
+    """Truyền vào hàm của job: kết nối database, báo tiến độ, kiểm tra hủy."""
+
+    def __init__(self, job, runner):
+        self.job = job
+        self._runner = runner
+
+    @property
+    def db(self):
+        return self._runner._thread_db()
+
+    @property
+    def cancelled(self):
+        return self.job.cancel_event.is_set()
+
+    def check_cancelled(self):
+        if self.cancelled:
+            raise JobCancelled(self.job.name)
+
+    def progress(self, done, total=None, message=""):
+        """Báo tiến độ (done/total) và dừng job nếu đã bị hủy."""
+        self.check_cancelled()
+        self.job.fraction = done / total if total else None
+        self.job.message = message
+        self._runner._events.put(("progress", self.job, None))
+
+    def emit(self, payload):
+        """Gửi kết quả từng phần (ví dụ token của chatbot) tới on_partial trên UI thread."""
+        self.check_cancelled()
+        self._runner._events.put(("partial", self.job, payload))
+
+
+class Job:
+    _ids = itertools.count(1)
+
+    def __init__(self, name, key, label=None, use_cache=True):
+        self.id = next(self._ids)
+        self.name = name
+        self.key = key
+        self.label = label or name
+        self.use_cache = use_cache
+        self.cancel_event = threading.Event()
+        self.callbacks = []
+        self.fraction = None
+        self.message = "queued"
+        self.submitted_at = time.perf_counter()
+        self.future = None
+        self.db = None  # kết nối của worker đang chạy job, để interrupt khi hủy
+
+    def cancel(self):
+        """Trả về True nếu job bị hủy khi còn trong hàng đợi (chưa chạy)."""
+        self.cancel_event.set()
+        if self.future is not None and self.future.cancel():
+            return True
+        if self.db is not None:
+            try:
+                self.db.conn.interrupt()
+            except (AttributeError, sqlite3.Error):
+                pass
+        return False
+
+
+class JobRunner:
+    def __init__(self, root, db_factory=None, max_workers=2, cache_size=32, on_status=None):
+        self.root = root
+        self.db_factory = db_factory
+        self.on_status = on_status
+        self.cache = LRUCache(cache_size)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._events = queue.Queue()
+        self._running = {}  # (name, key) -> Job
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._dbs = []
+        self._closed = False
+        self.root.after(POLL_MS, self._pump)
+
+    def _thread_db(self):
+        db = getattr(self._local, "db", None)
+        if db is None and self.db_factory is not None:
+            db = self._local.db = self.db_factory()
+            with self._lock:
+                self._dbs.append(db)
+        return db
+
+    def submit(self, name, fn, *args, key=None, on_done=None, on_error=None, on_partial=None, replace=False,
+               use_cache=True, label=None):
+        """
+        Chạy fn(ctx, *args) ở thread nền. on_done(result)/on_error(exc)/on_partial(payload) được gọi trên UI thread.
+        replace=True: hủy các job cùng name nhưng khác key (ví dụ người dùng đổi bộ lọc).
+        """
+        cache_key = (name, key)
+        callbacks = (on_done, on_error, on_partial)
+        if use_cache:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                metrics.increment("jobs.cache_hit")
+                if on_done:
+                    self.root.after(0, lambda: on_done(cached))
+                return None
+
+        with self._lock:
+            if replace:
+                for (other_name, other_key), other in list(self._running.items()):
+                    if other_name == name and other_key != key:
+                        self._cancel_job(other)
+            job = self._running.get(cache_key)
+            if job is not None and not job.cancel_event.is_set():
+                # Cùng yêu cầu đang chạy: chỉ cần nhận kết quả chung
+                metrics.increment("jobs.deduplicated")
+                job.callbacks.append(callbacks)
+                return job
+            job = Job(name, key, label, use_cache)
+            job.callbacks.append(callbacks)
+            self._running[cache_key] = job
+            job.future = self._executor.submit(self._run, job, fn, args)
+        self._events.put(("progress", job, None))
+        return job
+
+    def _run(self, job, fn, args):
+        ctx = JobContext(job, self)
+        t0 = time.perf_counter()
+        try:
+            ctx.check_cancelled()
+            job.db = ctx.db
+            job.message = "running"
+            self._events.put(("progress", job, None))
+            result = fn(ctx, *args)
+            ctx.check_cancelled()
+        except Exception as e:
+            # Câu SQL bị interrupt() báo lỗi "interrupted" (pandas bọc lại thành DatabaseError)
+            cancelled = isinstance(e, JobCancelled) or job.cancel_event.is_set()
+            self._events.put(("cancelled", job, None) if cancelled else ("error", job, e))
+        else:
+            if job.use_cache:
+                self.cache.put((job.name, job.key), result)
+            self._events.put(("done", job, result))
+        finally:
+            job.db = None
+            metrics.record(f"job.{job.name}", (time.perf_counter() - t0) * 1000)
+
+    def _pump(self):
+        """UI thread: xử lý sự kiện từ worker rồi hẹn lần kiểm tra tiếp theo."""
+        status_changed = False
+        while True:
+            try:
+                kind, job, payload = self._events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "partial":
+                for _, _, on_partial in job.callbacks:
+                    if on_partial and not job.cancel_event.is_set():
+                        try:
+                            on_partial(payload)
+                        except Exception as e:
+                            logging.error(f"Job {job.label} partial callback failed: {e}")
+                continue
+            status_changed = True
+            if kind == "progress":
+                continue
+            with self._lock:
+                if self._running.get((job.name, job.key)) is job:
+                    del self._running[(job.name, job.key)]
+            if kind == "cancelled":
+                metrics.increment("jobs.cancelled")
+                continue
+            for on_done, on_error, _ in job.callbacks:
+                try:
+                    if kind == "done" and on_done:
+                        on_done(payload)
+                    elif kind == "error":
+                        if on_error:
+                            on_error(payload)
+                        else:
+                            logging.error(f"Job {job.label} failed: {payload}")
+                except Exception as e:
+                    logging.error(f"Job {job.label} callback failed: {e}")
+        if status_changed and self.on_status:
+            self.on_status(self.running())
+        if not self._closed:
+            self.root.after(POLL_MS, self._pump)
+
+    def running(self):
+        with self._lock:
+            return list(self._running.values())
+
+    def _cancel_job(self, job):
+        if job.cancel():
+            # Chưa từng chạy nên worker sẽ không gửi sự kiện nào
+            self._events.put(("cancelled", job, None))
+
+    def cancel(self, name=None):
+        """Hủy mọi job đang chạy (hoặc chỉ các job có name)."""
+        for job in self.running():
+            if name is None or job.name == name:
+                self._cancel_job(job)
+
+    def invalidate(self):
+        """Xóa mọi kết quả đã cache."""
+        self.cache.clear()
+
+    def shutdown(self):
+        self._closed = True
+        self.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            dbs, self._dbs = self._dbs, []
+        for db in dbs:
+            try:
+                db.close()
+            except Exception:
+                pass
@@ -0,0 +1,398 @@
+"""
+Lớp gọi LLM dùng chung cho chatbot: timeout, retry, giới hạn đồng thời, gộp câu hỏi trùng, circuit breaker.
+
+    gateway = LLMGateway()
+    reply = gateway.chat(messages, max_tokens=200, fallback="Sorry, the assistant is busy.")
+
+- Một OpenAI client duy nhất (giữ connection pool), tạo lần đầu khi cần; OPENAI_BASE_URL trỏ sang server khác.
+- Mỗi lời gọi có deadline tổng; mỗi lần thử dùng timeout = min(timeout, thời gian còn lại).
+- 429/5xx/timeout/lỗi kết nối: thử lại với exponential backoff + jitter (tôn trọng Retry-After).
+- Tối đa max_concurrency lời gọi cùng lúc; chờ quá deadline thì trả fallback ngay.
+- Cùng (model, messages, max_tokens) đang chạy thì chờ kết quả của lời gọi đó (single-flight).
+- Lỗi liên tiếp >= breaker_threshold: mở breaker, trả fallback trong breaker_reset giây rồi thử 1 lời gọi.
+- stream(): đẩy từng đoạn token ra on_delta ngay khi tới (chatbot hiển thị/đọc theo câu).
+
+Thử với server giả lập (không tốn tiền, không cần mạng):
+
+    python llm_gateway.py mock --port 8799 --latency 2 --error-rate 0.3
+    OPENAI_BASE_URL=http://127.0.0.1:8799/v1 OPENAI_API_KEY=test python llm_gateway.py load --requests 50
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from instrumentation import metrics
+
+DEFAULT_MODEL = os.getenv("BOOKSTORE_LLM_MODEL", "gpt-3.5-turbo")
+DEFAULT_TIMEOUT = float(os.getenv("BOOKSTORE_LLM_TIMEOUT", "15"))
+DEFAULT_DEADLINE = float(os.getenv("BOOKSTORE_LLM_DEADLINE", "20"))
+DEFAULT_CONCURRENCY = int(os.getenv("BOOKSTORE_LLM_CONCURRENCY", "4"))
+
+RETRYABLE_ERRORS = {"APITimeoutError", "APIConnectionError", "RateLimitError", "InternalServerError"}
+
+
+class LLMUnavailable(Exception):
+    """Không lấy được câu trả lời trong deadline (breaker mở, quá tải, hết lượt thử)."""
+
+
+class CircuitBreaker:
+    """closed -> open sau threshold lỗi liên tiếp -> half_open sau reset_seconds (cho 1 lời gọi thử)."""
+
+    def __init__(self, threshold=5, reset_seconds=30.0):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == "half_open" or self.failures >= self.threshold:
+                if self.state != "open":
+                    logging.error(f"LLM circuit breaker opened after {self.failures} failures")
+                    metrics.increment("llm.breaker_opened")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def _is_retryable(exc):
+    status = getattr(exc, "status_code", None)
+    if status is not None:
+        return status == 429 or status >= 500
+    return type(exc).__name__ in RETRYABLE_ERRORS or isinstance(exc, (TimeoutError, ConnectionError))
+
+
+def _retry_after(exc):
+    response = getattr(exc, "response", None)
+    try:
+        return float(response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+class LLMGateway:
+    def __init__(self, client=None, model=DEFAULT_MODEL, timeout=DEFAULT_TIMEOUT, deadline=DEFAULT_DEADLINE,
+                 max_retries=3, backoff_base=0.5, backoff_cap=8.0, max_concurrency=DEFAULT_CONCURRENCY,
+                 breaker_threshold=5, breaker_reset=30.0):
+        self._client = client
+        self.model = model
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_reset)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._flights = {}  # key -> _Flight đang chạy
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from openai import OpenAI
+                    # Retry do gateway tự làm để tính cả backoff vào deadline
+                    self._client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"),
+                                          base_url=os.getenv("OPENAI_BASE_URL") or None,
+                                          timeout=self.timeout, max_retries=0)
+        return self._client
+
+    def chat(self, messages, max_tokens=200, model=None, deadline=None, fallback=None):
+        """
+        Trả về nội dung trả lời của model.
+        Không có câu trả lời trong deadline: trả về fallback (nếu có), ngược lại ném LLMUnavailable.
+        """
+        model = model or self.model
+        expires = time.monotonic() + (deadline or self.deadline)
+        key = (model, max_tokens, json.dumps(messages, sort_keys=True, ensure_ascii=False))
+
+        def attempt(timeout):
+            response = self.client.chat.completions.create(
+                model=model, messages=messages, max_tokens=max_tokens, timeout=timeout)
+            return response.choices[0].message.content.strip()
+
+        try:
+            return self._single_flight(key, expires, lambda: self._call(attempt, expires))
+        except Exception as e:
+            if fallback is None:
+                raise
+            metrics.increment("llm.fallback")
+            logging.error(f"LLM unavailable, using fallback answer: {e}")
+            return fallback
+
+    def _single_flight(self, key, expires, call):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            metrics.increment("llm.coalesced")
+            if not flight.done.wait(max(0.0, expires - time.monotonic())):
+                raise LLMUnavailable("timed out waiting for identical request")
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = call()
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def stream(self, messages, on_delta, max_tokens=200, model=None, deadline=None, fallback=None):
+        """
+        Như chat() nhưng stream=True: on_delta(text) được gọi với từng đoạn ngay khi tới, trả về cả câu trả lời.
+        Chỉ thử lại khi chưa nhận được token nào; đứt giữa chừng hoặc hết deadline thì giữ phần đã nhận.
+        Lỗi do on_delta ném ra (ví dụ job bị hủy) được ném lại nguyên vẹn, không đổi thành fallback.
+        Không gộp single-flight vì mỗi người hỏi cần luồng token riêng.
+        """
+        model = model or self.model
+        expires = time.monotonic() + (deadline or self.deadline)
+        callback_errors = []
+
+        def deliver(text):
+            try:
+                on_delta(text)
+            except Exception as e:
+                callback_errors.append(e)
+                raise
+
+        try:
+            return self._call(lambda timeout: self._stream_once(model, messages, max_tokens, timeout,
+                                                                expires, deliver), expires)
+        except Exception as e:
+            if fallback is None or callback_errors:
+                raise
+            metrics.increment("llm.fallback")
+            logging.error(f"LLM unavailable, using fallback answer: {e}")
+            on_delta(fallback)
+            return fallback
+
+    def _stream_once(self, model, messages, max_tokens, timeout, expires, deliver):
+        t0 = time.perf_counter()
+        response = self.client.chat.completions.create(
+            model=model, messages=messages, max_tokens=max_tokens, timeout=timeout, stream=True)
+        parts = []
+        chunks = iter(response)
+        try:
+            while True:
+                try:
+                    chunk = next(chunks)
+                except StopIteration:
+                    break
+                except Exception as e:
+                    if not parts:
+                        raise
+                    metrics.increment("llm.stream_interrupted")
+                    logging.error(f"LLM stream interrupted, keeping partial answer: {e}")
+                    break
+                text = chunk.choices[0].delta.content if chunk.choices else None
+                if text:
+                    if not parts:
+                        metrics.record("llm.first_token", (time.perf_counter() - t0) * 1000)
+                    parts.append(text)
+                    deliver(text)
+                if time.monotonic() >= expires:
+                    metrics.increment("llm.stream_truncated")
+                    break
+        finally:
+            close = getattr(response, "close", None)
+            if close:
+                close()
+        return "".join(parts).strip()
+
+    def _call(self, attempt, expires):
+        if not self._slots.acquire(timeout=max(0.0, expires - time.monotonic())):
+            metrics.increment("llm.busy_rejected")
+            raise LLMUnavailable("too many concurrent requests")
+        try:
+            if not self.breaker.allow():
+                metrics.increment("llm.breaker_rejected")
+                raise LLMUnavailable("circuit breaker open")
+            return self._call_with_retries(attempt, expires)
+        finally:
+            self._slots.release()
+
+    def _call_with_retries(self, attempt, expires):
+        """attempt(timeout) gọi API một lần; lỗi tạm thời thì thử lại với backoff trong deadline."""
+        tries = 0
+        while True:
+            remaining = expires - time.monotonic()
+            if remaining <= 0:
+                self.breaker.record_failure()
+                raise LLMUnavailable("deadline exceeded")
+            t0 = time.perf_counter()
+            try:
+                reply = attempt(min(self.timeout, remaining))
+            except Exception as e:
+                metrics.record("llm.call", (time.perf_counter() - t0) * 1000)
+                if not _is_retryable(e):
+                    # Lỗi phía request (400, 401...): server vẫn trả lời nên không tính vào breaker
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                tries += 1
+                if tries > self.max_retries or not self.breaker.allow():
+                    raise LLMUnavailable(f"giving up after {tries} attempts: {e}") from e
+                # Full jitter: tránh mọi quầy cùng thử lại một lúc
+                delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** tries))
+                delay = max(delay, _retry_after(e) or 0)
+                if time.monotonic() + delay >= expires:
+                    raise LLMUnavailable(f"no time left to retry: {e}") from e
+                metrics.increment("llm.retry")
+                time.sleep(delay)
+            else:
+                metrics.record("llm.call", (time.perf_counter() - t0) * 1000)
+                self.breaker.record_success()
+                return reply
+
+
+# Mock server -------------------------------------------------------------
+
+def run_mock_server(port=8799, latency=0.5, error_rate=0.0, rate_limit_rate=0.0, token_delay=0.05):
+    """
+    Server giả lập /v1/chat/completions: trễ latency giây, trả 500/429 ngẫu nhiên theo tỉ lệ.
+    stream=True thì trả từng từ cách nhau token_delay giây.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, body, headers=None):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _stream(self, request, answer):
+            # Server-sent events giống OpenAI: mỗi từ một chunk, kết thúc bằng [DONE]
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            for word in answer.split(" "):
+                chunk = {"id": "mock", "object": "chat.completion.chunk", "created": int(time.time()),
+                         "model": request.get("model", "mock"),
+                         "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}]}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+                time.sleep(token_delay)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            request = json.loads(self.rfile.read(length) or b"{}")
+            time.sleep(latency)
+            roll = random.random()
+            if roll < rate_limit_rate:
+                return self._send(429, {"error": {"message": "rate limited", "type": "rate_limit"}},
+                                  {"Retry-After": "1"})
+            if roll < rate_limit_rate + error_rate:
+                return self._send(500, {"error": {"message": "mock failure", "type": "server_error"}})
+            question = request.get("messages", [{}])[-1].get("content", "")
+            answer = f"Mock answer to: {question}. This is the second sentence! And a third one?"
+            if request.get("stream"):
+                return self._stream(request, answer)
+            self._send(200, {
+                "id": "mock", "object": "chat.completion", "created": int(time.time()),
+                "model": request.get("model", "mock"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": answer}}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            })
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    print(f"Mock LLM server on http://127.0.0.1:{port}/v1")
+    server.serve_forever()
+
+
+def run_load(requests_count=50, distinct=5, threads=20):
+    """Bắn requests_count câu hỏi (distinct câu khác nhau) qua gateway rồi in thống kê."""
+    gateway = LLMGateway()
+
+    def ask(i):
+        t0 = time.perf_counter()
+        reply = gateway.chat([{"role": "user", "content": f"question {i % distinct}"}], fallback="FALLBACK")
+        return reply, time.perf_counter() - t0
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(ask, range(requests_count)))
+    latencies = sorted(seconds for _, seconds in results)
+    fallbacks = sum(1 for reply, _ in results if reply == "FALLBACK")
+    print(f"requests={requests_count} fallbacks={fallbacks} breaker={gateway.breaker.state}")
+    print(f"latency p50={latencies[len(latencies) // 2]:.2f}s max={latencies[-1]:.2f}s")
+    snapshot = metrics.snapshot()
+    for section in ("counters", "histograms"):
+        for name, value in snapshot[section].items():
+            if name.startswith("llm."):
+                print(f"{name}: {value}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM gateway tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    mock = sub.add_parser("mock", help="run a local mock OpenAI-compatible server")
+    mock.add_argument("--port", type=int, default=8799)
+    mock.add_argument("--latency", type=float, default=0.5)
+    mock.add_argument("--error-rate", type=float, default=0.0)
+    mock.add_argument("--rate-limit-rate", type=float, default=0.0)
+    mock.add_argument("--token-delay", type=float, default=0.05)
+    load = sub.add_parser("load", help="send concurrent questions through the gateway")
+    load.add_argument("--requests", type=int, default=50)
+    load.add_argument("--distinct", type=int, default=5)
+    load.add_argument("--threads", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.command == "mock":
+        run_mock_server(args.port, args.latency, args.error_rate, args.rate_limit_rate, args.token_delay)
+    else:
+        run_load(args.requests, args.distinct, args.threads)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,53 +1,170 @@
 import logging
 import os
+import socket
+import time
+import uuid
 from tkcalendar import DateEntry
 import pandas as pd
 import tkinter as tk
 from tkinter import ttk, messagebox
-from chatbot import chat_with_customer, chat_with_management
+from chatbot import stream_customer, stream_management
 from datetime import datetime
-from voice_utils import recognize_speech, speak_text, translate_text
-from database_manager import DatabaseManager
+from voice_utils import recognize_speech, speech_queue
+from database_manager import DATE_PREFIX, DatabaseManager, InsufficientStockError
+from api_client import RemoteDatabaseManager
+from branch_manager import BranchRegistry, ChainReporter, local_db_path
+from profit_chart import ProfitChart
+import instrumentation
+from instrumentation import timed
+from inventory_manager import optimize_inventory_report
+from backup_manager import BackupManager
+from sales_cube import GRAINS
+from job_runner import JobRunner
+from maintenance import MaintenanceScheduler
+from pick_route import format_pick_list
+from intent_router import IntentRouter, detect_language, normalize
+from catalog_i18n import LANGUAGE_NAMES, LANGUAGES, SOURCE_LANG
 
 logging.basicConfig(filename='app.log', level=logging.DEBUG,
                     format='%(asctime)s - %(levelname)s - %(message)s')
 
 pd.set_option('future.no_silent_downcasting', True)
 
+RESERVATION_SWEEP_MS = 60_000
+STOCK_ALERT_MS = 2_000  # chu kỳ kiểm tra data_version cho badge tồn kho
+HISTORY_PAGE_SIZE = 200
+INVENTORY_CHUNK = 500  # số dòng chèn vào bảng kho mỗi lượt, giữ UI không bị đơ
+PROFIT_TABLES = ("books", "orders", "order_items")
+PROFIT_VIEWS = ("Per book", "Revenue trend", "Genre share", "Best sellers")
+PROFIT_HEADERS = {
+    "Per book": ("Book Title", "Quantity Sold", "Revenue (VNĐ)", "Profit (VNĐ)"),
+    "Revenue trend": ("Period", "Quantity Sold", "Revenue (VNĐ)", "Profit (VNĐ)"),
+    "Genre share": ("Genre", "Quantity Sold", "Revenue (VNĐ)", "Share"),
+    "Best sellers": ("Book Title", "Quantity Sold", "Revenue (VNĐ)", "Profit (VNĐ)"),
+}
+
 class BookStoreAIManager:
     def __init__(self, root):
         self.root = root
         self.root.title("Book Store AI Manager")
         self.root.geometry("800x700")
-        self.customer_cart_tree = ttk.Treeview(root)
 
-        # Khởi tạo database
-        self.db = DatabaseManager()
+        # Khởi tạo database: qua API server nếu có cấu hình, ngược lại mở SQLite trực tiếp
+        api_url = os.getenv("BOOKSTORE_API_URL")
+        # Nhiều chi nhánh: BOOKSTORE_BRANCH chọn file database của chi nhánh này trong registry
+        self.db = RemoteDatabaseManager(api_url) if api_url else DatabaseManager(local_db_path())
+        if api_url:
+            job_db_factory = lambda: RemoteDatabaseManager(api_url)
+        else:
+            # Báo cáo chạy nền trên kết nối riêng; WAL cho phép chúng đọc trong lúc quầy ghi đơn
+            self.db.conn.execute("PRAGMA journal_mode=WAL")
+            job_db_factory = lambda: DatabaseManager(self.db.db_name)
 
-        # Dữ liệu từ database
-        self.inventory_df = self.db.get_books()
-        self.revenue_df = self.db.get_revenue()
+        # Dữ liệu kho nạp khi tab Inventory được mở (xem open_inventory_tab)
+        self.inventory_df = pd.DataFrame()
+        self._inventory_fill = 0
 
         # Biến cờ
         self.sound_enabled = True
+        self.customer_lang = None  # None: theo ngôn ngữ câu hỏi của khách
+        self._reply_seq = 0
         self.current_order = []
 
-        # Tạo Notebook cho các tab
+        # Mỗi phiên quầy có một cart_id riêng để giữ hàng trong database
+        self.cart_id = f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.sweep_reservations()
+
+        # Thanh trạng thái cho các job chạy nền
+        status_bar = tk.Frame(root, bg="#dfe6e9")
+        status_bar.pack(side="bottom", fill="x")
+        self.status_label = tk.Label(status_bar, text="Ready", bg="#dfe6e9", anchor="w")
+        self.status_label.pack(side="left", padx=8)
+        self.status_progress = ttk.Progressbar(status_bar, length=160, mode="determinate")
+        self.status_progress.pack(side="left", padx=5)
+        self.status_cancel = tk.Button(status_bar, text="✖ Cancel", state="disabled",
+                                       command=lambda: self.jobs.cancel())
+        self.status_cancel.pack(side="left", padx=5)
+        self.jobs = JobRunner(root, job_db_factory, on_status=self.update_job_status)
+
+        # Câu hỏi còn hàng/giá/vị trí/thể loại được trả lời tại chỗ, không qua LLM
+        # Index dựng trên kết nối của job nền, xong thì giao cho router trên UI thread
+        self.intent_router = IntentRouter(self.db, rebuild=self.rebuild_intent_index)
+        self.rebuild_intent_index(self.intent_router.generation)
+        # Ma trận "thường được mua cùng": lần đầu phải đọc toàn bộ lịch sử đơn
+        self.jobs.submit("recommender_build", self.build_recommendations,
+                         use_cache=False, label="Building recommendations")
+
+        # Bảo trì database (ANALYZE, VACUUM, cube doanh số...) chạy nền khi quầy rảnh; qua API thì server lo
+        self.maintenance = None
+        if not api_url:
+            self.maintenance = MaintenanceScheduler(self.db.db_name)
+            self.maintenance.start()
+            for sequence in ("<KeyPress>", "<ButtonPress>"):
+                root.bind_all(sequence, lambda event: self.maintenance.touch(), add="+")
+        self.maintenance_popup = None
+
+        # Tạo Notebook cho các tab: mỗi tab chỉ được dựng khi được chọn lần đầu, và nạp lại dữ liệu
+        # khi được chọn lại nếu các bảng nó đọc đã thay đổi. Khởi động không phụ thuộc kích thước database.
         self.notebook = ttk.Notebook(root)
         self.notebook.pack(fill="both", expand=True)
-
-        self.setup_inventory_tab()
         self.optimization_history = []
-        self.setup_profit_tab()
-        self.setup_staff_tab()
-        self.setup_customer_tab()
-        self.setup_history_tab()
+        self.tabs = {}
+        self.add_lazy_tab("inventory_frame", "Inventory", "#ecf0f1", self.setup_inventory_tab,
+                          self.open_inventory_tab, tables=("books",))
+        self.add_lazy_tab("profit_frame", "Profit Analyzer", "#ecf0f1", self.setup_profit_tab,
+                          lambda: self.open_profit_tab(*self.profit_dates), tables=PROFIT_TABLES)
+        self.add_lazy_tab("staff_frame", "Staff", "#f4f6f9", self.setup_staff_tab)
+        self.add_lazy_tab("customer_frame", "Customer", "#f9f9f9", self.setup_customer_tab,
+                          self.sync_customer_cart)
+        self.add_lazy_tab("history_frame", "History", "#f4f6f9", self.setup_history_tab,
+                          lambda: self.show_history_page(self.history_filters), tables=("orders",))
+        self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed)
+        self.on_tab_changed()
+
+        # Cảnh báo tồn kho do trigger ghi vào stock_events; chỉ đọc khi data_version đổi
+        self.low_stock_count = 0
+        self.restock_popup = None
+        self._alert_seq = None
+        self._alert_version = None
+        self.check_stock_alerts()
+
+    def add_lazy_tab(self, attr, text, bg, setup, load=None, tables=None):
+        """
+        Thêm một tab rỗng; setup() dựng widget khi tab được chọn lần đầu.
+        load() nạp dữ liệu: lần đầu, và mỗi lần chọn lại nếu table_versions(tables) đã đổi.
+        """
+        frame = tk.Frame(self.notebook, bg=bg)
+        setattr(self, attr, frame)
+        self.notebook.add(frame, text=text)
+        self.tabs[str(frame)] = {"name": text, "setup": setup, "load": load, "tables": tables,
+                                 "built": False, "version": None}
+
+    def tab_built(self, name):
+        return any(tab["built"] for tab in self.tabs.values() if tab["name"] == name)
+
+    def on_tab_changed(self, event=None):
+        tab = self.tabs.get(self.notebook.select())
+        if tab is None:
+            return
+        first = not tab["built"]
+        if first:
+            with instrumentation.span(f"ui.build_tab.{tab['name']}"):
+                tab["setup"]()
+            tab["built"] = True
+        if tab["load"] is None:
+            return
+        if tab["tables"]:
+            version = self.db.table_versions(*tab["tables"])
+            if version == tab["version"]:
+                return
+            tab["version"] = version
+        elif not first:
+            return
+        tab["load"]()
 
     def setup_inventory_tab(self):
         """Inventory Management Tab"""
-        self.inventory_frame = tk.Frame(self.notebook, bg="#ecf0f1")
-        self.notebook.add(self.inventory_frame, text="Inventory")
-
         # Header
         header_frame = tk.Frame(self.inventory_frame, bg="#2c3e50")
         header_frame.pack(fill="x")
@@ -72,6 +189,10 @@ class BookStoreAIManager:
         tk.Button(toolbar, text="➕ Add Book", command=self.open_import_stock_popup).pack(side="left", padx=5)
         tk.Button(toolbar, text="❌ Delete Book", command=self.delete_book).pack(side="left", padx=5)
         tk.Button(toolbar, text="📊 Optimize Stock", command=self.optimize_inventory).pack(side="left", padx=5)
+        tk.Button(toolbar, text="📈 What-if", command=self.open_pricing_simulator).pack(side="left", padx=5)
+        tk.Button(toolbar, text="🩺 Diagnostics", command=self.show_diagnostics).pack(side="left", padx=5)
+        tk.Button(toolbar, text="🛠 Maintenance", command=self.open_maintenance_popup).pack(side="left", padx=5)
+        tk.Button(toolbar, text="💾 Backup", command=self.backup_database).pack(side="left", padx=5)
 
         tk.Label(toolbar, text="Search Title:", bg="#ecf0f1").pack(side="left", padx=(20, 5))
         self.search_entry = tk.Entry(toolbar)
@@ -119,9 +240,7 @@ class BookStoreAIManager:
         x_scroll.pack(side="bottom", fill="x")
         self.inventory_tree.pack(fill="both", expand=True)
 
-        # Load data
-        self.open_inventory_tab()
-
+    @timed("ui.search_books")
     def search_books(self):
         keyword = self.search_entry.get().lower()
         for row in self.inventory_tree.get_children():
@@ -145,18 +264,43 @@ class BookStoreAIManager:
                 )
             )
 
+    @timed("ui.open_inventory_tab")
     def open_inventory_tab(self):
-        for row in self.inventory_tree.get_children():
-            self.inventory_tree.delete(row)
-        logging.debug(f"Before reload: inventory_df shape {self.inventory_df.shape}")
-        self.inventory_df = self.db.get_books()
-        logging.debug(f"After reload: inventory_df shape {self.inventory_df.shape}, sample: {self.inventory_df.head().to_dict()}")
-        inventory = self.inventory_df
-        if not inventory.empty:
-            for _, row in inventory.iterrows():
-                self.inventory_tree.insert('', 'end', values=(row['id'], row['title'], row['author'], row['genre'], row['description'], row['shelf_position'], row['buy_price'], row['sell_price'], row['stock']))
-        else:
+        """Nạp bảng sách ở job nền; kết quả được giữ theo phiên bản bảng books."""
+        version = self.db.table_versions("books")
+        self.tabs[str(self.inventory_frame)]["version"] = version
+        self.jobs.submit(
+            "inventory", lambda ctx: ctx.db.get_books(),
+            key=version, replace=True, label="Loading inventory",
+            on_done=self.show_inventory,
+            on_error=lambda e: messagebox.showerror("Error", f"Failed to load inventory:\n{e}"),
+        )
+
+    def show_inventory(self, inventory):
+        logging.debug("Before reload: inventory_df shape %s", self.inventory_df.shape)
+        self.inventory_df = inventory
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            # head().to_dict() chỉ được tính khi thật sự ghi log debug
+            logging.debug("After reload: inventory_df shape %s, sample: %s",
+                          self.inventory_df.shape, self.inventory_df.head().to_dict())
+        self.inventory_tree.delete(*self.inventory_tree.get_children())
+        self._inventory_fill += 1
+        if inventory.empty:
             self.inventory_tree.insert('', 'end', values=("", "Không có sách nào trong kho.", "", "", "", "", "", "", ""))
+            return
+        columns = ['id', 'title', 'author', 'genre', 'description', 'shelf_position', 'buy_price', 'sell_price', 'stock']
+        rows = inventory[columns].itertuples(index=False, name=None)
+        self.fill_inventory(rows, self._inventory_fill)
+
+    def fill_inventory(self, rows, fill):
+        """Chèn từng khối INVENTORY_CHUNK dòng rồi nhường UI; dừng nếu đã có lần nạp mới hơn."""
+        if fill != self._inventory_fill or not self.inventory_tree.winfo_exists():
+            return
+        for i, row in enumerate(rows):
+            self.inventory_tree.insert('', 'end', values=row)
+            if i == INVENTORY_CHUNK - 1:
+                self.root.after(1, self.fill_inventory, rows, fill)
+                return
         logging.debug("Inventory tab refreshed.")
     try:
             from tkcalendar import DateEntry
@@ -165,9 +309,6 @@ class BookStoreAIManager:
 
     def setup_profit_tab(self):
         """Profit Analyzer Tab"""
-        self.profit_frame = tk.Frame(self.notebook, bg="#ecf0f1")
-        self.notebook.add(self.profit_frame, text="Profit Analyzer")
-
         # ==== Header ====
         header_frame = tk.Frame(self.profit_frame, bg="#2c3e50")
         header_frame.pack(fill="x")
@@ -211,6 +352,26 @@ class BookStoreAIManager:
             command=self.open_profit_tab
         ).pack(side="left", padx=5)
 
+        self.profit_show_all = tk.BooleanVar(value=False)
+        tk.Checkbutton(
+            filter_frame, text="All books", variable=self.profit_show_all,
+            bg="#2c3e50", fg="white", selectcolor="#2c3e50",
+            command=self.apply_profit_filter
+        ).pack(side="left", padx=5)
+
+        view_frame = tk.Frame(self.profit_frame, bg="#ecf0f1")
+        view_frame.pack(fill="x", padx=10, pady=(5, 0))
+        tk.Label(view_frame, text="View:", bg="#ecf0f1").pack(side="left", padx=2)
+        self.profit_view = ttk.Combobox(view_frame, values=PROFIT_VIEWS, state="readonly", width=14)
+        self.profit_view.set(PROFIT_VIEWS[0])
+        self.profit_view.pack(side="left", padx=2)
+        self.profit_view.bind("<<ComboboxSelected>>", lambda e: self.apply_profit_filter())
+        tk.Label(view_frame, text="Group by:", bg="#ecf0f1").pack(side="left", padx=(10, 2))
+        self.profit_grain = ttk.Combobox(view_frame, values=GRAINS, state="readonly", width=8)
+        self.profit_grain.set("month")
+        self.profit_grain.pack(side="left", padx=2)
+        self.profit_grain.bind("<<ComboboxSelected>>", lambda e: self.apply_profit_filter())
+
         # Table
         table_frame = tk.Frame(self.profit_frame)
         table_frame.pack(fill="both", expand=True, padx=10, pady=10)
@@ -247,9 +408,8 @@ class BookStoreAIManager:
         # Chart Area
         self.profit_chart_frame = tk.Frame(self.profit_frame, bg="#ecf0f1", height=400)
         self.profit_chart_frame.pack(fill="both", expand=True, padx=10, pady=10)
-
-        # Load full data initially
-        self.open_profit_tab()
+        self.profit_chart = ProfitChart(self.profit_chart_frame, self.root)
+        self.profit_dates = (None, None)
 
     def apply_profit_filter(self):
         """Filter profit by date range"""
@@ -265,82 +425,108 @@ class BookStoreAIManager:
 
         self.open_profit_tab(start_dt, end_dt)
 
+    @timed("ui.open_profit_tab")
     def open_profit_tab(self, start_date=None, end_date=None):
         """Load profit data into table and chart (optionally filter by date)"""
+        start = start_date.strftime("%Y-%m-%d") if start_date else None
+        end = end_date.strftime("%Y-%m-%d 23:59:59") if end_date else None
+        view = self.profit_view.get()
+        grain = self.profit_grain.get()
+        self.profit_dates = (start_date, end_date)
+
+        # Tổng hợp chạy ở job nền; kết quả được cache theo bộ lọc + phiên bản các bảng bán hàng
+        cache_key = (view, grain, start, end, self.db.table_versions(*PROFIT_TABLES))
+        self.profit_request = cache_key
+        self.profit_label.config(text=f"💰 {view} | Loading...")
+        self.jobs.submit(
+            "profit", self.load_profit_data, view, grain, start, end,
+            key=cache_key, replace=True, label=f"Profit: {view}",
+            on_done=lambda result: self.show_profit_data(view, start, end, cache_key, result),
+            on_error=lambda e: messagebox.showerror("Error", f"Failed to load report:\n{e}"),
+        )
+
+    @staticmethod
+    def load_profit_data(ctx, view, grain, start, end):
+        """Chạy ở thread nền: trả về (dữ liệu, % thay đổi so với kỳ trước hoặc None)."""
+        db = ctx.db
+        change = None
+        if view == "Per book":
+            return db.get_revenue(start, end), change
+        if view == "Revenue trend":
+            data = db.get_sales_trend(grain, start, end)
+        elif view == "Genre share":
+            data = db.get_genre_share(start, end)
+        else:
+            data = db.get_best_sellers(20, start, end)
+        ctx.progress(1, 2, "comparing periods")
+        if start and end:
+            # So với khoảng liền trước có cùng độ dài
+            total = db.compare_sales_periods(start, end)
+            if not total.empty and pd.notna(total["change_pct"].iloc[0]):
+                change = float(total["change_pct"].iloc[0])
+        return data, change
+
+    def show_profit_data(self, view, start, end, cache_key, result):
+        if cache_key != self.profit_request:
+            return  # người dùng đã đổi bộ lọc trong lúc chờ
+        data, change = result
         for row in self.profit_tree.get_children():
             self.profit_tree.delete(row)
-        for widget in self.profit_chart_frame.winfo_children():
-            widget.destroy()
-
-        revenue_df = self.db.get_revenue()
-        books = self.db.get_books()
+        for col, text in zip(self.profit_tree["columns"], PROFIT_HEADERS[view]):
+            self.profit_tree.heading(col, text=text)
 
-        if revenue_df.empty:
-            self.profit_label.config(text="💰 Profit Analysis | No revenue data available")
+        if data.empty:
+            message = "No data in this range" if (start or end) else "No revenue data available"
+            self.profit_label.config(text=f"💰 {view} | {message}")
             self.profit_tree.insert("", "end", values=("No data", "", "", ""))
+            self.profit_chart.clear()
             return
 
-        # Filter
-        if start_date:
-            revenue_df = revenue_df[revenue_df["timestamp"] >= start_date.strftime("%Y-%m-%d")]
-        if end_date:
-            revenue_df = revenue_df[revenue_df["timestamp"] <= end_date.strftime("%Y-%m-%d")]
-
-        if revenue_df.empty:
-            self.profit_label.config(text="💰 Profit Analysis | No data in this range")
-            self.profit_tree.insert("", "end", values=("No data", "", "", ""))
+        if view == "Per book":
+            total_revenue = data["total_amount"].sum()
+            total_profit = data["profit"].sum()
+            self.profit_label.config(
+                text=f"💰 Profit Analysis | Total Revenue: {total_revenue:,.0f} VNĐ | Total Profit: {total_profit:,.0f} VNĐ"
+            )
+            for i, row in enumerate(data.itertuples(index=False)):
+                tag = "evenrow" if i % 2 == 0 else "oddrow"
+                self.profit_tree.insert(
+                    "", "end",
+                    values=(row.title, row.quantity, f"{row.total_amount:.0f}", f"{row.profit:.0f}"),
+                    tags=(tag,)
+                )
+            # Chart: figure giữ nguyên, chỉ cập nhật dữ liệu
+            self.profit_chart.top_n = None if self.profit_show_all.get() else 15
+            self.profit_chart.show(cache_key, data)
             return
 
-        # Aggregate
-        aggregated = (
-            revenue_df.groupby("book_id")
-            .agg({"quantity": "sum", "total_amount": "sum", "profit": "sum"})
-            .reset_index()
-        )
-
-        aggregated = aggregated.merge(
-            books[["id", "title"]],
-            left_on="book_id", right_on="id",
-            how="left"
-        ).drop(columns=["id"])
+        summary = f"💰 {view} | Revenue: {data['revenue'].sum():,.0f} VNĐ"
+        if change is not None:
+            summary += f" ({change:+.1f}% vs previous period)"
+        self.profit_label.config(text=summary)
 
-        total_revenue = aggregated["total_amount"].sum()
-        total_profit = aggregated["profit"].sum()
-
-        self.profit_label.config(
-            text=f"💰 Profit Analysis | Total Revenue: {total_revenue:,.0f} VNĐ | Total Profit: {total_profit:,.0f} VNĐ"
-        )
-
-        for i, row in aggregated.iterrows():
-            tag = "evenrow" if i % 2 == 0 else "oddrow"
+        label_col = {"Revenue trend": "period", "Genre share": "genre"}.get(view, "title")
+        for i, row in enumerate(data.itertuples(index=False)):
+            last = f"{row.share:.1%}" if view == "Genre share" else f"{row.profit:,.0f}"
             self.profit_tree.insert(
                 "", "end",
-                values=(row["title"], row["quantity"], f"{row['total_amount']:.0f}", f"{row['profit']:.0f}"),
-                tags=(tag,)
+                values=(getattr(row, label_col), row.quantity, f"{row.revenue:,.0f}", last),
+                tags=("evenrow" if i % 2 == 0 else "oddrow",)
             )
 
-        # Chart
-        from matplotlib.figure import Figure
-        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-
-        fig = Figure(figsize=(10, 5), dpi=100)
-        ax = fig.add_subplot(111)
-        aggregated.plot(kind="bar", x="title", y="profit", ax=ax, color="#4ECDC4", legend=False)
-        ax.set_title("Profit per Book", fontsize=12)
-        ax.set_ylabel("Profit (VNĐ)")
-        ax.tick_params(axis="x", labelsize=8, rotation=45)
-
-        canvas = FigureCanvasTkAgg(fig, self.profit_chart_frame)
-        canvas.draw()
-        canvas.get_tk_widget().pack(fill="both", expand=True)
+        self.profit_chart.top_n = 15
+        self.profit_chart.show(cache_key, data, label_col, "revenue", title=view, ylabel="Revenue (VNĐ)",
+                               keep_order=view == "Revenue trend")
 
     def setup_staff_tab(self):
-        self.staff_frame = tk.Frame(self.notebook, bg="#f4f6f9")
-        self.notebook.add(self.staff_frame, text="Staff")
-
-        # Tiêu đề
-        tk.Label(self.staff_frame, text="Staff Management", font=("Arial", 14, "bold"),
-                 bg="#f4f6f9", fg="#2c3e50").pack(pady=10)
+        # Tiêu đề + badge cảnh báo tồn kho
+        header = tk.Frame(self.staff_frame, bg="#f4f6f9")
+        header.pack(fill="x", padx=10, pady=10)
+        tk.Label(header, text="Staff Management", font=("Arial", 14, "bold"),
+                 bg="#f4f6f9", fg="#2c3e50").pack(side="left", expand=True)
+        self.stock_badge = tk.Button(header, fg="white", relief="flat", command=self.open_restock_popup)
+        self.stock_badge.pack(side="right")
+        self.update_stock_badge(self.low_stock_count)
 
         # Frame chia đôi
         main_frame = tk.Frame(self.staff_frame, bg="#f4f6f9")
@@ -394,6 +580,8 @@ class BookStoreAIManager:
         # Nút điều khiển giỏ hàng
         cart_button_frame = tk.Frame(order_frame, bg="#f4f6f9")
         cart_button_frame.pack(anchor="w", pady=5)
+        tk.Button(cart_button_frame, text="🧾 Pick list", command=self.show_cart_pick_list,
+                  bg="#8e44ad", fg="white").pack(side=tk.LEFT, padx=5)
 
         # Table giỏ hàng
         self.order_tree_staff = ttk.Treeview(order_frame,
@@ -406,6 +594,14 @@ class BookStoreAIManager:
 
         self.order_tree_staff.pack(pady=5, fill="both", expand=True)
 
+        # Gợi ý bán kèm theo giỏ hiện tại
+        tk.Label(order_frame, text="💡 Frequently bought together (double-click to add):",
+                 bg="#f4f6f9", fg="#34495e").pack(anchor="w")
+        self.upsell_list = tk.Listbox(order_frame, height=4)
+        self.upsell_list.pack(fill="x", pady=2)
+        self.upsell_list.bind("<Double-Button-1>", self.add_upsell_to_order)
+        self.upsell_books = []
+
         # Tổng tiền + Thanh toán
         self.total_order_label_staff = tk.Label(order_frame, text="Total: 0 VND",
                                                 font=("Arial", 10, "bold"), bg="#f4f6f9")
@@ -417,82 +613,39 @@ class BookStoreAIManager:
         # Khởi tạo giỏ hàng rỗng
         self.current_order = []
 
-    def add_product_to_order(self):
-        title_or_id = self.product_entry.get().strip()
-        if not title_or_id:
-            messagebox.showwarning("Warning", "Please enter book ID or Title.")
-            return
-        try:
-            qty = int(self.quantity_entry.get().strip() or 1)
-        except ValueError:
-            messagebox.showerror("Error", "Quantity must be a number.")
+    @staticmethod
+    def build_recommendations(ctx):
+        recommender = getattr(ctx.db, "recommender", None)
+        if recommender is not None:  # chế độ server: API server tự dựng
+            recommender().refresh()
+
+    def refresh_upsell_suggestions(self):
+        book_ids = sorted({item["book_id"] for item in self.current_order})
+        if not book_ids:
+            self.jobs.cancel("upsell")
+            self.show_upsell_suggestions([])
             return
-        if qty <= 0:
-            messagebox.showerror("Error", "Quantity must be greater than 0.")
-            return
-
-        import sqlite3, os
-        db_path = os.path.join(os.path.dirname(__file__), "bookstore.db")
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-
-        # Tìm sách theo ID hoặc Title
-        if title_or_id.isdigit():
-            cursor.execute(
-                "SELECT id, title, buy_price, sell_price, stock FROM books WHERE id = ?",
-                (title_or_id,),
-            )
-        else:
-            cursor.execute(
-                "SELECT id, title, buy_price, sell_price, stock FROM books WHERE LOWER(title) = LOWER(?)",
-                (title_or_id,),
-            )
-
-        book = cursor.fetchone()
-        conn.close()
-
-        if not book:
-            messagebox.showerror("Error", "Book not found in inventory.")
-            return
-
-        book_id, title, buy_price, sell_price, stock = book
-
-        # Số lượng đã có sẵn trong giỏ với cùng book_id
-        reserved = sum(it["quantity"] for it in self.current_order if it["book_id"] == book_id)
-        available = (stock or 0) - reserved
-
-        # Kiểm tra tồn kho
-        if available <= 0:
-            messagebox.showwarning("Insufficient Stock", f"'{title}' is out of stock.")
-            return
-
-        if qty > available:
-            messagebox.showwarning(
-                "Insufficient Stock",
-                f"Only {available} copies of '{title}' left (in stock minus items already in the cart)."
-            )
+        self.jobs.submit("upsell", lambda ctx: ctx.db.get_cart_recommendations(book_ids, k=5),
+                         key=(tuple(book_ids), self.db.data_version()), replace=True, label="Suggestions",
+                         on_done=self.show_upsell_suggestions,
+                         on_error=lambda e: logging.error(f"Upsell suggestions failed: {e}"))
+
+    def show_upsell_suggestions(self, books):
+        self.upsell_books = books
+        self.upsell_list.delete(0, tk.END)
+        for book in books:
+            self.upsell_list.insert(tk.END, f"{book['title']} — {book['sell_price']:,} VND (stock {book['stock']})")
+
+    def add_upsell_to_order(self, event=None):
+        selected = self.upsell_list.curselection()
+        if not selected:
             return
-
-        total = sell_price * qty
-
-        # Lưu vào giỏ hàng tạm
-        self.current_order.append({
-            "book_id": book_id,
-            "title": title,
-            "quantity": qty,
-            "unit_price": sell_price,
-            "total": total
-        })
-
-        # Hiển thị lên bảng Staff
-        self.order_tree_staff.insert("", "end", values=(title, qty, sell_price, total))
-
-        # Cập nhật tổng tiền
-        total_amount = sum(item["total"] for item in self.current_order)
-        self.total_order_label_staff.config(text=f"Total: {total_amount:,} VND")
-
-        # Đồng bộ giỏ hàng bên Customer
-        self.sync_customer_cart()
+        book = self.upsell_books[selected[0]]
+        self.product_entry.delete(0, tk.END)
+        self.product_entry.insert(0, str(book["id"]))
+        self.quantity_entry.delete(0, tk.END)
+        self.quantity_entry.insert(0, "1")
+        self.add_product_to_order()
 
     def update_cart_tree_staff(self):
         # Xoá toàn bộ dữ liệu cũ trong Treeview staff
@@ -513,6 +666,7 @@ class BookStoreAIManager:
         # Cập nhật label tổng
         self.total_order_label_staff.config(text=f"Total: {total_amount:,} VND")
 
+    @timed("ui.remove_selected_item")
     def remove_selected_item(self):
         selected = self.order_tree_staff.selection()
         if not selected:
@@ -522,11 +676,15 @@ class BookStoreAIManager:
         values = self.order_tree_staff.item(selected, "values")
         title_to_remove = values[0]
 
-        # Xoá khỏi current_order
+        # Xoá khỏi current_order và nhả hàng đang giữ
+        removed_ids = {book["book_id"] for book in self.current_order if book["title"] == title_to_remove}
         self.current_order = [book for book in self.current_order if book["title"] != title_to_remove]
+        for book_id in removed_ids:
+            self.db.release_reservations(self.cart_id, book_id)
 
         # Cập nhật lại giỏ hàng staff
         self.update_cart_tree_staff()
+        self.refresh_upsell_suggestions()
 
         # Đồng bộ sang Customer tab
         self.sync_customer_cart()
@@ -535,6 +693,7 @@ class BookStoreAIManager:
         total = sum(item["total"] for item in self.current_order)
         self.total_order_label_staff.config(text=f"Total: {total} VND")
 
+    @timed("ui.complete_payment")
     def complete_payment(self):
         if not self.current_order:
             messagebox.showwarning("Empty", "No items in the order.")
@@ -542,16 +701,16 @@ class BookStoreAIManager:
 
         try:
             # Ghi order vào database qua DatabaseManager
-            result = self.db.create_order(self.current_order)
+            result = self.db.create_order(self.current_order, cart_id=self.cart_id)
 
             # Reset giỏ hàng Staff
             self.current_order.clear()
             self.order_tree_staff.delete(*self.order_tree_staff.get_children())
             self.total_order_label_staff.config(text="Total: 0 VND")
+            self.refresh_upsell_suggestions()
 
             # Reset giỏ hàng Customer
-            self.customer_cart_tree.delete(*self.customer_cart_tree.get_children())
-            self.customer_total_label.config(text="Total: 0 VND")
+            self.sync_customer_cart()
 
             # Thông báo
             messagebox.showinfo(
@@ -564,6 +723,8 @@ class BookStoreAIManager:
             messagebox.showerror("Error", f"Failed to complete order:\n{e}")
 
     def sync_customer_cart(self):
+        if not self.tab_built("Customer"):
+            return  # tab chưa mở: sẽ đồng bộ khi được dựng
         # Xóa dữ liệu cũ
         for item in self.customer_cart_tree.get_children():
             self.customer_cart_tree.delete(item)
@@ -572,6 +733,8 @@ class BookStoreAIManager:
 
         for book in self.current_order:
             title = book["title"]
+            if self.customer_lang:
+                title = self.intent_router.title(book["book_id"], self.customer_lang, title)
             qty = book["quantity"]
             price = book["unit_price"]
             total = qty * price
@@ -587,21 +750,56 @@ class BookStoreAIManager:
             text=f"Total books: {total_qty} | Total amount: {total_amount:,} VND"
         )
 
+    @timed("ui.chat_with_management_ui")
     def chat_with_management_ui(self):
         question = self.staff_chat_input.get()
         self.staff_chat_input.delete(0, tk.END)
         self.staff_chat_text.insert(tk.END, f"You: {question}\n")
 
-        context = self.get_inventory_context()
-        reply = chat_with_management(question, context)
-
-        self.staff_chat_text.insert(tk.END, f"Manager: {reply}\n")
-        self.staff_chat_text.see(tk.END)
+        widget = self.staff_chat_text
+        mark = self.begin_reply(widget, "Manager")
+
+        def answer(ctx):
+            context = self.get_inventory_context(ctx.db)
+            ctx.progress(1, 2, "waiting for AI reply")
+            return stream_management(question, context, ctx.emit)
+
+        self._reply_seq += 1
+        self.jobs.submit("management_chat", answer, key=self._reply_seq, use_cache=False,
+                         label="AI manager",
+                         on_partial=lambda text: self.append_reply(widget, mark, text),
+                         on_done=lambda reply: self.end_reply(widget, mark),
+                         on_error=lambda e: self.end_reply(widget, mark, f"⚠️ {e}"))
+
+    def begin_reply(self, widget, prefix):
+        """Chèn '<prefix>: ' và trả về mark để chèn dần từng token của câu trả lời vào đúng chỗ."""
+        self._reply_seq += 1
+        mark = f"reply{self._reply_seq}"
+        state = widget.cget("state")
+        widget.config(state=tk.NORMAL)
+        widget.insert(tk.END, f"{prefix}: ")
+        # Mark nằm trước "\n\n": tin nhắn mới chèn ở END không lẫn vào câu trả lời đang stream
+        widget.mark_set(mark, "end-1c")
+        widget.mark_gravity(mark, tk.LEFT)
+        widget.insert(tk.END, "\n\n")
+        widget.mark_gravity(mark, tk.RIGHT)
+        widget.config(state=state)
+        widget.see(tk.END)
+        return mark
+
+    def append_reply(self, widget, mark, text):
+        state = widget.cget("state")
+        widget.config(state=tk.NORMAL)
+        widget.insert(mark, text)
+        widget.config(state=state)
+        widget.see(mark)
+
+    def end_reply(self, widget, mark, text=None):
+        if text:
+            self.append_reply(widget, mark, text)
+        widget.mark_unset(mark)
 
     def setup_customer_tab(self):
-        self.customer_frame = tk.Frame(self.notebook, bg="#f9f9f9")
-        self.notebook.add(self.customer_frame, text="Customer")
-
         # Layout chia đôi: Giỏ hàng bên trái, Chatbot bên phải
         left_frame = tk.Frame(self.customer_frame, bg="#f9f9f9", bd=2, relief="groove")
         left_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=10, pady=10)
@@ -612,6 +810,22 @@ class BookStoreAIManager:
         # 🛒 CART VIEW
         tk.Label(left_frame, text="🛍️ Your Cart", font=("Arial", 14, "bold"), bg="#f9f9f9").pack(pady=5)
 
+        # Ngôn ngữ hiển thị cho khách: tên sách và câu trả lời lấy từ bản dịch sẵn
+        lang_frame = tk.Frame(left_frame, bg="#f9f9f9")
+        lang_frame.pack(fill=tk.X, padx=5)
+        tk.Label(lang_frame, text="🌐 Language:", bg="#f9f9f9").pack(side=tk.LEFT)
+        lang_choices = {"Auto": None}
+        lang_choices.update({LANGUAGE_NAMES.get(lang, lang): lang for lang in [SOURCE_LANG] + LANGUAGES})
+        lang_box = ttk.Combobox(lang_frame, values=list(lang_choices), width=12, state="readonly")
+        lang_box.set("Auto")
+        lang_box.pack(side=tk.LEFT, padx=5)
+
+        def set_language(event=None):
+            self.customer_lang = lang_choices[lang_box.get()]
+            self.sync_customer_cart()
+
+        lang_box.bind("<<ComboboxSelected>>", set_language)
+
         cart_frame = tk.Frame(left_frame, bg="#f9f9f9")
         cart_frame.pack(fill=tk.BOTH, expand=True)
 
@@ -653,40 +867,49 @@ class BookStoreAIManager:
         tk.Button(chat_entry_frame, text="Send", command=self.send_customer_message).pack(side=tk.LEFT, padx=5)
         tk.Button(chat_entry_frame, text="🎤 Voice", command=self.send_customer_voice).pack(side=tk.LEFT, padx=5)
 
-    def customer_chatbot(self, user_msg, target_lang="en"):
-        """
-        Chatbot cho khách hàng:
-        - Dịch câu hỏi sang tiếng Anh (cho AI dễ hiểu hơn).
-        - Kiểm tra database: nếu có sách thì trả thông tin từ DB.
-        - Nếu không thì gọi AI trả lời.
-        - Cuối cùng dịch lại sang ngôn ngữ của khách (target_lang).
-        """
-        # 1. Dịch sang tiếng Anh cho AI dễ hiểu
-        question_en = translate_text(user_msg, src="auto", dest="en")
-
-        # 2. Kiểm tra DB xem có sách nào khớp không
-        books_df = self.db.get_books()
-        found = books_df[books_df["title"].str.lower() == user_msg.lower()]
-
-        if not found.empty:
-            book = found.iloc[0]
-            reply = (
-                f"📚 {book['title']}\n"
-                f"✍️ Author: {book['author']}\n"
-                f"📖 Genre: {book['genre']}\n"
-                f"📝 Description: {book['description']}\n"
-                f"📌 Shelf Position: {book['shelf_position']}\n"
-                f"💰 Price: {book['sell_price']} VND\n"
-                f"📦 Stock: {book['stock']}"
-            )
-        else:
-            # 3. Nếu không tìm thấy sách -> hỏi AI
-            reply_en = chat_with_customer(question_en)
-            # 4. Dịch lại sang target_lang
-            reply = translate_text(reply_en, src="en", dest=target_lang)
+    def show_customer_reply(self, reply, prefix="Assistant"):
+        self.customer_chat_text.config(state=tk.NORMAL)
+        self.customer_chat_text.insert(tk.END, f"{prefix}: {reply}\n\n")
+        self.customer_chat_text.config(state=tk.DISABLED)
+        self.customer_chat_text.see(tk.END)
+        self.speak_sentence(reply)
 
-        return reply
+    def speak_sentence(self, sentence):
+        """Có thể gọi từ thread nền: SpeechQueue đọc lần lượt ở thread riêng."""
+        if self.sound_enabled:
+            speech_queue.say(sentence)
 
+    def ask_customer_in_background(self, question, prefix="Assistant"):
+        """
+        Câu hỏi cần AI: stream ở JobRunner để quầy không bị treo.
+        Token hiện ra ngay khi tới, kể cả khi khách hỏi bằng tiếng Việt: AI trả lời thẳng bằng ngôn ngữ
+        của khách với thông tin sách đã dịch sẵn, không dịch câu hỏi / câu trả lời qua mạng.
+        """
+        widget = self.customer_chat_text
+        mark = self.begin_reply(widget, prefix)
+        lang = self.customer_lang or detect_language(question, normalize(question).split())
+        started = time.perf_counter()
+        first_word = []
+
+        # Ngữ cảnh đọc database của UI (router, recommender) nên lấy ở đây, trước khi sang thread nền
+        context = self.intent_router.customer_context(question, lang)
+
+        def ask(ctx):
+            return stream_customer(question, ctx.emit, on_sentence=self.speak_sentence, lang=lang, context=context)
+
+        def on_partial(text):
+            if not first_word:
+                first_word.append(True)
+                instrumentation.metrics.record("chat.first_word", (time.perf_counter() - started) * 1000)
+            self.append_reply(widget, mark, text)
+
+        self._reply_seq += 1
+        self.jobs.submit("customer_chat", ask, key=self._reply_seq, use_cache=False, label="AI assistant",
+                         on_partial=on_partial,
+                         on_done=lambda reply: self.end_reply(widget, mark),
+                         on_error=lambda e: self.end_reply(widget, mark, f"⚠️ {e}"))
+
+    @timed("ui.send_customer_message")
     def send_customer_message(self):
         user_msg = self.customer_chat_entry.get()
         if not user_msg:
@@ -695,16 +918,15 @@ class BookStoreAIManager:
 
         self.customer_chat_text.config(state=tk.NORMAL)
         self.customer_chat_text.insert(tk.END, f"You: {user_msg}\n")
-
-        reply = self.customer_chatbot(user_msg, target_lang="en")
-
-        self.customer_chat_text.insert(tk.END, f"Assistant: {reply}\n\n")
         self.customer_chat_text.config(state=tk.DISABLED)
-        self.customer_chat_text.see(tk.END)
 
-        if self.sound_enabled:
-            speak_text(reply, lang="en")
+        reply = self.intent_router.answer(user_msg, lang=self.customer_lang)
+        if reply:
+            self.show_customer_reply(reply)
+        else:
+            self.ask_customer_in_background(user_msg)
 
+    @timed("ui.send_customer_voice")
     def send_customer_voice(self):
         question = recognize_speech()
         if not question.strip():
@@ -712,12 +934,14 @@ class BookStoreAIManager:
             self.customer_chat_text.see(tk.END)
             return
 
+        self.customer_chat_text.config(state=tk.NORMAL)
         self.customer_chat_text.insert(tk.END, f"You: {question}\n")
-        reply = chat_with_customer(question)
-        self.customer_chat_text.insert(tk.END, f"🤖: {reply}\n")
-        self.customer_chat_text.see(tk.END)
-        if self.sound_enabled:
-            speak_text(reply, lang='en')
+        self.customer_chat_text.config(state=tk.DISABLED)
+        reply = self.intent_router.answer(question, lang=self.customer_lang)
+        if reply:
+            self.show_customer_reply(reply, prefix="🤖")
+        else:
+            self.ask_customer_in_background(question, prefix="🤖")
 
     def refresh_customer_tab(self):
         self.customer_chat_text.delete(1.0, tk.END)
@@ -729,20 +953,24 @@ class BookStoreAIManager:
 
     def toggle_sound(self):
         self.sound_enabled = not self.sound_enabled
+        if not self.sound_enabled:
+            speech_queue.clear()
         self.toggle_sound_button.config(text="Tắt tiếng" if not self.sound_enabled else "Bật tiếng")
 
-    def get_inventory_context(self):
-        context = "Danh sách sách trong kho:\n"
-        inventory = self.db.get_books()
-        for _, book in inventory.iterrows():
-            context += f"- {book['title']} (Thể loại: {book['genre']}, Vị trí: {book['shelf_position']}, Giá: {book['sell_price']} VNĐ, Tồn kho: {book['stock']} bản)\n"
-        revenue = self.db.get_revenue()
+    @timed("ui.get_inventory_context")
+    def get_inventory_context(self, db=None):
+        db = db or self.db
+        lines = ["Danh sách sách trong kho:"]
+        inventory = db.get_books()
+        for book in inventory.itertuples(index=False):
+            lines.append(f"- {book.title} (Thể loại: {book.genre}, Vị trí: {book.shelf_position}, Giá: {book.sell_price} VNĐ, Tồn kho: {book.stock} bản)")
+        revenue = db.get_revenue()
         if not revenue.empty:
-            context += "Doanh số bán hàng:\n"
-            for _, sale in revenue.iterrows():
-                book = self.db.get_books()[self.db.get_books()['id'] == sale['book_id']].iloc[0]
-                context += f"- {book['title']}: Đã bán {sale['quantity']} bản, Tổng doanh thu: {sale['total_amount']} VNĐ, Lợi nhuận: {sale['profit']} VNĐ\n"
-        return context
+            # get_revenue đã có title, không cần tra lại bảng sách cho từng dòng
+            lines.append("Doanh số bán hàng:")
+            for sale in revenue.itertuples(index=False):
+                lines.append(f"- {sale.title}: Đã bán {sale.quantity} bản, Tổng doanh thu: {sale.total_amount} VNĐ, Lợi nhuận: {sale.profit} VNĐ")
+        return "\n".join(lines) + "\n"
 
     def open_import_stock_popup(self):
         popup = tk.Toplevel(self.root)
@@ -795,6 +1023,10 @@ class BookStoreAIManager:
                     int(sell_price_entry.get()),
                     int(quantity_entry.get())
                 )
+                self.intent_router.invalidate()
+                if self.maintenance is not None:
+                    # qua API thì server tự dịch sách mới; bản dịch xong thì dựng lại index lần nữa
+                    self.run_maintenance("translations", on_done=lambda _: self.intent_router.invalidate())
                 messagebox.showinfo("Success", "Book added successfully!")
                 popup.destroy()
                 self.open_inventory_tab()  # refresh inventory
@@ -807,6 +1039,7 @@ class BookStoreAIManager:
         tk.Button(btn_frame, text="✅ Save", command=save_book, bg="#27ae60", fg="white").pack(side="left", padx=5)
         tk.Button(btn_frame, text="❌ Cancel", command=popup.destroy, bg="#e74c3c", fg="white").pack(side="left", padx=5)
 
+    @timed("ui.add_product_to_order")
     def add_product_to_order(self):
         title_or_id = self.product_entry.get().strip()
         if not title_or_id:
@@ -823,46 +1056,27 @@ class BookStoreAIManager:
             messagebox.showerror("Error", "Quantity must be greater than 0.")
             return
 
-        import sqlite3, os
-        db_path = os.path.join(os.path.dirname(__file__), "bookstore.db")
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-
         # Find book by ID or Title (case-insensitive)
-        if title_or_id.isdigit():
-            cursor.execute(
-                "SELECT id, title, buy_price, sell_price, stock FROM books WHERE id = ?",
-                (title_or_id,),
-            )
-        else:
-            cursor.execute(
-                "SELECT id, title, buy_price, sell_price, stock FROM books WHERE LOWER(title) = LOWER(?)",
-                (title_or_id,),
-            )
-
-        book = cursor.fetchone()
-        conn.close()
+        book = self.db.find_book(title_or_id)
 
         if not book:
             messagebox.showerror("Error", "Book not found in inventory.")
             return
 
-        book_id, title, buy_price, sell_price, stock = book
+        book_id, title, sell_price = book["id"], book["title"], book["sell_price"]
 
-        # Check reserved quantity already in the cart for this book_id
-        reserved = sum(it["quantity"] for it in self.current_order if it["book_id"] == book_id)
-        available = (stock or 0) - reserved
-
-        # Validate stock
-        if available <= 0:
-            messagebox.showwarning("Out of Stock", f"'{title}' is out of stock.")
-            return
-
-        if qty > available:
-            messagebox.showwarning(
-                "Insufficient Stock",
-                f"Only {available} copies of '{title}' left (after considering items already in the cart)."
-            )
+        # Reserve stock in the database so other tills cannot sell the same copies
+        try:
+            self.db.reserve_stock(self.cart_id, book_id, qty)
+        except InsufficientStockError as e:
+            if e.available <= 0:
+                messagebox.showwarning("Out of Stock", f"'{title}' is out of stock.")
+            else:
+                messagebox.showwarning(
+                    "Insufficient Stock",
+                    f"Only {e.available} copies of '{title}' left (after items held in open carts)."
+                )
+            self.find_in_other_branches(title)
             return
 
         total = sell_price * qty
@@ -882,82 +1096,319 @@ class BookStoreAIManager:
         # Update total amount
         total_amount = sum(item["total"] for item in self.current_order)
         self.total_order_label_staff.config(text=f"Total: {total_amount:,} VND")
+        self.refresh_upsell_suggestions()
 
         # Sync cart with Customer tab
         self.sync_customer_cart()
 
+    def find_in_other_branches(self, title):
+        """Hết hàng tại đây: tra chỉ mục gộp xem chi nhánh khác còn sách không (ở job nền)."""
+        registry = BranchRegistry.load()
+        here = os.getenv("BOOKSTORE_BRANCH")
+        if len(registry.codes) < 2 or not here:
+            return
+        if not hasattr(self, "chain"):
+            self.chain = ChainReporter(registry)
+
+        def show(found):
+            found = found[found["branch"] != here]
+            if found.empty:
+                return
+            lines = [f"- {row.name} ({row.branch}): {row.stock} copies, {row.sell_price:,} VND"
+                     for row in found.itertuples(index=False)]
+            messagebox.showinfo("Other branches", f"'{title}' is available at:\n" + "\n".join(lines))
+
+        self.jobs.submit("branch_lookup", lambda ctx: self.chain.where_is(title), key=title, use_cache=False,
+                         replace=True, label="Checking other branches", on_done=show,
+                         on_error=lambda e: logging.error(f"Branch lookup failed: {e}"))
+
+    def show_diagnostics(self):
+        """Panel hiển thị histogram độ trễ, bộ đếm và các câu SQL chậm."""
+        popup = tk.Toplevel(self.root)
+        popup.title("Diagnostics")
+        popup.geometry("900x500")
+
+        text = tk.Text(popup, wrap="none", font=("Courier", 9))
+        text.pack(fill="both", expand=True, padx=5, pady=5)
+
+        def refresh():
+            text.delete(1.0, tk.END)
+            text.insert(tk.END, instrumentation.dump())
+
+        def reset():
+            instrumentation.metrics.reset()
+            refresh()
+
+        def save():
+            path = instrumentation.dump_to_file(os.path.join(os.path.dirname(os.path.abspath(__file__)), "diagnostics.txt"))
+            messagebox.showinfo("Diagnostics", f"Saved to {path}")
+
+        btn_frame = tk.Frame(popup)
+        btn_frame.pack(pady=5)
+        tk.Button(btn_frame, text="🔄 Refresh", command=refresh).pack(side="left", padx=5)
+        tk.Button(btn_frame, text="🧹 Reset", command=reset).pack(side="left", padx=5)
+        tk.Button(btn_frame, text="💾 Save", command=save).pack(side="left", padx=5)
+        refresh()
+
+    def backup_database(self):
+        """Sao lưu online ở JobRunner (snapshot WAL trên kết nối riêng); quầy vẫn bán hàng bình thường trong lúc sao lưu."""
+        if isinstance(self.db, RemoteDatabaseManager):
+            messagebox.showinfo("Backup", "Backups run on the API server (--backup-interval-hours).")
+            return
+
+        def backup(ctx):
+            return BackupManager(ctx.db.db_name).create_backup(progress=ctx.progress)
+
+        self.jobs.submit(
+            "backup", backup, use_cache=False, label="Backing up database",
+            on_done=lambda result: messagebox.showinfo(
+                "Backup", f"Saved {result['path']}\n{result['size_bytes']:,} bytes in {result['seconds']}s"),
+            on_error=lambda e: messagebox.showerror("Backup", f"Backup failed: {e}"))
+
+    def open_maintenance_popup(self):
+        """Trạng thái các task bảo trì (lần chạy trước / kế tiếp, kết quả) và chạy ngay một task."""
+        if self.maintenance_popup is not None and self.maintenance_popup.winfo_exists():
+            self.maintenance_popup.lift()
+            return
+        popup = self.maintenance_popup = tk.Toplevel(self.root)
+        popup.title("Maintenance")
+        popup.geometry("900x320")
+
+        columns = ("name", "schedule", "last_run", "last_status", "last_duration", "next_run", "last_result")
+        tree = ttk.Treeview(popup, columns=columns, show="headings")
+        for col, width in zip(columns, (110, 120, 140, 70, 70, 140, 250)):
+            tree.heading(col, text=col.replace("_", " ").title())
+            tree.column(col, width=width, anchor="e" if col == "last_duration" else "w")
+        tree.pack(fill="both", expand=True, padx=5, pady=5)
+
+        def refresh():
+            tree.delete(*tree.get_children())
+            for row in self.db.get_maintenance_status():
+                status = f"running ({row['running']})" if row["running"] else row["last_status"] or "-"
+                tree.insert("", "end", values=(
+                    row["name"], row["schedule"], row["last_run"] or "never", status,
+                    f"{row['last_duration']:.2f}s" if row["last_duration"] is not None else "",
+                    row["next_run"], row["last_result"] or "",
+                ))
+
+        def run_selected():
+            names = [tree.item(i, "values")[0] for i in tree.selection()]
+            if not names:
+                messagebox.showwarning("Select", "Select the tasks to run now.", parent=popup)
+                return
+            for name in names:
+                self.run_maintenance(name, on_done=lambda result: popup.winfo_exists() and refresh())
+            popup.after(500, refresh)
+
+        controls = tk.Frame(popup)
+        controls.pack(fill="x", padx=5, pady=5)
+        tk.Button(controls, text="▶ Run now", command=run_selected).pack(side="left", padx=5)
+        tk.Button(controls, text="🔄 Refresh", command=refresh).pack(side="left", padx=5)
+        refresh()
+
+    def rebuild_intent_index(self, generation):
+        """Dựng index của router trên kết nối job nền; lần invalidate() mới (key khác) hủy lần dựng cũ."""
+        self.jobs.submit("intent_index", lambda ctx: self.intent_router.build_index(ctx.db), key=generation,
+                         on_done=lambda index: self.intent_router.install_index(index, generation),
+                         replace=True, use_cache=False, label="Indexing catalog")
+
+    def run_maintenance(self, name, on_done=None):
+        if self.maintenance is None:
+            self.db.run_maintenance(name)  # server chạy nền
+            return
+        self.jobs.submit(f"maintenance_{name}", lambda ctx: self.maintenance.run(name), use_cache=False,
+                         label=f"Maintenance: {name}", on_done=on_done,
+                         on_error=lambda e: logging.error(f"Maintenance task {name} failed: {e}"))
+
+    def sweep_reservations(self):
+        """Định kỳ dọn các hold hết hạn (giỏ bị bỏ dở ở bất kỳ quầy nào)."""
+        try:
+            swept = self.db.sweep_expired_reservations()
+            if swept:
+                logging.info("Released %d expired stock reservations", swept)
+        except Exception as e:
+            logging.error(f"Reservation sweep failed: {e}")
+        self.root.after(RESERVATION_SWEEP_MS, self.sweep_reservations)
+
+    def check_stock_alerts(self):
+        self.refresh_stock_alerts()
+        self.root.after(STOCK_ALERT_MS, self.check_stock_alerts)
+
+    def refresh_stock_alerts(self):
+        """Đọc các sự kiện tồn kho mới nếu database đã đổi kể từ lần trước (PRAGMA data_version, rất rẻ)."""
+        try:
+            version = self.db.data_version()
+            if version == self._alert_version:
+                return
+            self._alert_version = version
+            if self._alert_seq is None:
+                status = self.db.get_stock_alert_status()
+                self._alert_seq = status["last_seq"]
+                self.update_stock_badge(status["count"])
+                return
+            events = []
+            while True:
+                batch = self.db.get_stock_events(self._alert_seq)
+                if not batch:
+                    break
+                events.extend(batch)
+                self._alert_seq = batch[-1]["seq"]
+            if events:
+                self.on_stock_events(events)
+        except Exception as e:
+            logging.error(f"Stock alert check failed: {e}")
+
+    def on_stock_events(self, events):
+        self.update_stock_badge(self.db.get_stock_alert_status()["count"])
+        dropped = [e for e in events if e["kind"] in ("low", "out")]
+        if dropped:
+            out = sum(e["kind"] == "out" for e in dropped)
+            self.status_label.config(text=f"⚠ {len(dropped)} title(s) fell below reorder threshold, "
+                                          f"{out} out of stock")
+        if self.restock_popup is not None and self.restock_popup.winfo_exists():
+            self.load_restock_list()
+
+    def update_stock_badge(self, count):
+        self.low_stock_count = count
+        if hasattr(self, "stock_badge"):
+            self.stock_badge.config(text=f"⚠ {count} low stock" if count else "✔ Stock OK",
+                                    bg="#e74c3c" if count else "#27ae60")
+
+    def open_restock_popup(self):
+        """Danh sách sách dưới ngưỡng: nhập hàng một lần bấm, đặt ngưỡng theo sách / thể loại."""
+        if self.restock_popup is not None and self.restock_popup.winfo_exists():
+            self.restock_popup.lift()
+            return
+        popup = self.restock_popup = tk.Toplevel(self.root)
+        popup.title("Low Stock")
+        popup.geometry("800x450")
+
+        columns = ("book_id", "title", "genre", "stock", "threshold", "reorder_qty")
+        self.restock_tree = ttk.Treeview(popup, columns=columns, show="headings")
+        for col, width in zip(columns, (60, 280, 120, 60, 70, 80)):
+            self.restock_tree.heading(col, text=col.replace("_", " ").title())
+            self.restock_tree.column(col, width=width, anchor="w" if col in ("title", "genre") else "e")
+        self.restock_tree.pack(fill="both", expand=True, padx=5, pady=5)
+
+        controls = tk.Frame(popup)
+        controls.pack(fill="x", padx=5, pady=5)
+        tk.Button(controls, text="📦 Restock selected", bg="#27ae60", fg="white",
+                  command=lambda: self.restock(self.restock_tree.selection())).pack(side="left", padx=5)
+        tk.Button(controls, text="📦 Restock all",
+                  command=lambda: self.restock(self.restock_tree.get_children())).pack(side="left", padx=5)
+
+        tk.Label(controls, text="Threshold:").pack(side="left", padx=(20, 2))
+        threshold_entry = tk.Entry(controls, width=5)
+        threshold_entry.pack(side="left")
+        tk.Label(controls, text="Reorder qty:").pack(side="left", padx=(8, 2))
+        qty_entry = tk.Entry(controls, width=5)
+        qty_entry.pack(side="left")
+        scope_box = ttk.Combobox(controls, values=("book", "genre", "default"), width=8, state="readonly")
+        scope_box.set("book")
+        scope_box.pack(side="left", padx=5)
+
+        def set_threshold():
+            scope = scope_box.get()
+            try:
+                threshold = int(threshold_entry.get())
+                reorder_qty = int(qty_entry.get()) if qty_entry.get().strip() else None
+            except ValueError:
+                messagebox.showerror("Error", "Threshold and reorder quantity must be numbers.", parent=popup)
+                return
+            rows = [self.restock_tree.item(i, "values") for i in self.restock_tree.selection()]
+            if scope == "default":
+                keys = [None]
+            else:
+                keys = sorted({row[0] if scope == "book" else row[2] for row in rows})
+            if not keys:
+                messagebox.showwarning("Select", f"Select the rows whose {scope} threshold to set.", parent=popup)
+                return
+            try:
+                for key in keys:
+                    self.db.set_reorder_threshold(scope, key, threshold, reorder_qty)
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to set threshold:\n{e}", parent=popup)
+                return
+            self.refresh_stock_alerts()
+
+        tk.Button(controls, text="Set threshold", command=set_threshold).pack(side="left", padx=5)
+        self.load_restock_list()
+
+    def load_restock_list(self):
+        self.restock_tree.delete(*self.restock_tree.get_children())
+        for row in self.db.get_low_stock():
+            self.restock_tree.insert("", "end", values=(
+                row["book_id"], row["title"], row["genre"], row["stock"], row["threshold"], row["reorder_qty"],
+            ))
+
+    def restock(self, items):
+        rows = [self.restock_tree.item(i, "values") for i in items]
+        if not rows:
+            messagebox.showwarning("Select", "No books selected to restock.", parent=self.restock_popup)
+            return
+        try:
+            count = self.db.restock_books([(int(row[0]), int(row[5])) for row in rows])
+        except Exception as e:
+            messagebox.showerror("Error", f"Restock failed:\n{e}", parent=self.restock_popup)
+            return
+        self.refresh_stock_alerts()
+        self.status_label.config(text=f"Restocked {count} title(s)")
+
+    def update_job_status(self, jobs):
+        """Cập nhật thanh trạng thái theo các job đang chạy (gọi từ UI thread)."""
+        if not jobs:
+            self.status_progress.stop()
+            self.status_progress.config(mode="determinate", value=0)
+            self.status_label.config(text="Ready")
+            self.status_cancel.config(state="disabled")
+            return
+        job = jobs[-1]
+        text = f"{job.label}: {job.message}"
+        if len(jobs) > 1:
+            text += f" (+{len(jobs) - 1} more)"
+        self.status_label.config(text=text)
+        self.status_cancel.config(state="normal")
+        if job.fraction is None:
+            if str(self.status_progress["mode"]) != "indeterminate":
+                self.status_progress.config(mode="indeterminate")
+                self.status_progress.start(15)
+        else:
+            self.status_progress.stop()
+            self.status_progress.config(mode="determinate", value=job.fraction * 100)
+
+    def on_close(self):
+        self.jobs.shutdown()
+        if self.maintenance is not None:
+            self.maintenance.close()
+        try:
+            self.db.release_reservations(self.cart_id)
+        except Exception as e:
+            logging.error(f"Failed to release reservations on exit: {e}")
+        self.root.destroy()
+
     def delete_book(self):
         selected = self.inventory_tree.selection()
         if selected:
             item = self.inventory_tree.item(selected)
             book_id = item['values'][0]
             self.db.delete_book(book_id)
-            self.inventory_df = self.db.get_books()
+            self.intent_router.invalidate()
             self.open_inventory_tab()
             messagebox.showinfo("Success", "The book has been deleted..")
         else:
             messagebox.showerror("Error", "Please select a book.")
 
+    @timed("ui.optimize_inventory")
     def optimize_inventory(self):
-        self.revenue_df = self.db.get_revenue()
-        result = "📊 Inventory Optimization Suggestions:\n\n"
-        inventory = self.db.get_books()
-
-        unsold_books = []  # list of books that have not been sold
-
-        if not self.revenue_df.empty:
-            # Calculate sales per book
-            sales = self.revenue_df.groupby("book_id").agg(
-                {"quantity": "sum", "total_amount": "sum", "profit": "sum"}
-            ).reset_index()
-            sales = sales.merge(inventory, left_on="book_id", right_on="id", how="right")
-
-            for _, row in sales.iterrows():
-                title = row["title"]
-                sold = row["quantity"] if pd.notna(row["quantity"]) else 0
-                stock = row["stock"]
-                buy_price = row["buy_price"]
-                sell_price = row["sell_price"]
-
-                # Profit margin %
-                margin = (sell_price - buy_price) / sell_price * 100 if sell_price > 0 else 0
-
-                # Assume sales data for the last 30 days
-                daily_sales = sold / 30 if sold > 0 else 0
-                days_to_sell = stock / daily_sales if daily_sales > 0 else float("inf")
-
-                if sold == 0:
-                    unsold_books.append(title)
-                    result += f"❌ {title}: No sales → suggest discount to {int(sell_price*0.7)} VND or stop importing.\n"
-                    continue
-
-                if days_to_sell > 90:
-                    new_price = int(sell_price * 0.85)
-                    result += f"⚠️ {title}: Slow selling (stock lasts {days_to_sell:.0f} days) → reduce price to {new_price} VND.\n"
-
-                elif 30 <= days_to_sell <= 90:
-                    result += f"ℹ️ {title}: Average selling (stock lasts {days_to_sell:.0f} days) → keep current price {sell_price} VND.\n"
-
-                elif days_to_sell < 30:
-                    suggest_import = int(daily_sales * 60)  # import for ~2 months demand
-                    total_cost = suggest_import * buy_price
-                    result += f"🔥 {title}: Fast selling (may run out in {days_to_sell:.0f} days) → suggest importing {suggest_import} copies (~{total_cost} VND cost).\n"
-
-                # Profit margin comments
-                if margin < 10:
-                    result += f"   💡 Low profit margin ({margin:.1f}%) → consider raising price or discontinuing.\n"
-                elif margin > 40:
-                    result += f"   💰 High profit margin ({margin:.1f}%) → should promote more.\n"
-
-        else:
-            result += "No sales data available for optimization."
-
-        # List unsold books
-        if unsold_books:
-            result += "\n📕 Unsold books list:\n"
-            for t in unsold_books:
-                result += f" - {t}\n"
+        self.jobs.submit(
+            "optimize_inventory",
+            lambda ctx: optimize_inventory_report(ctx.db, progress=ctx.progress),
+            key=self.db.data_version(), label="Optimize stock",
+            on_done=self.show_optimization_result,
+            on_error=lambda e: messagebox.showerror("Error", f"Optimization failed:\n{e}"),
+        )
 
+    def show_optimization_result(self, result):
         # Show popup
         self.optimization_history.append(result)
         popup = tk.Toplevel(self.root)
@@ -967,18 +1418,82 @@ class BookStoreAIManager:
             pady=10, fill="both", expand=True
         )
 
-    def setup_history_tab(self):
-        self.history_frame = tk.Frame(self.notebook, bg="#f4f6f9")
-        self.notebook.add(self.history_frame, text="History")
+    def open_pricing_simulator(self):
+        """Popup what-if: lợi nhuận/tồn kho dự kiến cho lưới kịch bản giảm giá, tăng giá, nhập hàng."""
+        popup = tk.Toplevel(self.root)
+        popup.title("Pricing What-if")
+        popup.geometry("1000x450")
+
+        controls = tk.Frame(popup)
+        controls.pack(fill="x", padx=5, pady=5)
+        tk.Label(controls, text="Horizon (days):").pack(side="left")
+        horizon_entry = tk.Entry(controls, width=6)
+        horizon_entry.insert(0, "30")
+        horizon_entry.pack(side="left", padx=5)
+        summary = tk.Label(controls, text="", anchor="w")
+
+        columns = ("unsold", "slow", "average", "fast", "import_days", "revenue", "profit",
+                   "profit_change", "restock_cost", "stockouts")
+        tree = ttk.Treeview(popup, columns=columns, show="headings")
+        for col in columns:
+            tree.heading(col, text=col)
+            tree.column(col, width=90, anchor="e")
+        tree.pack(fill="both", expand=True, padx=5, pady=5)
+
+        def show(result):
+            if not tree.winfo_exists():
+                return
+            tree.delete(*tree.get_children())
+            best = result.sort_values("profit_change", ascending=False).head(50)
+            for row in best.itertuples(index=False):
+                tree.insert("", "end", values=(
+                    f"{row.unsold:+.0%}", f"{row.slow:+.0%}", f"{row.average:+.0%}", f"{row.fast:+.0%}",
+                    row.import_days, f"{row.revenue:,}", f"{row.profit:,}", f"{row.profit_change:+,}",
+                    f"{row.restock_cost:,}", row.stockouts,
+                ))
+            summary.config(text=f"{len(result)} scenarios, top 50 by profit change")
+
+        def run():
+            try:
+                horizon = int(horizon_entry.get())
+            except ValueError:
+                messagebox.showerror("Error", "Horizon must be a number of days.", parent=popup)
+                return
+            self.jobs.submit(
+                "pricing_simulation",
+                lambda ctx: ctx.db.simulate_pricing(horizon_days=horizon),
+                key=(self.db.data_version(), horizon), label="What-if simulation", replace=True,
+                on_done=show,
+                on_error=lambda e: messagebox.showerror("Error", f"Simulation failed:\n{e}"),
+            )
+
+        tk.Button(controls, text="▶ Run", command=run).pack(side="left", padx=5)
+        summary.pack(side="left", padx=10)
+        run()
 
+    def setup_history_tab(self):
         # Thanh tìm kiếm
         search_frame = tk.Frame(self.history_frame, bg="#f4f6f9")
         search_frame.pack(fill="x", padx=10, pady=5)
 
-        tk.Label(search_frame, text="Search:", bg="#f4f6f9").pack(side="left")
-        self.history_search_entry = tk.Entry(search_frame, width=30)
+        tk.Label(search_frame, text="Order ID / Date:", bg="#f4f6f9").pack(side="left")
+        self.history_search_entry = tk.Entry(search_frame, width=16)
         self.history_search_entry.pack(side="left", padx=5)
 
+        tk.Label(search_frame, text="From:", bg="#f4f6f9").pack(side="left")
+        self.history_from_entry = tk.Entry(search_frame, width=11)
+        self.history_from_entry.pack(side="left", padx=2)
+        tk.Label(search_frame, text="To:", bg="#f4f6f9").pack(side="left")
+        self.history_to_entry = tk.Entry(search_frame, width=11)
+        self.history_to_entry.pack(side="left", padx=2)
+
+        tk.Label(search_frame, text="Amount:", bg="#f4f6f9").pack(side="left", padx=(8, 0))
+        self.history_min_entry = tk.Entry(search_frame, width=8)
+        self.history_min_entry.pack(side="left", padx=2)
+        tk.Label(search_frame, text="-", bg="#f4f6f9").pack(side="left")
+        self.history_max_entry = tk.Entry(search_frame, width=8)
+        self.history_max_entry.pack(side="left", padx=2)
+
         tk.Button(search_frame, text="🔍 Search", command=self.search_history,
                   bg="#3498db", fg="white").pack(side="left", padx=5)
 
@@ -988,6 +1503,10 @@ class BookStoreAIManager:
         tk.Button(search_frame, text="📤 Export", command=self.export_history,
                   bg="#e67e22", fg="white").pack(side="left", padx=5)
 
+        # Chọn một hoặc nhiều đơn (Ctrl/Shift) để lấy hàng chung một lượt
+        tk.Button(search_frame, text="🧾 Pick list", command=self.show_orders_pick_list,
+                  bg="#8e44ad", fg="white").pack(side="left", padx=5)
+
         # Bảng danh sách đơn hàng
         columns = ("Order ID", "Total Qty", "Total Amount", "Date")
         self.history_tree = ttk.Treeview(self.history_frame, columns=columns, show="headings")
@@ -998,6 +1517,17 @@ class BookStoreAIManager:
 
         self.history_tree.bind("<<TreeviewSelect>>", self.show_order_details)
 
+        # Phân trang keyset: mỗi lần tải thêm HISTORY_PAGE_SIZE đơn
+        more_frame = tk.Frame(self.history_frame, bg="#f4f6f9")
+        more_frame.pack(fill="x", padx=10)
+        self.history_count_label = tk.Label(more_frame, text="", bg="#f4f6f9")
+        self.history_count_label.pack(side="left")
+        self.history_more_button = tk.Button(more_frame, text="⬇ Load more", command=self.load_more_history,
+                                             state="disabled")
+        self.history_more_button.pack(side="right")
+        self.history_filters = {}
+        self.history_last_key = None
+
         # Bảng chi tiết đơn hàng
         detail_frame = tk.LabelFrame(self.history_frame, text="Order Details", bg="#f4f6f9")
         detail_frame.pack(fill="both", expand=True, padx=10, pady=5)
@@ -1009,32 +1539,25 @@ class BookStoreAIManager:
             self.history_detail_tree.column(col, anchor="center", width=120)
         self.history_detail_tree.pack(fill="both", expand=True, padx=5, pady=5)
 
+    @timed("ui.load_order_history")
     def load_order_history(self):
-        import sqlite3, os
-        db_path = os.path.join(os.path.dirname(__file__), "bookstore.db")
-
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-
-        cursor.execute("""
-                       SELECT o.id AS order_id,
-                              SUM(oi.quantity) AS total_qty,
-                              SUM(oi.total) AS total_amount,
-                              o.created_at
-                       FROM orders o
-                                JOIN order_items oi ON o.id = oi.order_id
-                       GROUP BY o.id, o.created_at
-                       ORDER BY o.created_at DESC
-                       """)
-        rows = cursor.fetchall()
-        conn.close()
-
-        # Clear bảng cũ
-        for r in self.history_tree.get_children():
-            self.history_tree.delete(r)
-
-        if not rows:
-            self.history_tree.insert("", "end", values=("Không có đơn hàng", "", "", ""))
+        self.show_history_page({})
+
+    def show_history_page(self, filters, append=False):
+        """Hiển thị một trang lịch sử đơn; append=True thì nối tiếp sau trang hiện tại."""
+        if not append:
+            self.history_filters = filters
+            self.history_last_key = None
+            for r in self.history_tree.get_children():
+                self.history_tree.delete(r)
+
+        rows = self.db.search_orders(after=self.history_last_key, limit=HISTORY_PAGE_SIZE, **filters)
+
+        if not rows and not append:
+            message = "Không tìm thấy đơn hàng" if filters else "Không có đơn hàng"
+            self.history_tree.insert("", "end", values=(message, "", "", ""))
+            self.history_count_label.config(text="")
+            self.history_more_button.config(state="disabled")
             return
 
         for order_id, qty, amount, date in rows:
@@ -1043,46 +1566,23 @@ class BookStoreAIManager:
                 "end",
                 values=(order_id, qty, f"{(amount or 0):,} VND", date)
             )
+        if rows:
+            self.history_last_key = (rows[-1][3], rows[-1][0])
 
+        self.history_count_label.config(text=f"Showing {len(self.history_tree.get_children())} orders")
+        self.history_more_button.config(state="normal" if len(rows) == HISTORY_PAGE_SIZE else "disabled")
+
+    def load_more_history(self):
+        self.show_history_page(self.history_filters, append=True)
+
+    @timed("ui.show_order_details")
     def show_order_details(self, event=None):
         sel = self.history_tree.selection()
         if not sel:
             return
         order_id = self.history_tree.item(sel[0])["values"][0]
 
-        import sqlite3, os
-        db_path = os.path.join(os.path.dirname(__file__), "bookstore.db")
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-
-        cursor.execute("""
-                       SELECT b.title,
-                              oi.quantity,
-                              CASE WHEN oi.unit_price IS NULL OR oi.unit_price = 0
-                                       THEN b.sell_price ELSE oi.unit_price END as unit_price,
-                              (oi.quantity * CASE WHEN oi.unit_price IS NULL OR oi.unit_price = 0
-                                                      THEN b.sell_price ELSE oi.unit_price END) as total
-                       FROM order_items oi
-                                JOIN books b ON oi.book_id = b.id
-                       WHERE oi.order_id = ?
-                       """, (order_id,))
-        rows = cursor.fetchall()
-        conn.close()
-
-        for r in self.history_detail_tree.get_children():
-            self.history_detail_tree.delete(r)
-
-        if not rows:
-            self.history_detail_tree.insert("", "end", values=("Không có chi tiết", "", "", ""))
-            return
-
-        for title, qty, unit_price, total in rows:
-            self.history_detail_tree.insert(
-                "",
-                "end",
-                values=(title, qty, unit_price, total)
-            )
-
+        rows = self.db.get_order_details(order_id)
 
         for r in self.history_detail_tree.get_children():
             self.history_detail_tree.delete(r)
@@ -1098,69 +1598,80 @@ class BookStoreAIManager:
                 values=(title, qty, unit_price, total)
             )
 
+    @timed("ui.search_history")
     def search_history(self):
         keyword = self.history_search_entry.get().strip()
-        if not keyword:
-            self.load_order_history()
+        filters = {}
+        if keyword:
+            # "2024-05" → lọc theo ngày, còn lại là tiền tố mã đơn
+            if DATE_PREFIX.match(keyword):
+                filters["date_prefix"] = keyword
+            else:
+                filters["order_prefix"] = keyword
+
+        try:
+            for key, entry in (("start_date", self.history_from_entry), ("end_date", self.history_to_entry)):
+                value = entry.get().strip()
+                if value:
+                    datetime.strptime(value, "%Y-%m-%d")
+                    filters[key] = value
+            for key, entry in (("min_amount", self.history_min_entry), ("max_amount", self.history_max_entry)):
+                value = entry.get().strip().replace(",", "")
+                if value:
+                    filters[key] = int(value)
+        except ValueError:
+            messagebox.showerror("Error", "Dates must be YYYY-MM-DD and amounts must be numbers.")
             return
 
-        import sqlite3, os
-        db_path = os.path.join(os.path.dirname(__file__), "bookstore.db")
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-
-        cursor.execute("""
-                       SELECT o.id AS order_id,
-                              SUM(oi.quantity) AS total_qty,
-                              SUM(oi.total) AS total_amount,
-                              o.created_at
-                       FROM orders o
-                                JOIN order_items oi ON o.id = oi.order_id
-                       WHERE o.id LIKE ? OR o.created_at LIKE ?
-                       GROUP BY o.id, o.created_at
-                       ORDER BY o.created_at DESC
-                       """, (f"%{keyword}%", f"%{keyword}%"))
-        rows = cursor.fetchall()
-        conn.close()
+        self.show_history_page(filters)
 
-        # Xóa dữ liệu cũ
-        for r in self.history_tree.get_children():
-            self.history_tree.delete(r)
+    @timed("ui.pick_list")
+    def show_orders_pick_list(self):
+        order_ids = [str(self.history_tree.item(i, "values")[0]) for i in self.history_tree.selection()]
+        if not order_ids:
+            messagebox.showwarning("Select", "Select one or more orders first.")
+            return
+        self.open_pick_list(lambda ctx: ctx.db.plan_pick_route(order_ids), key=tuple(order_ids))
 
-        if not rows:
-            self.history_tree.insert("", "end", values=("Không tìm thấy đơn hàng", "", "", ""))
+    def show_cart_pick_list(self):
+        if not self.current_order:
+            messagebox.showwarning("Empty", "No items in the order.")
             return
+        items = [{"book_id": it["book_id"], "quantity": it["quantity"]} for it in self.current_order]
+        self.open_pick_list(lambda ctx: ctx.db.plan_cart_pick_route(items),
+                            key=tuple((it["book_id"], it["quantity"]) for it in items))
+
+    def open_pick_list(self, plan_fn, key):
+        """Lộ trình lấy hàng (tính ở job nền) trong popup có thể lưu ra file để in."""
+        def show(plan):
+            text = format_pick_list(plan)
+            popup = tk.Toplevel(self.root)
+            popup.title("Pick List")
+            popup.geometry("640x520")
+            body = tk.Text(popup, wrap="none", font=("Courier", 10))
+            body.insert("1.0", text)
+            body.config(state="disabled")
+            body.pack(fill="both", expand=True, padx=5, pady=5)
+
+            def save():
+                from tkinter import filedialog
+                file_path = filedialog.asksaveasfilename(
+                    parent=popup, defaultextension=".txt",
+                    filetypes=[("Text files", "*.txt"), ("All files", "*.*")]
+                )
+                if file_path:
+                    with open(file_path, "w", encoding="utf-8") as f:
+                        f.write(text + "\n")
 
-        for order_id, qty, amount, date in rows:
-            self.history_tree.insert(
-                "",
-                "end",
-                values=(order_id, qty, f"{(amount or 0):,} VND", date)
-            )
+            tk.Button(popup, text="💾 Save for printing", command=save).pack(pady=5)
+
+        self.jobs.submit("pick_route", plan_fn, key=(key, self.db.data_version()), replace=True,
+                         label="Planning pick route", on_done=show,
+                         on_error=lambda e: messagebox.showerror("Error", f"Pick route failed:\n{e}"))
 
+    @timed("ui.export_history")
     def export_history(self):
-        import sqlite3, os, pandas as pd
-        from tkinter import filedialog, messagebox
-
-        db_path = os.path.join(os.path.dirname(__file__), "bookstore.db")
-        conn = sqlite3.connect(db_path)
-
-        query = """
-                SELECT o.id AS order_id,
-                       SUM(oi.quantity) AS total_qty,
-                       SUM(oi.total) AS total_amount,
-                       o.created_at
-                FROM orders o
-                         JOIN order_items oi ON o.id = oi.order_id
-                GROUP BY o.id, o.created_at
-                ORDER BY o.created_at DESC \
-                """
-        df = pd.read_sql(query, conn)
-        conn.close()
-
-        if df.empty:
-            messagebox.showinfo("Export", "No data to export.")
-            return
+        from tkinter import filedialog
 
         # Chọn nơi lưu file
         file_path = filedialog.asksaveasfilename(
@@ -1170,9 +1681,38 @@ class BookStoreAIManager:
         if not file_path:
             return
 
+        def done(rows):
+            if not rows:
+                messagebox.showinfo("Export", "No data to export.")
+            else:
+                messagebox.showinfo("Export", f"Data export successful!\n{file_path}")
+
+        self.jobs.submit(
+            "export_history", self.export_history_job, file_path,
+            key=(file_path, self.db.data_version()), use_cache=False, label="Export history",
+            on_done=done,
+            on_error=lambda e: messagebox.showerror("Export", f"Export failed:\n{e}"),
+        )
+
+    @staticmethod
+    def export_history_job(ctx, file_path, page_size=5000):
+        """Đọc lịch sử theo từng trang keyset (để báo tiến độ/hủy được) rồi ghi Excel."""
+        rows, after = [], None
+        while True:
+            page = ctx.db.search_orders(after=after, limit=page_size)
+            rows.extend(page)
+            ctx.progress(len(rows), None, f"{len(rows):,} orders read")
+            if len(page) < page_size:
+                break
+            after = (page[-1][3], page[-1][0])
+        if not rows:
+            return 0
+
+        df = pd.DataFrame(rows, columns=["order_id", "total_qty", "total_amount", "created_at"])
+        ctx.progress(1, 2, "writing Excel file")
         # Xuất ra Excel
         df.to_excel(file_path, index=False)
-        messagebox.showinfo("Export", f"Data export successful!\n{file_path}")
+        return len(rows)
 
 if __name__ == "__main__":
     root = tk.Tk()
@@ -0,0 +1,441 @@
+"""
+Lịch bảo trì chạy ngay trong app / api_server: ANALYZE, PRAGMA optimize, VACUUM, checkpoint WAL và
+tính trước các bảng tổng hợp (cube doanh số, ma trận gợi ý, bản dịch danh mục) ngoài giờ cao điểm.
+
+    scheduler = MaintenanceScheduler("bookstore.db")   # DEFAULT_TASKS
+    scheduler.start()                                  # thread nền, kiểm tra mỗi POLL_SECONDS
+    scheduler.touch()                                  # báo có thao tác: task idle=True chờ app rảnh
+    scheduler.status()                                 # lần chạy trước / kế tiếp của từng task
+    python maintenance.py --db bookstore.db status
+    python maintenance.py --db bookstore.db run analyze vacuum
+    python maintenance.py --db bookstore.db loop       # chạy như service riêng (cron không cần)
+
+- Lịch: "every 15m" / "every 6h" / "every 1d", "daily 03:00", "weekly sun 03:30" (giờ địa phương).
+  Mỗi lần tính lịch kế tiếp cộng thêm jitter ngẫu nhiên để các quầy / tiến trình không chạy cùng lúc.
+- Trạng thái nằm trong bảng maintenance_tasks của chính database: lần chạy trước, kết quả, lỗi,
+  lần chạy kế tiếp. Khởi động lại app không làm task chạy lại từ đầu.
+- Nhiều tiến trình cùng mở một database (các quầy, api_server) dùng chung lịch: task được giành bằng
+  một UPDATE có điều kiện trên hàng của nó (lease có hạn), nên mỗi lần đến hạn chỉ một tiến trình chạy.
+  Tiến trình chết giữa chừng thì lease hết hạn sau Task.timeout và tiến trình khác chạy thay.
+- "Rảnh" tính trên mọi tiến trình: thao tác gần nhất của từng tiến trình được ghi vào maintenance_activity
+  (thread nền ghi, tối đa mỗi POLL_SECONDS), cộng với đơn hàng mới nhất; cron / api_server không có người
+  dùng cũng không VACUUM khi quầy đang bán.
+- Task chạy trên kết nối DatabaseManager riêng, mở và đóng cho mỗi lần chạy.
+"""
+import argparse
+import logging
+import os
+import random
+import re
+import socket
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from instrumentation import metrics
+from sync_engine import prune_journal
+
+POLL_SECONDS = 30
+IDLE_SECONDS = 300  # task idle=True chỉ chạy khi không có thao tác trong khoảng này
+VACUUM_MIN_FREE = 0.10  # chỉ VACUUM khi trang trống chiếm ít nhất 10% file
+STATUS_COLUMNS = ["name", "schedule", "last_run", "last_status", "last_duration", "last_result", "next_run",
+                  "running", "runs", "failures"]
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS maintenance_tasks (
+        name TEXT PRIMARY KEY,
+        schedule TEXT NOT NULL,
+        next_run REAL NOT NULL,
+        last_run REAL,
+        last_status TEXT,
+        last_duration REAL,
+        last_result TEXT,
+        runs INTEGER NOT NULL DEFAULT 0,
+        failures INTEGER NOT NULL DEFAULT 0,
+        lease_owner TEXT,
+        lease_until REAL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS maintenance_activity (
+        owner TEXT PRIMARY KEY,
+        last_activity REAL NOT NULL
+    )
+    """,
+]
+
+_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+_DAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+_EVERY = re.compile(r"^every\s+(\d+)\s*([smhd])$")
+_DAILY = re.compile(r"^daily\s+(\d{1,2}):(\d{2})$")
+_WEEKLY = re.compile(r"^weekly\s+(mon|tue|wed|thu|fri|sat|sun)\s+(\d{1,2}):(\d{2})$")
+
+
+class Schedule(namedtuple("Schedule", "spec interval at weekday")):
+    """interval (giây) cho "every", hoặc giờ (at) và thứ (weekday, None = mỗi ngày) cho lịch theo đồng hồ."""
+    __slots__ = ()
+
+    def next_after(self, ts):
+        if self.interval:
+            return ts + self.interval
+        moment = datetime.fromtimestamp(ts)
+        candidate = moment.replace(hour=self.at[0], minute=self.at[1], second=0, microsecond=0)
+        while candidate <= moment or (self.weekday is not None and candidate.weekday() != self.weekday):
+            candidate += timedelta(days=1)
+        return candidate.timestamp()
+
+    def period(self):
+        """Khoảng cách gần đúng giữa hai lần chạy (giây), dùng để tính jitter mặc định."""
+        return self.interval or (7 * 86400 if self.weekday is not None else 86400)
+
+
+def parse_schedule(spec):
+    text = spec.strip().lower()
+    match = _EVERY.match(text)
+    if match:
+        interval = int(match.group(1)) * _UNITS[match.group(2)]
+        if interval <= 0:
+            raise ValueError(f"Invalid schedule: {spec}")
+        return Schedule(spec, interval, None, None)
+    match = _DAILY.match(text)
+    if match:
+        return Schedule(spec, None, _clock(spec, *match.groups()), None)
+    match = _WEEKLY.match(text)
+    if match:
+        return Schedule(spec, None, _clock(spec, *match.groups()[1:]), _DAYS.index(match.group(1)))
+    raise ValueError(f"Invalid schedule: {spec} (use 'every 15m', 'daily 03:00' or 'weekly sun 03:30')")
+
+
+def _clock(spec, hour, minute):
+    hour, minute = int(hour), int(minute)
+    if hour > 23 or minute > 59:
+        raise ValueError(f"Invalid schedule: {spec}")
+    return hour, minute
+
+
+class Task:
+    """
+    fn(db) nhận một DatabaseManager mở riêng cho lần chạy và trả về chuỗi / số mô tả kết quả.
+    idle: chỉ chạy khi app rảnh. jitter (giây): mặc định 10% chu kỳ, tối đa 15 phút.
+    timeout: hạn lease; quá hạn mà chưa xong thì tiến trình khác được phép chạy lại.
+    """
+
+    def __init__(self, name, schedule, fn, idle=False, jitter=None, timeout=1800):
+        self.name = name
+        self.schedule = parse_schedule(schedule)
+        self.fn = fn
+        self.idle = idle
+        self.jitter = min(self.schedule.period() * 0.1, 900) if jitter is None else jitter
+        self.timeout = timeout
+
+    def next_run(self, after):
+        return self.schedule.next_after(after) + random.uniform(0, self.jitter)
+
+
+#Default tasks
+def checkpoint_wal(db):
+    busy, log_pages, checkpointed = db.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+    if log_pages < 0:
+        return "not in WAL mode"
+    return f"{checkpointed}/{log_pages} pages" + (" (busy, readers open)" if busy else "")
+
+
+def optimize(db):
+    db.conn.execute("PRAGMA optimize")
+    return "ok"
+
+
+def analyze(db):
+    db.conn.execute("ANALYZE")
+    return f"{db.conn.execute('SELECT COUNT(*) FROM sqlite_stat1').fetchone()[0]} index stats"
+
+
+def vacuum(db, min_free=VACUUM_MIN_FREE):
+    """VACUUM chặn mọi lệnh ghi khi đang chạy: bỏ qua nếu file không có nhiều trang trống."""
+    pages = db.conn.execute("PRAGMA page_count").fetchone()[0]
+    free = db.conn.execute("PRAGMA freelist_count").fetchone()[0]
+    if not pages or free / pages < min_free:
+        return f"skipped, {free}/{pages} pages free"
+    db.conn.execute("VACUUM")
+    return f"reclaimed {free} of {pages} pages"
+
+
+def refresh_sales_cube(db):
+    db.sales_cube().refresh()
+    return f"watermark {db.sales_cube().watermark}"
+
+
+def refresh_recommender(db):
+    db.recommender().refresh()
+    return f"watermark {db.recommender().watermark}"
+
+
+def translate_catalog(db):
+    return f"translated {db.translate_catalog()} books"
+
+
+def prune_stock_events(db):
+    return f"pruned {db.stock_alerts().prune_events()} events"
+
+
+def prune_change_journal(db):
+    """change_journal của sync_engine: xoá các thay đổi mọi quầy / trung tâm đã xác nhận."""
+    with db.conn:
+        return f"pruned {prune_journal(db.conn)} journal rows"
+
+
+DEFAULT_TASKS = [
+    Task("wal_checkpoint", "every 15m", checkpoint_wal, jitter=60),
+    Task("optimize", "every 6h", optimize),
+    Task("sales_cube", "every 1h", refresh_sales_cube, idle=True),
+    Task("recommender", "every 1h", refresh_recommender, idle=True),
+    Task("translations", "every 10m", translate_catalog),
+    Task("stock_events", "daily 02:00", prune_stock_events),
+    Task("change_journal", "daily 02:15", prune_change_journal),
+    Task("analyze", "daily 03:00", analyze, idle=True),
+    Task("vacuum", "weekly sun 03:30", vacuum, idle=True, timeout=4 * 3600),
+]
+
+
+class MaintenanceScheduler:
+    def __init__(self, db_name="bookstore.db", tasks=None, idle_seconds=IDLE_SECONDS, poll_seconds=POLL_SECONDS):
+        self.db_name = db_name
+        self.tasks = {task.name: task for task in (DEFAULT_TASKS if tasks is None else tasks)}
+        self.idle_seconds = idle_seconds
+        self.poll_seconds = poll_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{id(self):x}"
+        self._last_activity = 0.0  # chưa có thao tác nào: coi như rảnh
+        self._published_activity = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()  # kết nối trạng thái dùng chung giữa thread nền và UI
+        self.conn = sqlite3.connect(db_name, timeout=10, check_same_thread=False)
+        with self.conn:
+            for statement in SCHEMA:
+                self.conn.execute(statement)
+        self._register()
+
+    def _register(self):
+        """Thêm hàng cho task mới; đổi lịch thì tính lại lần chạy kế tiếp."""
+        now = time.time()
+        with self._lock, self.conn:
+            stored = dict(self.conn.execute("SELECT name, schedule FROM maintenance_tasks").fetchall())
+            for task in self.tasks.values():
+                if stored.get(task.name) == task.schedule.spec:
+                    continue
+                # Task "every" chưa chạy lần nào thì đến hạn ngay (sau jitter); lịch theo giờ chờ tới giờ
+                first = now + random.uniform(0, task.jitter) if task.schedule.interval else task.next_run(now)
+                self.conn.execute(
+                    "INSERT INTO maintenance_tasks (name, schedule, next_run) VALUES (?, ?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET schedule = excluded.schedule, next_run = excluded.next_run",
+                    (task.name, task.schedule.spec, first),
+                )
+
+    # Idle
+    def touch(self):
+        """Ghi nhận có thao tác của người dùng / request (rất rẻ, gọi thoải mái; thread nền ghi vào database)."""
+        self._last_activity = time.time()
+
+    def publish_activity(self):
+        """Ghi thao tác gần nhất của tiến trình này cho các tiến trình khác; xoá hàng của tiến trình đã tắt."""
+        last = self._last_activity
+        if last <= self._published_activity:
+            return
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO maintenance_activity (owner, last_activity) VALUES (?, ?) "
+                "ON CONFLICT(owner) DO UPDATE SET last_activity = excluded.last_activity", (self.owner, last)
+            )
+            self.conn.execute("DELETE FROM maintenance_activity WHERE last_activity < ?", (last - 86400,))
+        self._published_activity = last
+
+    def last_activity(self):
+        """Thao tác gần nhất (epoch) trên mọi tiến trình: touch() của từng tiến trình và đơn hàng mới nhất."""
+        with self._lock:
+            shared = self.conn.execute("SELECT MAX(last_activity) FROM maintenance_activity").fetchone()[0]
+            try:
+                newest = self.conn.execute("SELECT MAX(created_at) FROM orders").fetchone()[0]
+            except sqlite3.OperationalError:
+                newest = None
+        latest = max(self._last_activity, shared or 0.0)
+        if newest:
+            try:
+                latest = max(latest, datetime.strptime(newest[:19], "%Y-%m-%d %H:%M:%S").timestamp())
+            except ValueError:
+                pass
+        return latest
+
+    def is_idle(self):
+        if time.time() - self._last_activity < self.idle_seconds:
+            return False
+        return time.time() - self.last_activity() >= self.idle_seconds
+
+    # Running
+    def _claim(self, name, now, timeout, force=False):
+        """Giành lease của task; False nếu tiến trình khác đang chạy (hoặc vừa chạy xong và dời lịch)."""
+        due = "" if force else "AND next_run <= ? "
+        params = (self.owner, now + timeout, name) + (() if force else (now,)) + (now,)
+        with self._lock, self.conn:
+            return self.conn.execute(
+                f"UPDATE maintenance_tasks SET lease_owner = ?, lease_until = ? WHERE name = ? {due}"
+                f"AND (lease_until IS NULL OR lease_until < ?)", params
+            ).rowcount == 1
+
+    def _open_db(self):
+        from database_manager import DatabaseManager
+        return DatabaseManager(self.db_name)
+
+    def run(self, name, force=True):
+        """Chạy một task ngay (bỏ qua lịch nếu force). Trả về hàng trạng thái, None nếu không giành được lease."""
+        task = self.tasks.get(name)
+        if task is None:
+            raise ValueError(f"Unknown maintenance task: {name}")
+        started = time.time()
+        if not self._claim(name, started, task.timeout, force):
+            return None
+        t0 = time.perf_counter()
+        try:
+            db = self._open_db()
+            try:
+                result, status = task.fn(db), "ok"
+            finally:
+                db.close()
+        except Exception as e:
+            logging.error(f"Maintenance task {name} failed: {e}")
+            result, status = str(e), "error"
+        duration = time.perf_counter() - t0
+        metrics.record(f"maintenance.{name}", duration * 1000)
+        with self._lock, self.conn:
+            self.conn.execute("""
+                UPDATE maintenance_tasks
+                SET last_run = ?, last_status = ?, last_duration = ?, last_result = ?, next_run = ?,
+                    runs = runs + 1, failures = failures + ?, lease_owner = NULL, lease_until = NULL
+                WHERE name = ? AND lease_owner = ?
+            """, (started, status, round(duration, 3), None if result is None else str(result),
+                  task.next_run(time.time()), status == "error", name, self.owner))
+        logging.info(f"Maintenance task {name}: {status} in {duration:.2f}s ({result})")
+        return self.task_status(name)
+
+    def due(self, now=None):
+        """Tên các task đã đến hạn, theo thứ tự đến hạn (task idle bị bỏ qua khi app đang bận)."""
+        now = time.time() if now is None else now
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT name FROM maintenance_tasks WHERE next_run <= ? AND (lease_until IS NULL OR lease_until < ?) "
+                "ORDER BY next_run", (now, now)
+            ).fetchall()
+        idle = self.is_idle()
+        return [name for name, in rows if name in self.tasks and (idle or not self.tasks[name].idle)]
+
+    def run_pending(self):
+        """Chạy lần lượt các task đến hạn; trả về số task đã chạy."""
+        self.publish_activity()
+        ran = 0
+        for name in self.due():
+            if self._stop.is_set():
+                break
+            if self.tasks[name].idle and not self.is_idle():
+                continue  # có thao tác trong lúc chạy task trước
+            if self.run(name, force=False) is not None:
+                ran += 1
+        return ran
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+
+        def loop():
+            while not self._stop.wait(self.poll_seconds):
+                try:
+                    self.run_pending()
+                except Exception as e:
+                    logging.error(f"Maintenance scheduler failed: {e}")
+
+        self._thread = threading.Thread(target=loop, name="maintenance", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        """Dừng thread nền; task đang chạy được chạy nốt (chờ tối đa timeout giây)."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def close(self):
+        self.stop()
+        self.conn.close()
+
+    # Status
+    def status(self):
+        return read_status(self.conn, self._lock)
+
+    def task_status(self, name):
+        return next((row for row in self.status() if row["name"] == name), None)
+
+
+def read_status(conn, lock=None):
+    """Trạng thái từng task (list dict STATUS_COLUMNS, thời gian dạng "YYYY-MM-DD HH:MM:SS"); [] nếu chưa có bảng."""
+    now = time.time()
+    try:
+        if lock is not None:
+            with lock:
+                rows = conn.execute(_STATUS_QUERY).fetchall()
+        else:
+            rows = conn.execute(_STATUS_QUERY).fetchall()
+    except sqlite3.OperationalError:
+        return []
+    result = []
+    for name, schedule, last_run, status, duration, last_result, next_run, owner, until, runs, failures in rows:
+        result.append(dict(zip(STATUS_COLUMNS, (
+            name, schedule, _format_time(last_run), status, duration, last_result, _format_time(next_run),
+            owner if until and until >= now else None, runs, failures,
+        ))))
+    return result
+
+
+_STATUS_QUERY = """
+    SELECT name, schedule, last_run, last_status, last_duration, last_result, next_run,
+           lease_owner, lease_until, runs, failures
+    FROM maintenance_tasks ORDER BY next_run
+"""
+
+
+def _format_time(ts):
+    return datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S") if ts is not None else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Database maintenance scheduler")
+    parser.add_argument("--db", default="bookstore.db")
+    parser.add_argument("command", choices=["status", "run", "loop"])
+    parser.add_argument("tasks", nargs="*", help="tasks to run now (run); default: the ones that are due")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    scheduler = MaintenanceScheduler(args.db)
+    try:
+        if args.command == "run":
+            for name in args.tasks or scheduler.due():
+                if scheduler.run(name, force=bool(args.tasks)) is None:
+                    print(f"{name}: claimed by another process")
+        elif args.command == "loop":
+            try:
+                while True:
+                    scheduler.run_pending()
+                    time.sleep(scheduler.poll_seconds)
+            except KeyboardInterrupt:
+                pass
+        for row in scheduler.status():
+            running = f" [running: {row['running']}]" if row["running"] else ""
+            print(f"{row['name']:<15} {row['schedule']:<17} last {row['last_run'] or 'never':<19} "
+                  f"{row['last_status'] or '':<5} next {row['next_run']}  {row['last_result'] or ''}{running}")
+    finally:
+        scheduler.close()
+
+
+if __name__ == "__main__":
+    main()
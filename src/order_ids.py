@@ -0,0 +1,225 @@
+"""
+Mã đơn hàng tăng theo thời gian, kiểu Snowflake: 13 ký tự base32 Crockford, ví dụ "0F4Q2ZK8X01G7".
+
+    new_order_id()                  # mã mới cho quầy này
+    order_id_time("0F4Q2ZK8X01G7")  # datetime lúc tạo đơn
+    python order_ids.py --db bookstore.db migrate      # đổi mã cũ (8 ký tự hex) sang dạng mới
+    python order_ids.py --db bookstore.db lookup 3f2a9c1d
+
+- 64 bit = 42 bit mili giây từ EPOCH | 10 bit mã quầy | 12 bit số thứ tự trong cùng mili giây.
+  Chuỗi có độ dài cố định nên so sánh chuỗi = so sánh thời gian: đơn mới luôn được chèn vào cuối
+  index khoá chính.
+- Mã quầy (1..1023) lấy từ BOOKSTORE_TERMINAL_ID, mặc định băm từ hostname; mã 0 dành cho đơn đã
+  chuyển đổi. Hai quầy khác mã quầy không bao giờ trùng mã đơn, kể cả khi bán offline.
+- Base32 Crockford không có I, L, O, U nên dễ đọc lại từ hoá đơn; normalize_order_id sửa lỗi gõ
+  (chữ thường, dấu gạch, O -> 0, I/L -> 1).
+"""
+import argparse
+import os
+import re
+import socket
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import datetime
+
+ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+EPOCH_MS = 946_684_800_000  # 2000-01-01 UTC: đủ chỗ cho đơn cũ, 42 bit dùng tới năm 2139
+TERMINAL_BITS = 10
+SEQUENCE_BITS = 12
+MAX_TERMINAL = (1 << TERMINAL_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+ID_LENGTH = 13
+MIGRATED_TERMINAL = 0
+
+_ID = re.compile(f"^[{ALPHABET}]{{{ID_LENGTH}}}$")
+_DECODE = {c: i for i, c in enumerate(ALPHABET)}
+
+MAP_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS order_id_map (
+        old_id TEXT PRIMARY KEY,
+        new_id TEXT NOT NULL
+    ) WITHOUT ROWID
+"""
+
+
+_PAIRS = [a + b for a in ALPHABET for b in ALPHABET]  # 10 bit -> 2 ký tự
+
+
+def encode(value):
+    chars = [ALPHABET[(value >> 60) & 31]]
+    for shift in range(50, -10, -10):
+        chars.append(_PAIRS[(value >> shift) & 1023])
+    return "".join(chars)
+
+
+def decode(order_id):
+    value = 0
+    for char in order_id:
+        value = value * 32 + _DECODE[char]
+    return value
+
+
+def is_order_id(text):
+    return bool(_ID.match(text or ""))
+
+
+def normalize_order_id(text):
+    """Chuẩn hoá mã gõ tay từ hoá đơn; chuỗi không phải mã dạng mới được giữ nguyên."""
+    cleaned = re.sub(r"[\s-]", "", text or "").upper().translate(str.maketrans("OIL", "011"))
+    return cleaned if all(c in _DECODE for c in cleaned) and len(cleaned) <= ID_LENGTH else text
+
+
+def split_order_id(order_id):
+    """-> (mili giây Unix, mã quầy, số thứ tự)."""
+    value = decode(order_id)
+    sequence = value & MAX_SEQUENCE
+    terminal = (value >> SEQUENCE_BITS) & MAX_TERMINAL
+    return (value >> (SEQUENCE_BITS + TERMINAL_BITS)) + EPOCH_MS, terminal, sequence
+
+
+def order_id_time(order_id):
+    return datetime.fromtimestamp(split_order_id(order_id)[0] / 1000)
+
+
+def default_terminal_id():
+    configured = os.getenv("BOOKSTORE_TERMINAL_ID")
+    if configured:
+        terminal = int(configured)
+        if not 1 <= terminal <= MAX_TERMINAL:
+            raise ValueError(f"BOOKSTORE_TERMINAL_ID must be between 1 and {MAX_TERMINAL}")
+        return terminal
+    return zlib.crc32(socket.gethostname().encode("utf-8")) % MAX_TERMINAL + 1
+
+
+class OrderIdGenerator:
+    """Sinh mã tăng dần (thread-safe); đồng hồ lùi hoặc hết số thứ tự thì mượn mili giây kế tiếp."""
+
+    def __init__(self, terminal_id=None, clock=None):
+        self.terminal_id = default_terminal_id() if terminal_id is None else terminal_id
+        self.clock = clock or (lambda: int(time.time() * 1000))
+        self._last_ms = 0
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def resume_after(self, order_id):
+        """Tiếp tục sau một mã đã cấp (dùng khi chuyển đổi dở dang được chạy lại)."""
+        self._last_ms, _, self._sequence = split_order_id(order_id)
+
+    def next_id(self, at_ms=None):
+        with self._lock:
+            now = self.clock() if at_ms is None else at_ms
+            if now > self._last_ms:
+                self._last_ms, self._sequence = now, 0
+            elif self._sequence < MAX_SEQUENCE:
+                self._sequence += 1
+            else:
+                self._last_ms, self._sequence = self._last_ms + 1, 0
+            value = (((self._last_ms - EPOCH_MS) << TERMINAL_BITS | self.terminal_id) << SEQUENCE_BITS) | self._sequence
+            return encode(value)
+
+
+_generator = None
+
+
+def new_order_id():
+    global _generator
+    if _generator is None:
+        _generator = OrderIdGenerator()
+    return _generator.next_id()
+
+
+def migrate_order_ids(conn, schemas=("main",), batch_size=2000):
+    """
+    Đổi mã đơn dạng cũ sang dạng mới theo thứ tự created_at, từng batch một transaction (chạy lại là
+    tiếp tục). schemas theo thứ tự cũ -> mới ("archive", "main") và dùng chung một bộ sinh mã để
+    không trùng nhau. Mã cũ được giữ trong order_id_map để tra cứu hoá đơn đã in.
+    Trả về số đơn đã đổi.
+    """
+    generator = OrderIdGenerator(MIGRATED_TERMINAL)
+    resumed = []
+    for schema in schemas:
+        conn.execute(MAP_SCHEMA.replace("order_id_map", f"{schema}.order_id_map"))
+        resumed.append(conn.execute(f"SELECT MAX(new_id) FROM {schema}.order_id_map").fetchone()[0] or "")
+    if max(resumed):
+        generator.resume_after(max(resumed))
+    # Ánh xạ sync nằm trong main nhưng có thể chứa mã đơn đã archive
+    tables = {row[0] for row in conn.execute("SELECT name FROM main.sqlite_master WHERE type = 'table'")}
+    legacy = f"NOT (length(id) = {ID_LENGTH} AND id GLOB '{'[0-9A-HJKMNP-TV-Z]' * ID_LENGTH}')"
+    migrated = 0
+    for schema in schemas:
+        position = ""  # created_at đã xử lý tới đâu: mỗi batch đọc tiếp trên index, không quét lại từ đầu
+        while True:
+            # created_at là giờ địa phương; 'utc' đổi về epoch giống datetime.timestamp()
+            rows = conn.execute(
+                f"SELECT id, created_at, CAST(strftime('%s', created_at, 'utc') AS INTEGER) * 1000 "
+                f"FROM {schema}.orders WHERE created_at >= ? AND {legacy} "
+                f"ORDER BY created_at, id LIMIT ?", (position, batch_size)
+            ).fetchall()
+            if not rows:
+                break
+            position = rows[-1][1]
+            pairs = [(generator.next_id(max(millis or EPOCH_MS, EPOCH_MS)), old_id) for old_id, _, millis in rows]
+            with conn:
+                conn.executemany(f"INSERT INTO {schema}.order_id_map (new_id, old_id) VALUES (?, ?)", pairs)
+                conn.executemany(f"UPDATE {schema}.orders SET id = ? WHERE id = ?", pairs)
+                conn.executemany(f"UPDATE {schema}.order_items SET order_id = ? WHERE order_id = ?", pairs)
+            migrated += len(pairs)
+        if "sync_id_map" in tables:
+            with conn:
+                conn.execute(f"""
+                    UPDATE main.sync_id_map
+                    SET local_id = (SELECT new_id FROM {schema}.order_id_map WHERE old_id = local_id)
+                    WHERE tbl = 'orders' AND local_id IN (SELECT old_id FROM {schema}.order_id_map)
+                """)
+    return migrated
+
+
+def resolve_order_id(conn, order_id):
+    """
+    Mã mới của một mã cũ (hoá đơn in trước khi chuyển đổi); không có thì trả về chính nó.
+    Nếu kết nối đã ATTACH archive thì tra cả archive.order_id_map (đơn cũ đã chuyển sang archive).
+    """
+    schemas = [row[1] for row in conn.execute("PRAGMA database_list") if row[1] in ("main", "archive")]
+    for schema in schemas:
+        try:
+            row = conn.execute(f"SELECT new_id FROM {schema}.order_id_map WHERE old_id = ?", (order_id,)).fetchone()
+        except sqlite3.OperationalError:
+            continue  # database chưa chuyển đổi: chưa có bảng ánh xạ
+        if row:
+            return row[0]
+    return order_id
+
+
+def main():
+    from database_manager import DatabaseManager
+
+    parser = argparse.ArgumentParser(description="Time-ordered order IDs")
+    parser.add_argument("--db", default="bookstore.db")
+    parser.add_argument("--batch-size", type=int, default=2000)
+    parser.add_argument("command", choices=["migrate", "lookup", "new"])
+    parser.add_argument("order_id", nargs="?")
+    args = parser.parse_args()
+
+    if args.command == "new":
+        print(new_order_id())
+        return
+    db = DatabaseManager(args.db)
+    try:
+        if args.command == "migrate":
+            schemas = ("archive", "main") if db.attach_archive() else ("main",)
+            print(f"Migrated {migrate_order_ids(db.conn, schemas, args.batch_size)} orders")
+        else:
+            order_id = resolve_order_id(db.conn, normalize_order_id(args.order_id))
+            if is_order_id(order_id):
+                millis, terminal, sequence = split_order_id(order_id)
+                print(f"{order_id}: created {order_id_time(order_id)}, terminal {terminal}, sequence {sequence}")
+            else:
+                print(f"{order_id}: legacy order id")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
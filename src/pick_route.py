@@ -0,0 +1,226 @@
+"""
+Lộ trình lấy hàng cho đơn nhiều dòng (đơn qua điện thoại, đơn trường học).
+
+    python pick_route.py --db bookstore.db 3f2a9c1d 7b0e44a2 --out picks.txt
+    python pick_route.py --db bookstore.db --locate        # chuyển shelf_position cũ sang book_locations
+
+    planner = PickPlanner(db, StoreLayout.load())
+    plan = planner.plan_orders(["3f2a9c1d", "7b0e44a2"])    # gộp nhiều đơn thành một lượt
+    plan = planner.plan_items(cart)                         # [{"book_id", "quantity"}, ...]
+    print(format_pick_list(plan))
+
+- Mỗi sách có vị trí khu/dãy/kệ/ô trong book_locations; sách chưa có thì đọc shelf_position
+  (dạng "A-03-2-07" hoặc tên kệ cũ trong layout).
+- Thứ tự lấy: láng giềng gần nhất rồi cải thiện bằng 2-opt trên ma trận khoảng cách của layout
+  (tính một lần). Các dòng cùng ô được lấy cùng lúc; sách không xác định được vị trí xếp cuối.
+"""
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+from cache_utils import bump_table_versions
+from store_layout import SCHEMA, Location, StoreLayout, parse_location
+
+PICK_COLUMNS = ["step", "location", "book_id", "title", "quantity", "order_id"]
+
+
+def nearest_neighbour(dist):
+    """Tour bắt đầu ở điểm 0: mỗi bước đi tới điểm gần nhất chưa thăm."""
+    n = len(dist)
+    tour = [0]
+    visited = np.zeros(n, dtype=bool)
+    visited[0] = True
+    for _ in range(n - 1):
+        row = np.where(visited, np.inf, dist[tour[-1]])
+        nxt = int(row.argmin())
+        tour.append(nxt)
+        visited[nxt] = True
+    return tour + [0]
+
+
+def two_opt(dist, tour, max_passes=50):
+    """Đảo đoạn tour[i..j] khi làm tour ngắn hơn, tới khi không cải thiện được nữa."""
+    tour = np.array(tour)
+    for _ in range(max_passes):
+        improved = False
+        for i in range(1, len(tour) - 2):
+            a, b = tour[i - 1], tour[i]
+            c, d = tour[i + 1:-1], tour[i + 2:]
+            delta = dist[a, c] + dist[b, d] - dist[a, b] - dist[c, d]
+            j = int(delta.argmin())
+            if delta[j] < -1e-9:
+                tour[i:i + j + 2] = tour[i:i + j + 2][::-1]
+                improved = True
+        if not improved:
+            break
+    return tour.tolist()
+
+
+def tour_length(dist, tour):
+    return float(dist[tour[:-1], tour[1:]].sum())
+
+
+class PickPlanner:
+    def __init__(self, db, layout=None):
+        self.db = db
+        self.conn = db.conn
+        self.layout = layout or StoreLayout.load()
+        if not db.read_only:
+            with self.conn:
+                for statement in SCHEMA:
+                    self.conn.execute(statement)
+
+    # Locations
+    def set_location(self, book_id, location):
+        """Gán vị trí (Location hoặc chuỗi "A-03-2-07") cho sách; shelf_position cũng được cập nhật."""
+        if isinstance(location, str):
+            location = parse_location(location)
+        if not self.layout.contains(location):
+            raise ValueError(f"Location {location} is not in the store layout")
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO book_locations (book_id, zone, aisle, shelf, slot) VALUES (?, ?, ?, ?, ?)",
+                (book_id, *location),
+            )
+            self.conn.execute("UPDATE books SET shelf_position = ? WHERE id = ?", (str(location), book_id))
+            bump_table_versions(self.conn, "books")
+
+    def import_locations(self):
+        """Điền book_locations cho các sách chưa có, từ shelf_position. Trả về (đã điền, không đọc được)."""
+        rows = self.conn.execute("""
+            SELECT b.id, b.shelf_position FROM books b
+            WHERE NOT EXISTS (SELECT 1 FROM book_locations l WHERE l.book_id = b.id)
+        """).fetchall()
+        located, unknown = [], 0
+        for book_id, shelf_position in rows:
+            location = self.layout.locate(shelf_position)
+            if location is None:
+                unknown += 1
+            else:
+                located.append((book_id, *location))
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO book_locations (book_id, zone, aisle, shelf, slot) VALUES (?, ?, ?, ?, ?)", located
+            )
+        return len(located), unknown
+
+    def _locations(self, book_ids):
+        placeholders = ",".join("?" * len(book_ids))
+        rows = self.conn.execute(f"""
+            SELECT b.id, b.title, b.shelf_position, l.zone, l.aisle, l.shelf, l.slot
+            FROM books b LEFT JOIN book_locations l ON l.book_id = b.id
+            WHERE b.id IN ({placeholders})
+        """, list(book_ids)).fetchall()
+        result = {}
+        for book_id, title, shelf_position, zone, aisle, shelf, slot in rows:
+            if zone is not None:
+                location = Location(zone, aisle, shelf, slot)
+                location = location if self.layout.contains(location) else None
+            else:
+                location = self.layout.locate(shelf_position)
+            result[book_id] = (title, location)
+        return result
+
+    # Planning
+    def plan_orders(self, order_ids):
+        """Một lượt lấy hàng cho một hoặc nhiều đơn (cột order_id cho biết bỏ vào đơn nào)."""
+        order_ids = [str(o) for o in order_ids]
+        placeholders = ",".join("?" * len(order_ids))
+        rows = self.conn.execute(
+            f"SELECT order_id, book_id, quantity FROM order_items WHERE order_id IN ({placeholders}) ORDER BY id",
+            order_ids,
+        ).fetchall()
+        if not rows:
+            raise ValueError(f"No items found for orders {', '.join(order_ids)}")
+        return self.plan_items([{"order_id": o, "book_id": b, "quantity": q} for o, b, q in rows])
+
+    def plan_items(self, items):
+        """
+        items: list dict có book_id, quantity (và order_id nếu gộp nhiều đơn), theo thứ tự trong giỏ.
+        Trả về {"picks": DataFrame PICK_COLUMNS, "distance": m, "cart_order_distance": m, "unlocated": n}.
+        """
+        locations = self._locations({it["book_id"] for it in items})
+        lines = []
+        for it in items:
+            title, location = locations.get(it["book_id"], (None, None))
+            lines.append((it["book_id"], title, it["quantity"], it.get("order_id"), location))
+
+        nodes = [self.layout.node(loc) for *_, loc in lines if loc is not None]
+        stops = list(dict.fromkeys(nodes))  # các ô cần ghé, theo thứ tự trong giỏ
+        matrix = self.layout.distance_matrix()
+        points = np.array([0] + stops)
+        dist = matrix[np.ix_(points, points)]
+        tour = two_opt(dist, nearest_neighbour(dist)) if len(stops) > 1 else list(range(len(points))) + [0]
+        cart_tour = [0] + [stops.index(n) + 1 for n in nodes] + [0]
+
+        rank = {int(points[t]): step for step, t in enumerate(tour[1:-1], start=1)}
+        picks = []
+        for book_id, title, quantity, order_id, location in lines:
+            step = rank[self.layout.node(location)] if location is not None else len(stops) + 1
+            picks.append((step, str(location) if location else "?", book_id, title, quantity, order_id))
+        picks = pd.DataFrame(picks, columns=PICK_COLUMNS).sort_values(["step", "location"], kind="stable")
+        return {
+            "picks": picks.reset_index(drop=True),
+            "distance": round(tour_length(dist, tour), 1),
+            "cart_order_distance": round(tour_length(dist, cart_tour), 1),
+            "unlocated": sum(location is None for *_, location in lines),
+        }
+
+
+def format_pick_list(plan, width=72):
+    """Danh sách lấy hàng dạng văn bản để in."""
+    picks = plan["picks"]
+    batch = picks["order_id"].nunique() > 1
+    lines = [
+        "PICK LIST".center(width),
+        f"{len(picks)} lines, {int(picks['quantity'].sum())} books, "
+        f"walk {plan['distance']:g} m (cart order: {plan['cart_order_distance']:g} m)",
+        "-" * width,
+    ]
+    for row in picks.itertuples(index=False):
+        step = row.step if row.location != "?" else "--"
+        order = f"  [{row.order_id}]" if batch else ""
+        title = str(row.title or f"Book {row.book_id}")
+        room = width - 26 - len(order)
+        lines.append(f"[ ] {step:>3}  {row.location:<11} {row.quantity:>3} x {title[:room]}{order}")
+    if plan["unlocated"]:
+        lines.append("-" * width)
+        lines.append(f"{plan['unlocated']} line(s) without a known location (marked ?)")
+    return "\n".join(lines)
+
+
+def main():
+    from database_manager import DatabaseManager
+
+    parser = argparse.ArgumentParser(description="Plan a pick route for one or more orders")
+    parser.add_argument("--db", default="bookstore.db")
+    parser.add_argument("--layout", default=None, help="store layout JSON (default: BOOKSTORE_LAYOUT)")
+    parser.add_argument("--locate", action="store_true", help="fill book_locations from shelf_position")
+    parser.add_argument("--out", default=None, help="write the pick list to this file")
+    parser.add_argument("orders", nargs="*")
+    args = parser.parse_args()
+
+    db = DatabaseManager(args.db)
+    planner = PickPlanner(db, StoreLayout.load(args.layout))
+    try:
+        if args.locate:
+            located, unknown = planner.import_locations()
+            print(f"Located {located} books, {unknown} with unrecognised shelf positions")
+        if args.orders:
+            text = format_pick_list(planner.plan_orders(args.orders))
+            if args.out:
+                with open(args.out, "w", encoding="utf-8") as f:
+                    f.write(text + "\n")
+            else:
+                print(text)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+"""
+Mô phỏng what-if giá bán / nhập hàng cho toàn bộ danh mục bằng NumPy.
+
+    sim = PricingSimulator(db)
+    scenarios = scenario_grid(unsold=(0, 0.3), slow=(0, 0.15), fast=(0, 0.05), import_days=(0, 60))
+    sim.run(scenarios, horizon_days=30)          # DataFrame, mỗi dòng một kịch bản
+    sim.project_books(scenarios[3], horizon_days=30)
+
+    python pricing_simulator.py --db bookstore.db --horizon 30 --top 10
+
+- Nhu cầu gốc mỗi sách = số bán trong window_days tính tới ngày có đơn gần nhất, làm mượt về
+  trung bình thể loại (sách chưa bán vẫn có nhu cầu nhỏ thay vì 0).
+- Độ co giãn theo giá (log-log) ước lượng theo từng sách từ giá bán thực tế theo tuần
+  (sales_daily), co về độ co giãn của thể loại khi sách ít thay đổi giá.
+- Sách được chia nhóm unsold/slow/average/fast đúng như optimize_inventory_report; một kịch bản
+  là hệ số giá cho từng nhóm + số ngày hàng nhập thêm cho sách bán nhanh.
+- Cả lô kịch bản được tính bằng ma trận (kịch bản × sách), chia khối để giới hạn bộ nhớ; mỗi nhóm
+  sách chỉ tính một lần cho mỗi giá trị tham số khác nhau của nhóm đó.
+"""
+import argparse
+import itertools
+import threading
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+CLASSES = ("unsold", "slow", "average", "fast")
+UNSOLD, SLOW, AVERAGE, FAST = range(len(CLASSES))
+
+SCENARIO_COLUMNS = ["scenario", "unsold", "slow", "average", "fast", "import_days",
+                    "units", "revenue", "profit", "revenue_change", "profit_change",
+                    "restock_units", "restock_cost", "stockouts", "lost_units"]
+BOOK_COLUMNS = ["book_id", "title", "group", "price", "new_price", "elasticity", "daily_demand",
+                "units", "revenue", "profit", "restock_units", "stockout_date"]
+
+GLOBAL_ELASTICITY = -1.2  # sách nói chung: tăng giá 1% thì bán ít đi ~1.2%
+ELASTICITY_RANGE = (-3.0, -0.3)
+MAX_CELLS = 2_000_000  # số ô (kịch bản × sách) mỗi khối
+
+
+def scenario_grid(unsold=(0, 0.1, 0.2, 0.3, 0.4, 0.5), slow=(0, 0.05, 0.1, 0.15, 0.2, 0.25),
+                  average=(0,), fast=(0, 0.05, 0.1), import_days=(0, 30, 60, 90)):
+    """
+    Mọi tổ hợp tham số. unsold/slow là mức giảm giá, average là mức đổi giá,
+    fast là mức tăng giá của sách bán nhanh; import_days là số ngày hàng nhập thêm cho sách bán nhanh.
+    """
+    return [
+        {"unsold": u, "slow": s, "average": a, "fast": f, "import_days": d}
+        for u, s, a, f, d in itertools.product(unsold, slow, average, fast, import_days)
+    ]
+
+
+def _group_mean(values, groups, n_groups, weights=None):
+    total = np.bincount(groups, weights=values if weights is None else values * weights, minlength=n_groups)
+    count = np.bincount(groups, weights=weights, minlength=n_groups)
+    return np.divide(total, count, out=np.zeros(n_groups), where=count > 0)
+
+
+class PricingSimulator:
+    def __init__(self, db, window_days=90, smoothing_days=14, shrinkage=0.5, lead_days=7):
+        self.db = db
+        self.window_days = window_days
+        self.smoothing_days = smoothing_days
+        self.shrinkage = shrinkage
+        self.lead_days = lead_days
+        self._lock = threading.Lock()
+        self._fitted_key = None
+
+    # Model
+    def fit(self):
+        """Nạp giá/tồn kho và ước lượng nhu cầu + độ co giãn; bỏ qua nếu dữ liệu chưa đổi."""
+        cube = self.db.sales_cube()
+        cube.refresh()
+        fingerprint = tuple(self.db.conn.execute(
+            "SELECT COUNT(*), MAX(id), TOTAL(stock), TOTAL(sell_price) FROM books").fetchone())
+        key = (cube.watermark, fingerprint)
+        with self._lock:
+            if key == self._fitted_key:
+                return
+            day, book, qty, revenue = cube.day, cube.book, cube.qty, cube.revenue
+            self._load_books(int(book.max()) + 1 if len(book) else 0)
+            self._fit_demand(day, book, qty)
+            self._fit_elasticity(day, book, qty, revenue)
+            self._fitted_key = key
+
+    def _load_books(self, min_size):
+        rows = self.db.conn.execute("SELECT id, title, genre, buy_price, sell_price, stock FROM books").fetchall()
+        size = max([r[0] for r in rows] + [min_size - 1, 0]) + 1
+        genres = sorted({r[2] or "" for r in rows})
+        genre_index = {g: i for i, g in enumerate(genres)}
+
+        self.exists = np.zeros(size, dtype=bool)
+        self.genre = np.zeros(size, dtype=np.int64)
+        self.cost = np.zeros(size)
+        self.price = np.zeros(size)
+        self.stock = np.zeros(size)
+        self.titles = {}
+        for book_id, title, genre, buy, sell, stock in rows:
+            self.exists[book_id] = True
+            self.genre[book_id] = genre_index[genre or ""]
+            self.cost[book_id] = buy or 0
+            self.price[book_id] = sell or 0
+            self.stock[book_id] = max(stock or 0, 0)
+            self.titles[book_id] = title
+        self.n_genres = len(genres) or 1
+
+    def _fit_demand(self, day, book, qty):
+        size = len(self.exists)
+        self.reference_day = int(day.max()) if len(day) else int(np.datetime64(date.today(), "D").astype(np.int64))
+        recent = day > self.reference_day - self.window_days
+        window_qty = np.bincount(book[recent], weights=qty[recent], minlength=size)[:size]
+        raw_rate = window_qty / self.window_days
+
+        # Làm mượt: thêm smoothing_days "ngày ảo" bán theo trung bình thể loại
+        genre_rate = _group_mean(raw_rate[self.exists], self.genre[self.exists], self.n_genres)
+        self.demand = (window_qty + self.smoothing_days * genre_rate[self.genre]) / (
+            self.window_days + self.smoothing_days)
+        self.demand[~self.exists] = 0
+
+        # Nhóm theo đúng quy tắc của optimize_inventory_report
+        days_to_sell = np.divide(self.stock, raw_rate, out=np.full(size, np.inf), where=raw_rate > 0)
+        self.group = np.select(
+            [window_qty == 0, days_to_sell > 90, days_to_sell >= 30],
+            [UNSOLD, SLOW, AVERAGE],
+            default=FAST,
+        ).astype(np.int64)
+
+    def _fit_elasticity(self, day, book, qty, revenue):
+        size = len(self.exists)
+        # Gộp theo (sách, tuần): giá thực tế = doanh thu / số lượng
+        keys, inverse = np.unique(book.astype(np.int64) * 100_000 + day // 7, return_inverse=True)
+        week_qty = np.bincount(inverse, weights=qty)
+        week_revenue = np.bincount(inverse, weights=revenue)
+        week_book = keys // 100_000
+        valid = (week_qty > 0) & (week_revenue > 0)
+        week_book, x, y = week_book[valid], np.log(week_revenue[valid] / week_qty[valid]), np.log(week_qty[valid])
+
+        # Hồi quy trong từng sách: beta = Sxy / Sxx
+        x_mean = _group_mean(x, week_book, size)
+        y_mean = _group_mean(y, week_book, size)
+        dx = x - x_mean[week_book]
+        sxx = np.bincount(week_book, weights=dx * dx, minlength=size)
+        sxy = np.bincount(week_book, weights=dx * (y - y_mean[week_book]), minlength=size)
+
+        # Độ co giãn thể loại: gộp Sxx/Sxy của các sách trong thể loại, co về mức chung
+        genre_sxx = np.bincount(self.genre, weights=sxx, minlength=self.n_genres)
+        genre_sxy = np.bincount(self.genre, weights=sxy, minlength=self.n_genres)
+        genre_beta = (genre_sxy + self.shrinkage * GLOBAL_ELASTICITY) / (genre_sxx + self.shrinkage)
+        prior = np.clip(genre_beta, *ELASTICITY_RANGE)[self.genre]
+
+        # Sách ít biến động giá (Sxx nhỏ) thì gần như dùng mức của thể loại
+        self.elasticity = np.clip((sxy + self.shrinkage * prior) / (sxx + self.shrinkage), *ELASTICITY_RANGE)
+        self.price_observations = sxx
+
+    # Simulation
+    def _parameters(self, scenarios):
+        multipliers = np.array([
+            [1 - s.get("unsold", 0), 1 - s.get("slow", 0), 1 + s.get("average", 0), 1 + s.get("fast", 0)]
+            for s in scenarios
+        ], dtype=float)
+        import_days = np.array([s.get("import_days", 0) for s in scenarios], dtype=float)
+        return multipliers, import_days
+
+    def _project(self, multipliers, import_days, horizon, index):
+        """Chiếu một khối kịch bản trên các sách index; trả về các ma trận (kịch bản × sách)."""
+        group = self.group[index]
+        m = multipliers[:, group]
+        price = self.price[index] * m
+        demand = self.demand[index] * m ** self.elasticity[index]
+        stock = self.stock[index]
+        # Nhập thêm import_days ngày bán cho sách bán nhanh, về sau lead_days
+        restock = np.where(group == FAST, np.ceil(demand * import_days[:, None]), 0.0)
+        if self.lead_days >= horizon:
+            restock = np.zeros_like(restock)
+        lead = min(self.lead_days, horizon)
+
+        sold_before = np.minimum(demand * lead, stock)
+        sold_after = np.minimum(demand * (horizon - lead), stock - sold_before + restock)
+        units = sold_before + sold_after
+
+        # Ngày hết hàng đầu tiên (inf nếu không hết trong horizon)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out_before = np.where(demand > 0, stock / demand, np.inf)
+            out_after = np.where(demand > 0, (stock + restock) / demand, np.inf)
+        stockout = np.where(out_before < lead, out_before, np.where(out_after < horizon, out_after, np.inf))
+        return {
+            "price": price, "demand": demand, "units": units, "revenue": units * price,
+            "profit": units * (price - self.cost[index]), "restock": restock, "stockout": stockout,
+            "lost": demand * horizon - units,
+        }
+
+    def _totals(self, multipliers, import_days, horizon, index):
+        """Tổng theo kịch bản (units, revenue, profit, restock, restock_cost, stockouts, lost)."""
+        totals = np.zeros((len(multipliers), 7))
+        chunk = max(1, MAX_CELLS // len(index))
+        for start in range(0, len(multipliers), chunk):
+            part = slice(start, start + chunk)
+            p = self._project(multipliers[part], import_days[part], horizon, index)
+            totals[part] = np.column_stack([
+                p["units"].sum(axis=1), p["revenue"].sum(axis=1), p["profit"].sum(axis=1),
+                p["restock"].sum(axis=1), p["restock"] @ self.cost[index],
+                np.isfinite(p["stockout"]).sum(axis=1), p["lost"].sum(axis=1),
+            ])
+        return totals
+
+    def run(self, scenarios=None, horizon_days=30):
+        """Tổng doanh thu/lợi nhuận/hết hàng theo từng kịch bản, so với giữ nguyên giá."""
+        self.fit()
+        scenarios = scenario_grid() if scenarios is None else list(scenarios)
+        baseline = {"unsold": 0, "slow": 0, "average": 0, "fast": 0, "import_days": 0}
+        multipliers, import_days = self._parameters([baseline] + scenarios)
+        params = np.column_stack([multipliers, import_days])
+
+        # Không có co giãn chéo: sách nhóm g chỉ phụ thuộc hệ số giá của nhóm g (và số ngày nhập
+        # nếu là nhóm fast), nên mỗi nhóm chỉ cần tính cho các giá trị tham số khác nhau rồi cộng lại
+        totals = np.zeros((len(params), 7))
+        for g in range(len(CLASSES)):
+            index = np.flatnonzero(self.exists & (self.group == g))
+            if not len(index):
+                continue
+            columns = [g, len(CLASSES)] if g == FAST else [g]
+            unique, inverse = np.unique(params[:, columns], axis=0, return_inverse=True)
+            group_multipliers = np.ones((len(unique), len(CLASSES)))
+            group_multipliers[:, g] = unique[:, 0]
+            group_days = unique[:, 1] if g == FAST else np.zeros(len(unique))
+            totals += self._totals(group_multipliers, group_days, horizon_days, index)[inverse.reshape(-1)]
+
+        base, totals = totals[0], totals[1:]
+        df = pd.DataFrame(scenarios, columns=["unsold", "slow", "average", "fast", "import_days"]).fillna(0)
+        df.insert(0, "scenario", range(len(df)))
+        df["units"] = totals[:, 0].round().astype(np.int64)
+        df["revenue"] = totals[:, 1].round().astype(np.int64)
+        df["profit"] = totals[:, 2].round().astype(np.int64)
+        df["revenue_change"] = (totals[:, 1] - base[1]).round().astype(np.int64)
+        df["profit_change"] = (totals[:, 2] - base[2]).round().astype(np.int64)
+        df["restock_units"] = totals[:, 3].round().astype(np.int64)
+        df["restock_cost"] = totals[:, 4].round().astype(np.int64)
+        df["stockouts"] = totals[:, 5].astype(np.int64)
+        df["lost_units"] = totals[:, 6].round().astype(np.int64)
+        return df[SCENARIO_COLUMNS]
+
+    def project_books(self, scenario, horizon_days=30, top=None):
+        """Chi tiết từng sách cho một kịch bản (sắp theo lợi nhuận giảm dần)."""
+        self.fit()
+        multipliers, import_days = self._parameters([scenario])
+        index = np.flatnonzero(self.exists)
+        p = {k: v[0] for k, v in self._project(multipliers, import_days, horizon_days, index).items()}
+        today = date.today()
+        stockout_dates = [
+            (today + timedelta(days=int(d))).isoformat() if np.isfinite(d) else None for d in p["stockout"]
+        ]
+        df = pd.DataFrame({
+            "book_id": index,
+            "title": [self.titles[i] for i in index],
+            "group": np.array(CLASSES)[self.group[index]],
+            "price": self.price[index].astype(np.int64),
+            "new_price": p["price"].round().astype(np.int64),
+            "elasticity": self.elasticity[index].round(2),
+            "daily_demand": p["demand"].round(3),
+            "units": p["units"].round().astype(np.int64),
+            "revenue": p["revenue"].round().astype(np.int64),
+            "profit": p["profit"].round().astype(np.int64),
+            "restock_units": p["restock"].astype(np.int64),
+            "stockout_date": stockout_dates,
+        })
+        df = df.sort_values("profit", ascending=False)
+        return (df.head(top) if top else df).reset_index(drop=True)[BOOK_COLUMNS]
+
+
+def main():
+    from database_manager import DatabaseManager
+
+    parser = argparse.ArgumentParser(description="What-if pricing simulation over the whole catalog")
+    parser.add_argument("--db", default="bookstore.db")
+    parser.add_argument("--horizon", type=int, default=30, help="days to project")
+    parser.add_argument("--top", type=int, default=10, help="show the N most profitable scenarios")
+    args = parser.parse_args()
+
+    db = DatabaseManager(args.db)
+    sim = PricingSimulator(db)
+    t0 = time.perf_counter()
+    sim.fit()
+    t1 = time.perf_counter()
+    results = sim.run(horizon_days=args.horizon)
+    t2 = time.perf_counter()
+    print(f"fit {t1 - t0:.2f}s, {len(results)} scenarios x {int(sim.exists.sum()):,} books in {t2 - t1:.2f}s")
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(results.sort_values("profit", ascending=False).head(args.top).to_string(index=False))
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
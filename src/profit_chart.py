@@ -0,0 +1,172 @@
+import io
+import base64
+import logging
+import queue
+import threading
+
+import tkinter as tk
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
+from cache_utils import LRUCache
+
+
+def aggregate_top_n(df, label_col="title", value_col="profit", top_n=15, keep_order=False):
+    """Giữ top-N dòng theo value_col, gộp phần còn lại thành một cột 'Others'."""
+    if df.empty:
+        return [], []
+    if keep_order:
+        # Chuỗi thời gian: giữ nguyên thứ tự, không gộp
+        return df[label_col].astype(str).tolist(), df[value_col].astype(float).tolist()
+    if top_n is None or len(df) <= top_n:
+        ordered = df.sort_values(value_col, ascending=False)
+        return ordered[label_col].astype(str).tolist(), ordered[value_col].astype(float).tolist()
+
+    top = df.nlargest(top_n, value_col)
+    others = df[value_col].sum() - top[value_col].sum()
+    labels = top[label_col].astype(str).tolist() + [f"Others ({len(df) - top_n})"]
+    values = top[value_col].astype(float).tolist() + [float(others)]
+    return labels, values
+
+
+class ProfitChart:
+    """
+    Profit chart giữ một Figure duy nhất và cập nhật dữ liệu bar tại chỗ.
+    - Mặc định gộp về top-N + "Others".
+    - Khi số cột lớn (top_n=None) thì render ngoài UI thread ra PNG; UI thread nhận ảnh qua queue (poll bằng after).
+    - Kết quả render được cache theo key (khoảng ngày + data version).
+    """
+
+    COLOR = "#4ECDC4"
+
+    def __init__(self, parent, root, top_n=15, large_threshold=200, cache_size=16):
+        self.root = root
+        self.top_n = top_n
+        self.large_threshold = large_threshold
+        self.cache = LRUCache(cache_size)
+        self._render_token = 0
+        self._renders = queue.Queue()  # (token, entry) từ thread render; entry None nếu lỗi
+        self._pending_renders = 0
+
+        self.figure = Figure(figsize=(10, 5), dpi=100)
+        self.ax = self.figure.add_subplot(111)
+        self._bars = None
+        self._titles = ("Profit per Book", "Profit (VNĐ)")
+        self._setup_axes()
+
+        self.canvas = FigureCanvasTkAgg(self.figure, parent)
+        self.canvas_widget = self.canvas.get_tk_widget()
+        self.canvas_widget.pack(fill="both", expand=True)
+
+        # Label dùng để hiển thị ảnh render sẵn (chế độ dữ liệu lớn)
+        self.image_label = tk.Label(parent, bg="#ecf0f1")
+        self._photo = None
+
+    def _setup_axes(self, title="Profit per Book", ylabel="Profit (VNĐ)"):
+        self.ax.set_title(title, fontsize=12)
+        self.ax.set_ylabel(ylabel)
+        self.ax.tick_params(axis="x", labelsize=8, rotation=45)
+
+    def show(self, key, df, label_col="title", value_col="profit",
+             title="Profit per Book", ylabel="Profit (VNĐ)", keep_order=False):
+        """Vẽ df cho key; dùng lại bản render trong cache nếu có."""
+        self._render_token += 1
+        key = (key, self.top_n, label_col, value_col, keep_order)
+        self._titles = (title, ylabel)
+        cached = self.cache.get(key)
+        if cached is not None:
+            self._display(cached)
+            return
+
+        if (self.top_n is None or keep_order) and len(df) > self.large_threshold:
+            self._render_offscreen(key, df, label_col, value_col, self._render_token, keep_order)
+            return
+
+        labels, values = aggregate_top_n(df, label_col, value_col, self.top_n, keep_order)
+        entry = ("bars", labels, values)
+        self.cache.put(key, entry)
+        self._display(entry)
+
+    def clear(self):
+        self._render_token += 1
+        self._display(("bars", [], []))
+
+    def invalidate(self):
+        self.cache.clear()
+
+    def _display(self, entry):
+        if entry[0] == "image":
+            self._show_image(entry[1])
+        else:
+            self._update_bars(entry[1], entry[2])
+
+    def _update_bars(self, labels, values):
+        if self.image_label.winfo_ismapped():
+            self.image_label.pack_forget()
+            self.canvas_widget.pack(fill="both", expand=True)
+
+        positions = list(range(len(values)))
+        if self._bars is not None and len(self._bars) == len(values):
+            # Cùng số cột: chỉ cập nhật chiều cao, không dựng lại artist
+            for rect, value in zip(self._bars, values):
+                rect.set_height(value)
+        else:
+            if self._bars is not None:
+                self._bars.remove()
+            self._bars = self.ax.bar(positions, values, color=self.COLOR)
+        self._setup_axes(*self._titles)
+        self.ax.set_xticks(positions)
+        self.ax.set_xticklabels(labels, ha="right")
+        self.ax.relim()
+        self.ax.autoscale_view()
+        self.canvas.draw_idle()
+
+    def _render_offscreen(self, key, df, label_col, value_col, token, keep_order=False):
+        title, ylabel = self._titles
+
+        def worker():
+            try:
+                labels, values = aggregate_top_n(df, label_col, value_col, None, keep_order)
+                fig = Figure(figsize=(10, 5), dpi=100)
+                FigureCanvasAgg(fig)
+                ax = fig.add_subplot(111)
+                ax.bar(range(len(values)), values, color=self.COLOR)
+                ax.set_title(title, fontsize=12)
+                ax.set_ylabel(ylabel)
+                ax.set_xticks([])
+                buffer = io.BytesIO()
+                fig.savefig(buffer, format="png")
+                entry = ("image", buffer.getvalue())
+            except Exception as e:
+                logging.error(f"Chart render error: {e}")
+                entry = None
+            else:
+                self.cache.put(key, entry)
+            self._renders.put((token, entry))
+
+        self._pending_renders += 1
+        if self._pending_renders == 1:
+            self.root.after(50, self._poll_renders)
+        threading.Thread(target=worker, daemon=True).start()
+
+    def _poll_renders(self):
+        """Chạy trên UI thread: nhận ảnh đã render, poll tiếp cho tới khi không còn thread render nào."""
+        while True:
+            try:
+                token, entry = self._renders.get_nowait()
+            except queue.Empty:
+                break
+            self._pending_renders -= 1
+            # Chỉ hiển thị nếu người dùng chưa yêu cầu vẽ cái khác
+            if entry is not None and token == self._render_token:
+                self._display(entry)
+        if self._pending_renders:
+            self.root.after(50, self._poll_renders)
+
+    def _show_image(self, png_bytes):
+        self._photo = tk.PhotoImage(data=base64.b64encode(png_bytes))
+        self.image_label.config(image=self._photo)
+        if not self.image_label.winfo_ismapped():
+            self.canvas_widget.pack_forget()
+            self.image_label.pack(fill="both", expand=True)
@@ -0,0 +1,294 @@
+"""
+Gợi ý "thường được mua cùng" từ lịch sử giỏ hàng (order_items).
+
+    rec = Recommender(db)
+    rec.for_book(42, k=5)          # [{"id", "title", "sell_price", "stock", "score", "support"}, ...]
+    rec.for_cart([42, 7], k=5)
+
+- Ma trận đồng xuất hiện thưa lưu trong copurchase_pairs (cả hai chiều a->b, b->a) và số giỏ
+  của từng sách trong copurchase_books; dựng lần đầu từ toàn bộ lịch sử (kể cả archive).
+- Cập nhật tăng dần theo order_items.id (watermark): create_order cộng giỏ mới ngay trong
+  transaction của đơn, các dòng do tiến trình khác ghi được cộng ở lần refresh sau.
+- Điểm: lift = n_ab * N / (n_a * n_b) hoặc pmi = log2(lift); chỉ tính cặp có n_ab >= min_support.
+- Top-K của mỗi sách được cache (LRU) và bị xoá khi sách đó, hoặc một sách trong top-K của nó, có trong
+  giỏ mới (n_b đổi thì lift đổi); nên gợi ý cho một sách hay cả giỏ không phải quét lại lịch sử.
+  Số giỏ N chỉ nhân mọi lift của một sách với cùng hệ số, nên điểm trong cache được quy đổi theo N hiện tại.
+"""
+import heapq
+import math
+import sqlite3
+import threading
+from collections import defaultdict
+
+from cache_utils import LRUCache
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS copurchase_pairs (
+        book_a INTEGER,
+        book_b INTEGER,
+        baskets INTEGER,
+        PRIMARY KEY (book_a, book_b)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS copurchase_books (
+        book_id INTEGER PRIMARY KEY,
+        baskets INTEGER
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS copurchase_state (
+        key TEXT PRIMARY KEY,
+        value INTEGER
+    )
+    """,
+]
+
+METRICS = ("lift", "pmi")
+TOP_K = 20  # số gợi ý giữ sẵn cho mỗi sách
+
+
+class Recommender:
+    def __init__(self, db, metric="lift", min_support=2, cache_size=4096):
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric {metric!r}, expected one of {METRICS}")
+        self.db = db
+        self.conn = db.conn
+        self.metric = metric
+        self.min_support = min_support
+        self.cache = LRUCache(cache_size)
+        self._lock = threading.Lock()
+        self.watermark = None
+        if not db.read_only:
+            with self.conn:
+                for statement in SCHEMA:
+                    self.conn.execute(statement)
+
+    # State
+    def _state(self, key):
+        try:
+            row = self.conn.execute("SELECT value FROM copurchase_state WHERE key = ?", (key,)).fetchone()
+        except sqlite3.OperationalError:
+            return None
+        return row[0] if row else None
+
+    def _set_state(self, key, value):
+        self.conn.execute(
+            "INSERT INTO copurchase_state (key, value) VALUES (?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+            (key, value),
+        )
+
+    @property
+    def ready(self):
+        return self._state("order_item_watermark") is not None
+
+    # Build / update
+    def rebuild(self):
+        """Dựng lại ma trận từ toàn bộ order_items (live + archive)."""
+        conn = self.conn
+        # ATTACH không chạy được trong transaction
+        has_archive = self.db.archive_horizon() is not None and self.db.attach_archive()
+        with self._lock:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                high = conn.execute("SELECT COALESCE(MAX(id), 0) FROM order_items").fetchone()[0]
+                # Mỗi (giỏ, sách) một dòng: các bước sau chỉ cần COUNT(*)
+                conn.execute("DROP TABLE IF EXISTS temp.basket_lines")
+                conn.execute("""
+                             CREATE TEMP TABLE basket_lines (
+                                 order_id TEXT,
+                                 book_id INTEGER,
+                                 PRIMARY KEY (order_id, book_id)
+                             ) WITHOUT ROWID
+                             """)
+                conn.execute("INSERT OR IGNORE INTO basket_lines SELECT order_id, book_id FROM order_items WHERE id <= ?",
+                             (high,))
+                if has_archive:
+                    conn.execute("INSERT OR IGNORE INTO basket_lines SELECT order_id, book_id FROM archive.order_items")
+                conn.execute("DELETE FROM copurchase_pairs")
+                conn.execute("DELETE FROM copurchase_books")
+                conn.execute("""
+                             INSERT INTO copurchase_books (book_id, baskets)
+                             SELECT book_id, COUNT(*) FROM basket_lines GROUP BY book_id
+                             """)
+                conn.execute("""
+                             INSERT INTO copurchase_pairs (book_a, book_b, baskets)
+                             SELECT a.book_id, b.book_id, COUNT(*)
+                             FROM basket_lines a
+                                      JOIN basket_lines b ON b.order_id = a.order_id AND b.book_id <> a.book_id
+                             GROUP BY a.book_id, b.book_id
+                             """)
+                baskets = conn.execute("SELECT COUNT(DISTINCT order_id) FROM basket_lines").fetchone()[0]
+                conn.execute("DROP TABLE temp.basket_lines")
+                self._set_state("baskets", baskets)
+                self._set_state("order_item_watermark", high)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            self.cache.clear()
+            self.watermark = high
+
+    def _apply_lines(self, low, high):
+        """Cộng các giỏ có dòng id trong (low, high]; trả về các sách bị ảnh hưởng."""
+        rows = self.conn.execute(
+            "SELECT DISTINCT order_id, book_id FROM order_items WHERE id > ? AND id <= ?", (low, high)
+        ).fetchall()
+        baskets = defaultdict(set)
+        for order_id, book_id in rows:
+            baskets[order_id].add(book_id)
+
+        book_counts = defaultdict(int)
+        pair_counts = defaultdict(int)
+        for books in baskets.values():
+            for a in books:
+                book_counts[a] += 1
+                for b in books:
+                    if a != b:
+                        pair_counts[(a, b)] += 1
+
+        self.conn.executemany(
+            "INSERT INTO copurchase_books (book_id, baskets) VALUES (?, ?) "
+            "ON CONFLICT (book_id) DO UPDATE SET baskets = baskets + excluded.baskets",
+            list(book_counts.items()),
+        )
+        self.conn.executemany(
+            "INSERT INTO copurchase_pairs (book_a, book_b, baskets) VALUES (?, ?, ?) "
+            "ON CONFLICT (book_a, book_b) DO UPDATE SET baskets = baskets + excluded.baskets",
+            [(a, b, n) for (a, b), n in pair_counts.items()],
+        )
+        self._set_state("baskets", (self._state("baskets") or 0) + len(baskets))
+        self._set_state("order_item_watermark", high)
+        return book_counts.keys()
+
+    def record_new_orders(self):
+        """
+        Gọi bên trong transaction đang ghi đơn (create_order): cộng các dòng đơn mới.
+        Chưa dựng ma trận thì bỏ qua, lần refresh đầu tiên sẽ rebuild.
+        """
+        watermark = self._state("order_item_watermark")
+        if watermark is None:
+            return
+        high = self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM order_items").fetchone()[0]
+        if high > watermark:
+            touched = self._apply_lines(watermark, high)
+            self._invalidate(touched, watermark)
+            self.watermark = high
+
+    def refresh(self):
+        """Dựng lần đầu hoặc cộng các dòng đơn chưa được tính (ví dụ do tiến trình khác ghi)."""
+        if self.db.read_only:
+            stored = self._state("order_item_watermark")
+            if stored != self.watermark:
+                self.cache.clear()
+                self.watermark = stored
+            return
+        stored = self._state("order_item_watermark")
+        if stored is None:
+            self.rebuild()
+            return
+        high = self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM order_items").fetchone()[0]
+        if high > stored:
+            with self._lock:
+                self.conn.execute("BEGIN IMMEDIATE")
+                try:
+                    # Đọc lại trong transaction: tiến trình khác có thể vừa cộng xong
+                    stored = self._state("order_item_watermark")
+                    high = self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM order_items").fetchone()[0]
+                    touched = self._apply_lines(stored, high) if high > stored else ()
+                    self.conn.commit()
+                except Exception:
+                    self.conn.rollback()
+                    raise
+            self._invalidate(touched, stored)
+            stored = max(stored, high)
+        if stored != self.watermark:
+            # Tiến trình khác đã cộng giỏ mới mà ta không biết là sách nào
+            self.cache.clear()
+        self.watermark = stored
+
+    def _invalidate(self, books, previous_watermark):
+        if self.watermark != previous_watermark:
+            self.cache.clear()
+            return
+        books = set(books)
+        if books:
+            # Mục cache: (N, top, id các sách trong top)
+            self.cache.discard_where(lambda book_id, entry: book_id in books or not entry[2].isdisjoint(books))
+
+    # Queries
+    def _top(self, book_id):
+        """Top-K (book_id, score, support) của một sách, cache theo sách."""
+        total = self._state("baskets") or 0
+        cached = self.cache.get(book_id)
+        if cached is not None:
+            return self._rescale(cached[1], cached[0], total)
+        n_a = self.conn.execute("SELECT baskets FROM copurchase_books WHERE book_id = ?", (book_id,)).fetchone()
+        top = []
+        if n_a and total:
+            rows = self.conn.execute(
+                "SELECT p.book_b, p.baskets, c.baskets FROM copurchase_pairs p "
+                "JOIN copurchase_books c ON c.book_id = p.book_b "
+                "WHERE p.book_a = ? AND p.baskets >= ?",
+                (book_id, self.min_support),
+            ).fetchall()
+            scored = []
+            for other, n_ab, n_b in rows:
+                lift = n_ab * total / (n_a[0] * n_b)
+                scored.append((other, math.log2(lift) if self.metric == "pmi" else lift, n_ab))
+            top = heapq.nlargest(TOP_K, scored, key=lambda r: (r[1], r[2]))
+        self.cache.put(book_id, (total, top, frozenset(r[0] for r in top)))
+        return top
+
+    def _rescale(self, top, cached_total, total):
+        """Điểm tính với N = cached_total -> điểm với N = total (lift tỉ lệ với N, thứ tự không đổi)."""
+        if total == cached_total or not cached_total or not total:
+            return top
+        if self.metric == "pmi":
+            shift = math.log2(total / cached_total)
+            return [(other, score + shift, n_ab) for other, score, n_ab in top]
+        factor = total / cached_total
+        return [(other, score * factor, n_ab) for other, score, n_ab in top]
+
+    def _books(self, scored, k, exclude=()):
+        """Gắn thông tin sách (tồn kho hiện tại), bỏ sách hết hàng hoặc đã có trong giỏ."""
+        candidates = [r for r in scored if r[0] not in exclude]
+        if not candidates:
+            return []
+        ids = [r[0] for r in candidates]
+        placeholders = ",".join("?" * len(ids))
+        books = {
+            row["id"]: row for row in self.conn.execute(
+                f"SELECT id, title, sell_price, stock FROM books WHERE id IN ({placeholders}) AND stock > 0", ids
+            )
+        }
+        result = []
+        for book_id, score, support in candidates:
+            row = books.get(book_id)
+            if row is None:
+                continue
+            result.append({"id": row["id"], "title": row["title"], "sell_price": row["sell_price"],
+                           "stock": row["stock"], "score": round(score, 4), "support": support})
+            if len(result) == k:
+                break
+        return result
+
+    def for_book(self, book_id, k=5):
+        """Sách hay được mua cùng book_id."""
+        self.refresh()
+        return self._books(self._top(int(book_id)), k, exclude={int(book_id)})
+
+    def for_cart(self, book_ids, k=5):
+        """Gợi ý cho cả giỏ: cộng điểm top-K của từng sách trong giỏ."""
+        self.refresh()
+        cart = {int(b) for b in book_ids}
+        totals = defaultdict(float)
+        support = defaultdict(int)
+        for book_id in cart:
+            for other, score, n_ab in self._top(book_id):
+                totals[other] += score
+                support[other] += n_ab
+        scored = heapq.nlargest(TOP_K, ((b, s, support[b]) for b, s in totals.items()), key=lambda r: (r[1], r[2]))
+        return self._books(scored, k, exclude=cart)
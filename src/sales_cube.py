@@ -0,0 +1,349 @@
+"""
+Cube doanh số ngày × sách (kèm genre) cho báo cáo theo ngày/tuần/tháng/quý.
+
+- Bảng tổng hợp sales_daily được cập nhật tăng dần theo order_items.id (watermark),
+  nên mỗi lần refresh chỉ đọc các dòng đơn mới.
+- Khi dựng lần đầu, đơn đã archive được lấy từ archive.daily_sales.
+- Dữ liệu được nạp vào mảng NumPy; mọi lát cắt chỉ là mask + bincount, không group by lại SQL.
+"""
+import heapq
+import sqlite3
+import threading
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS sales_daily (
+        day TEXT,
+        book_id INTEGER,
+        quantity INTEGER,
+        revenue INTEGER,
+        PRIMARY KEY (day, book_id)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS cube_state (
+        key TEXT PRIMARY KEY,
+        value INTEGER
+    )
+    """,
+]
+
+GRAINS = ("day", "week", "month", "quarter")
+
+TREND_COLUMNS = ["period", "quantity", "revenue", "profit"]
+GENRE_COLUMNS = ["genre", "quantity", "revenue", "profit", "share"]
+BEST_SELLER_COLUMNS = ["book_id", "title", "genre", "quantity", "revenue", "profit"]
+COMPARE_COLUMNS = ["key", "revenue", "previous_revenue", "change_pct"]
+
+UNKNOWN_GENRE = "Unknown"
+
+
+def _to_days(values):
+    """'YYYY-MM-DD' -> số ngày kể từ 1970-01-01 (int32)."""
+    return np.array(values, dtype="datetime64[D]").astype(np.int32)
+
+
+def _bucket(days, grain):
+    """Khoá bucket (int) cho mỗi ngày theo grain."""
+    if grain == "day":
+        return days.astype(np.int64)
+    if grain == "week":
+        # 1970-01-01 là thứ Năm: +3 để tuần bắt đầu từ thứ Hai
+        return (days.astype(np.int64) + 3) // 7
+    months = days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+    if grain == "month":
+        return months
+    if grain == "quarter":
+        return months // 3
+    raise ValueError(f"Unknown grain {grain!r}, expected one of {GRAINS}")
+
+
+def _bucket_label(key, grain):
+    if grain == "day":
+        return str(np.datetime64(int(key), "D"))
+    if grain == "week":
+        monday = date(1970, 1, 1) + timedelta(days=int(key) * 7 - 3)
+        year, week, _ = monday.isocalendar()
+        return f"{year}-W{week:02d}"
+    if grain == "month":
+        return str(np.datetime64(int(key), "M"))
+    return f"{1970 + int(key) // 4}-Q{int(key) % 4 + 1}"
+
+
+class SalesCube:
+    def __init__(self, db):
+        self.db = db
+        self.conn = db.conn
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._books_fingerprint = None
+        self.watermark = None
+        if not db.read_only:
+            with self.conn:
+                for statement in SCHEMA:
+                    self.conn.execute(statement)
+
+    # Refresh
+    def _state(self):
+        try:
+            row = self.conn.execute("SELECT value FROM cube_state WHERE key = 'order_item_watermark'").fetchone()
+        except sqlite3.OperationalError:
+            return None
+        return row[0] if row else None
+
+    def _set_state(self, value):
+        self.conn.execute(
+            "INSERT INTO cube_state (key, value) VALUES ('order_item_watermark', ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+            (value,),
+        )
+
+    def rebuild(self):
+        """Dựng lại sales_daily từ đầu (live + archive.daily_sales)."""
+        conn = self.conn
+        # ATTACH không chạy được trong transaction
+        has_archive = self.db.archive_horizon() is not None and self.db.attach_archive()
+        with self._lock:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                high = conn.execute("SELECT COALESCE(MAX(id), 0) FROM order_items").fetchone()[0]
+                conn.execute("DELETE FROM sales_daily")
+                self._upsert_lines(0, high)
+                if has_archive:
+                    conn.execute("""
+                                 INSERT INTO sales_daily (day, book_id, quantity, revenue)
+                                 SELECT day, book_id, quantity, total_amount FROM archive.daily_sales WHERE 1=1
+                                 ON CONFLICT (day, book_id) DO UPDATE SET
+                                     quantity = quantity + excluded.quantity,
+                                     revenue = revenue + excluded.revenue
+                                 """)
+                self._set_state(high)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            self._loaded = False
+
+    def _upsert_lines(self, low, high):
+        self.conn.execute("""
+                          INSERT INTO sales_daily (day, book_id, quantity, revenue)
+                          SELECT substr(o.created_at, 1, 10), oi.book_id, SUM(oi.quantity), SUM(oi.total)
+                          FROM order_items oi
+                                   JOIN orders o ON o.id = oi.order_id
+                          WHERE oi.id > ? AND oi.id <= ?
+                          GROUP BY substr(o.created_at, 1, 10), oi.book_id
+                          ON CONFLICT (day, book_id) DO UPDATE SET
+                              quantity = quantity + excluded.quantity,
+                              revenue = revenue + excluded.revenue
+                          """, (low, high))
+
+    def _apply_new_lines(self):
+        """Cộng các dòng order_items có id > watermark vào sales_daily."""
+        conn = self.conn
+        high = conn.execute("SELECT COALESCE(MAX(id), 0) FROM order_items").fetchone()[0]
+        if high <= self._state():
+            return
+        with self._lock:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Đọc lại trong transaction: tiến trình khác có thể vừa refresh xong
+                watermark = self._state()
+                high = conn.execute("SELECT COALESCE(MAX(id), 0) FROM order_items").fetchone()[0]
+                if high > watermark:
+                    self._upsert_lines(watermark, high)
+                    self._set_state(high)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def refresh(self):
+        """Cộng các dòng đơn mới vào sales_daily rồi cập nhật mảng trong bộ nhớ. True nếu có thay đổi."""
+        if self.db.read_only:
+            if not self._loaded:
+                self._load()
+            return False
+        if self._state() is None:
+            self.rebuild()
+        self._apply_new_lines()
+
+        # So với lần nạp trước (kể cả phần do tiến trình khác cộng vào)
+        stored = self._state()
+        changed = self._loaded and stored != self.watermark
+        if not self._loaded:
+            self._load()
+        elif changed:
+            self._load(self._changed_since(self.watermark))
+        else:
+            self._load_books()
+        return changed
+
+    def _changed_since(self, watermark):
+        """Ngày sớm nhất có dòng đơn id > watermark; None (nạp lại toàn bộ) nếu các dòng đó đã bị archive."""
+        return self.conn.execute(
+            "SELECT MIN(substr(o.created_at, 1, 10)) FROM order_items oi "
+            "JOIN orders o ON o.id = oi.order_id WHERE oi.id > ?",
+            (watermark,),
+        ).fetchone()[0]
+
+    # Arrays
+    def _load(self, from_day=None):
+        """Nạp sales_daily vào mảng; from_day: chỉ nạp lại từ ngày đó (ghép với phần cũ)."""
+        self.watermark = self._state()
+        query = "SELECT day, book_id, quantity, revenue FROM sales_daily"
+        params = ()
+        if from_day:
+            query += " WHERE day >= ?"
+            params = (from_day,)
+        rows = self.conn.execute(query, params).fetchall()
+        days = _to_days([r[0] for r in rows]) if rows else np.empty(0, dtype=np.int32)
+        books = np.fromiter((r[1] for r in rows), dtype=np.int64, count=len(rows))
+        qty = np.fromiter((r[2] for r in rows), dtype=np.int64, count=len(rows))
+        revenue = np.fromiter((r[3] for r in rows), dtype=np.int64, count=len(rows))
+
+        with self._lock:
+            if from_day and self._loaded:
+                keep = self.day < _to_days(from_day)
+                days = np.concatenate((self.day[keep], days))
+                books = np.concatenate((self.book[keep], books))
+                qty = np.concatenate((self.qty[keep], qty))
+                revenue = np.concatenate((self.revenue[keep], revenue))
+            self.day, self.book, self.qty, self.revenue = days, books, qty, revenue
+            self._loaded = True
+        self._load_books(force=not from_day)
+
+    def _load_books(self, force=False):
+        # add_book/delete_book đổi COUNT hoặc MAX(id); giá và genre không bị sửa trong app
+        fingerprint = tuple(self.conn.execute("SELECT COUNT(*), MAX(id) FROM books").fetchone())
+        size = int(max(fingerprint[1] or 0, int(self.book.max()) if len(self.book) else 0)) + 1
+        if not force and fingerprint == self._books_fingerprint and size <= len(self.buy_price):
+            return
+        rows = self.conn.execute("SELECT id, title, genre, buy_price FROM books").fetchall()
+        genres = sorted({r[2] or UNKNOWN_GENRE for r in rows} | {UNKNOWN_GENRE})
+        genre_index = {g: i for i, g in enumerate(genres)}
+
+        titles = [f"#{i} (deleted)" for i in range(size)]
+        genre_code = np.full(size, genre_index[UNKNOWN_GENRE], dtype=np.int32)
+        buy_price = np.zeros(size, dtype=np.int64)
+        for book_id, title, genre, buy in rows:
+            titles[book_id] = title
+            genre_code[book_id] = genre_index[genre or UNKNOWN_GENRE]
+            buy_price[book_id] = buy or 0
+
+        with self._lock:
+            self.genres, self.titles = genres, titles
+            self.genre_code, self.buy_price = genre_code, buy_price
+            self._books_fingerprint = fingerprint
+
+    def _mask(self, start=None, end=None, genre=None):
+        mask = np.ones(len(self.day), dtype=bool)
+        if start:
+            mask &= self.day >= _to_days(start[:10])
+        if end:
+            mask &= self.day <= _to_days(end[:10])
+        if genre:
+            if genre not in self.genres:
+                return np.zeros(len(self.day), dtype=bool)
+            mask &= self.genre_code[self.book] == self.genres.index(genre)
+        return mask
+
+    def _slice(self, start, end, genre=None):
+        """Các mảng (day, book, qty, revenue, profit) đã lọc."""
+        self.refresh()
+        with self._lock:
+            mask = self._mask(start, end, genre)
+            book = self.book[mask]
+            qty = self.qty[mask]
+            revenue = self.revenue[mask]
+            profit = revenue - qty * self.buy_price[book]
+            return self.day[mask], book, qty, revenue, profit
+
+    # Queries
+    def trend(self, grain="month", start=None, end=None, genre=None):
+        """Doanh thu/lợi nhuận theo từng bucket thời gian, theo thứ tự thời gian."""
+        days, _, qty, revenue, profit = self._slice(start, end, genre)
+        if not len(days):
+            return pd.DataFrame(columns=TREND_COLUMNS)
+        keys, inverse = np.unique(_bucket(days, grain), return_inverse=True)
+        return pd.DataFrame({
+            "period": [_bucket_label(k, grain) for k in keys],
+            "quantity": np.bincount(inverse, weights=qty).astype(np.int64),
+            "revenue": np.bincount(inverse, weights=revenue).astype(np.int64),
+            "profit": np.bincount(inverse, weights=profit).astype(np.int64),
+        })
+
+    def genre_share(self, start=None, end=None):
+        """Doanh thu theo genre và tỉ trọng trên tổng doanh thu."""
+        _, book, qty, revenue, profit = self._slice(start, end)
+        if not len(book):
+            return pd.DataFrame(columns=GENRE_COLUMNS)
+        codes = self.genre_code[book]
+        n = len(self.genres)
+        df = pd.DataFrame({
+            "genre": self.genres,
+            "quantity": np.bincount(codes, weights=qty, minlength=n).astype(np.int64),
+            "revenue": np.bincount(codes, weights=revenue, minlength=n).astype(np.int64),
+            "profit": np.bincount(codes, weights=profit, minlength=n).astype(np.int64),
+        })
+        df = df[df["quantity"] > 0].sort_values("revenue", ascending=False).reset_index(drop=True)
+        total = df["revenue"].sum()
+        df["share"] = df["revenue"] / total if total else 0.0
+        return df
+
+    def top_books(self, n=10, start=None, end=None, by="revenue", genre=None):
+        """Top-n sách theo by (revenue/quantity/profit), chọn bằng heap thay vì sort toàn bộ."""
+        if by not in ("revenue", "quantity", "profit"):
+            raise ValueError(f"Unknown measure {by!r}")
+        _, book, qty, revenue, profit = self._slice(start, end, genre)
+        if not len(book):
+            return pd.DataFrame(columns=BEST_SELLER_COLUMNS)
+        size = len(self.buy_price)
+        totals = {
+            "quantity": np.bincount(book, weights=qty, minlength=size),
+            "revenue": np.bincount(book, weights=revenue, minlength=size),
+            "profit": np.bincount(book, weights=profit, minlength=size),
+        }
+        sold = np.flatnonzero(totals["quantity"])
+        measure = totals[by]
+        top = heapq.nlargest(n, sold.tolist(), key=measure.__getitem__)
+        return pd.DataFrame({
+            "book_id": top,
+            "title": [self.titles[i] for i in top],
+            "genre": [self.genres[self.genre_code[i]] for i in top],
+            "quantity": totals["quantity"][top].astype(np.int64),
+            "revenue": totals["revenue"][top].astype(np.int64),
+            "profit": totals["profit"][top].astype(np.int64),
+        })
+
+    def compare_periods(self, start, end, by=None):
+        """
+        So sánh doanh thu [start, end] với khoảng liền trước có cùng độ dài.
+        by=None: một dòng tổng; by="genre": theo genre.
+        """
+        start_day, end_day = _to_days(start[:10]), _to_days(end[:10])
+        length = int(end_day - start_day) + 1
+        prev_start = str((start_day - length).astype("datetime64[D]"))
+        prev_end = str((start_day - 1).astype("datetime64[D]"))
+
+        def totals(s, e):
+            _, book, _, revenue, _ = self._slice(s, e)
+            if by == "genre":
+                return dict(zip(self.genres, np.bincount(self.genre_code[book], weights=revenue,
+                                                         minlength=len(self.genres))))
+            if by is not None:
+                raise ValueError(f"Unknown comparison key {by!r}")
+            return {"Total": revenue.sum()}
+
+        current, previous = totals(start, end), totals(prev_start, prev_end)
+        rows = []
+        for key in current:
+            cur, prev = int(current[key]), int(previous.get(key, 0))
+            if not cur and not prev:
+                continue
+            rows.append((key, cur, prev, (cur - prev) / prev * 100 if prev else None))
+        df = pd.DataFrame(rows, columns=COMPARE_COLUMNS)
+        return df.sort_values("revenue", ascending=False).reset_index(drop=True)
@@ -0,0 +1,203 @@
+"""
+Cảnh báo sắp hết hàng do trigger SQLite duy trì.
+
+    alerts = StockAlerts(db)
+    alerts.set_rule("genre", "Children", threshold=10, reorder_qty=30)
+    alerts.set_rule("book", 42, threshold=3)
+    alerts.low_stock()              # sách đang dưới ngưỡng + số lượng nên nhập
+    alerts.events(after=seq)        # sự kiện mới: low / out / ok / reset
+
+- Ngưỡng đặt theo sách, theo thể loại hoặc mặc định (ưu tiên theo thứ tự đó).
+- Trigger trên books chỉ làm việc khi tồn kho vượt qua ngưỡng (hoặc về 0): thêm/xoá một dòng
+  low_stock và ghi một sự kiện vào stock_events. Lần bán bình thường chỉ tốn phần điều kiện WHEN.
+- UI kiểm tra data_version (rẻ) rồi mới đọc các sự kiện có seq mới, không nạp lại cả kho.
+"""
+import sqlite3
+
+DEFAULT_THRESHOLD = 5
+EVENT_KINDS = ("low", "out", "ok", "reset")
+LOW_STOCK_COLUMNS = ["book_id", "title", "genre", "stock", "threshold", "reorder_qty", "since"]
+EVENT_COLUMNS = ["seq", "book_id", "kind", "stock", "threshold", "created_at"]
+
+# Ngưỡng hiệu lực của một dòng books (NEW/OLD)
+_THRESHOLD = """COALESCE(
+    (SELECT threshold FROM reorder_rules WHERE scope = 'book' AND key = CAST({row}.id AS TEXT)),
+    (SELECT threshold FROM reorder_rules WHERE scope = 'genre' AND key = {row}.genre),
+    (SELECT threshold FROM reorder_rules WHERE scope = 'default' AND key = ''),
+    {default})"""
+
+
+def _threshold(row="NEW"):
+    return _THRESHOLD.format(row=row, default=DEFAULT_THRESHOLD)
+
+
+def _kind(row="NEW"):
+    return f"CASE WHEN {row}.stock <= 0 THEN 'out' WHEN {row}.stock <= {_threshold(row)} THEN 'low' ELSE 'ok' END"
+
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS reorder_rules (
+        scope TEXT NOT NULL,
+        key TEXT NOT NULL,
+        threshold INTEGER NOT NULL,
+        reorder_qty INTEGER,
+        PRIMARY KEY (scope, key)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS low_stock (
+        book_id INTEGER PRIMARY KEY,
+        since TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS stock_events (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        book_id INTEGER,
+        kind TEXT,
+        stock INTEGER,
+        threshold INTEGER,
+        created_at TEXT
+    )
+    """,
+    # Chỉ chạy khi trạng thái (ok / low / out) thay đổi
+    f"""
+    CREATE TRIGGER IF NOT EXISTS stock_alert_update AFTER UPDATE OF stock, genre ON books
+    WHEN {_kind("NEW")} IS NOT {_kind("OLD")}
+    BEGIN
+        INSERT OR IGNORE INTO low_stock (book_id, since)
+        SELECT NEW.id, datetime('now', 'localtime') WHERE NEW.stock <= {_threshold()};
+        DELETE FROM low_stock WHERE book_id = NEW.id AND NEW.stock > {_threshold()};
+        INSERT INTO stock_events (book_id, kind, stock, threshold, created_at)
+        VALUES (NEW.id, {_kind()}, NEW.stock, {_threshold()}, datetime('now', 'localtime'));
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS stock_alert_insert AFTER INSERT ON books
+    WHEN NEW.stock <= {_threshold()}
+    BEGIN
+        INSERT OR IGNORE INTO low_stock (book_id, since) VALUES (NEW.id, datetime('now', 'localtime'));
+        INSERT INTO stock_events (book_id, kind, stock, threshold, created_at)
+        VALUES (NEW.id, {_kind()}, NEW.stock, {_threshold()}, datetime('now', 'localtime'));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS stock_alert_delete AFTER DELETE ON books
+    WHEN OLD.id IN (SELECT book_id FROM low_stock)
+    BEGIN
+        DELETE FROM low_stock WHERE book_id = OLD.id;
+        INSERT INTO stock_events (book_id, kind, stock, threshold, created_at)
+        VALUES (OLD.id, 'ok', NULL, NULL, datetime('now', 'localtime'));
+    END
+    """,
+]
+
+
+class StockAlerts:
+    def __init__(self, db):
+        self.db = db
+        self.conn = db.conn
+        if not db.read_only:
+            with self.conn:
+                new = self.conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'low_stock'"
+                ).fetchone() is None
+                for statement in SCHEMA:
+                    self.conn.execute(statement)
+            if new:
+                self.rebuild()
+
+    def rebuild(self):
+        """Tính lại cả tập low_stock (sau khi đổi ngưỡng); phát sự kiện 'reset' để UI nạp lại danh sách."""
+        with self.conn:
+            self.conn.execute("DELETE FROM low_stock")
+            self.conn.execute(f"""
+                INSERT INTO low_stock (book_id, since)
+                SELECT b.id, datetime('now', 'localtime') FROM books b WHERE b.stock <= {_threshold("b")}
+            """)
+            self.conn.execute(
+                "INSERT INTO stock_events (kind, created_at) VALUES ('reset', datetime('now', 'localtime'))"
+            )
+
+    # Rules
+    def set_rule(self, scope, key=None, threshold=DEFAULT_THRESHOLD, reorder_qty=None):
+        """scope: 'book' (key = book_id), 'genre' (key = thể loại) hoặc 'default'."""
+        if scope not in ("book", "genre", "default"):
+            raise ValueError(f"Unknown scope {scope!r}, expected book, genre or default")
+        if int(threshold) < 0:
+            raise ValueError("Threshold must be >= 0")
+        key = "" if scope == "default" else str(key)
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO reorder_rules (scope, key, threshold, reorder_qty) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (scope, key) DO UPDATE SET threshold = excluded.threshold, "
+                "reorder_qty = excluded.reorder_qty",
+                (scope, key, int(threshold), reorder_qty),
+            )
+        self.rebuild()
+
+    def remove_rule(self, scope, key=None):
+        key = "" if scope == "default" else str(key)
+        with self.conn:
+            self.conn.execute("DELETE FROM reorder_rules WHERE scope = ? AND key = ?", (scope, key))
+        self.rebuild()
+
+    def rules(self):
+        return [dict(row) for row in self.conn.execute(
+            "SELECT scope, key, threshold, reorder_qty FROM reorder_rules ORDER BY scope, key")]
+
+    # Queries
+    def low_stock(self):
+        """Sách đang dưới ngưỡng, hết hàng trước; reorder_qty theo luật hoặc đủ lên gấp đôi ngưỡng."""
+        try:
+            rows = self.conn.execute(f"""
+                SELECT b.id, b.title, b.genre, b.stock, {_threshold("b")} AS threshold,
+                       COALESCE(
+                           (SELECT reorder_qty FROM reorder_rules WHERE scope = 'book' AND key = CAST(b.id AS TEXT)),
+                           (SELECT reorder_qty FROM reorder_rules WHERE scope = 'genre' AND key = b.genre),
+                           (SELECT reorder_qty FROM reorder_rules WHERE scope = 'default' AND key = '')
+                       ) AS reorder_qty,
+                       l.since
+                FROM low_stock l CROSS JOIN books b ON b.id = l.book_id  -- duyệt tập nhỏ low_stock, không quét books
+                ORDER BY b.stock, b.title
+            """).fetchall()
+        except sqlite3.OperationalError:
+            return []  # database read-only chưa có bảng cảnh báo
+        result = []
+        for book_id, title, genre, stock, threshold, reorder_qty, since in rows:
+            result.append({
+                "book_id": book_id, "title": title, "genre": genre, "stock": stock, "threshold": threshold,
+                "reorder_qty": reorder_qty or max(threshold * 2 - stock, 1), "since": since,
+            })
+        return result
+
+    def count(self):
+        try:
+            return self.conn.execute("SELECT COUNT(*) FROM low_stock").fetchone()[0]
+        except sqlite3.OperationalError:
+            return 0
+
+    def events(self, after=0, limit=200):
+        """Sự kiện có seq > after (theo thứ tự)."""
+        try:
+            rows = self.conn.execute(
+                "SELECT seq, book_id, kind, stock, threshold, created_at FROM stock_events "
+                "WHERE seq > ? ORDER BY seq LIMIT ?", (after, limit)
+            ).fetchall()
+        except sqlite3.OperationalError:
+            return []
+        return [dict(zip(EVENT_COLUMNS, row)) for row in rows]
+
+    def last_seq(self):
+        try:
+            return self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM stock_events").fetchone()[0]
+        except sqlite3.OperationalError:
+            return 0
+
+    def prune_events(self, keep=10_000):
+        """Giữ keep sự kiện mới nhất."""
+        with self.conn:
+            return self.conn.execute(
+                "DELETE FROM stock_events WHERE seq <= (SELECT COALESCE(MAX(seq), 0) FROM stock_events) - ?", (keep,)
+            ).rowcount
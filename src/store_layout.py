@@ -0,0 +1,158 @@
+"""
+Sơ đồ cửa hàng và vị trí sách có cấu trúc: khu (zone) / dãy (aisle) / tầng kệ (shelf) / ô (slot).
+
+    layout = StoreLayout.load("store_layout.json")
+    parse_location("B-03-2-07")         # Location(zone="B", aisle=3, shelf=2, slot=7)
+    layout.locate("Shelf 3")            # vị trí cũ dạng chữ: legacy_shelves của layout, không có thì theo số kệ
+    layout.distance_matrix()            # khoảng cách đi bộ (m) giữa quầy và mọi ô, tính một lần
+
+File layout (BOOKSTORE_LAYOUT, mặc định store_layout.json; không có file thì dùng DEFAULT_LAYOUT):
+{
+  "depot": [0, 0],                                  # quầy: điểm bắt đầu / kết thúc lượt lấy hàng
+  "zones": {"A": {"origin": [2, 2], "aisles": 5, "aisle_spacing": 3, "slots": 10, "slot_length": 1}},
+  "legacy_shelves": {"Shelf 1": "A-01-1-05"}
+}
+- "Shelf N" không có trong legacy_shelves: kệ N nằm ở dãy thứ (N - 1) mod số dãy (đếm qua mọi khu),
+  các kệ cùng dãy xếp lần lượt từ giữa dãy; vị trí cũ nào cũng đặt được, kể cả dữ liệu sinh có 40 kệ.
+- Dãy là lối đi thẳng, có lối ngang ở đầu (origin) và cuối dãy; ô thứ s nằm cách đầu dãy (s - 0.5) * slot_length.
+- Đổi dãy đi qua lối ngang gần hơn (đầu hoặc cuối); đổi khu đi qua lối ngang đầu khu. Tầng kệ không
+  ảnh hưởng quãng đường.
+"""
+import json
+import os
+import re
+from collections import namedtuple
+
+import numpy as np
+
+DEFAULT_LAYOUT_PATH = os.getenv("BOOKSTORE_LAYOUT", "store_layout.json")
+
+# Cửa hàng một khu, 5 dãy; "Shelf 1".."Shelf 5" (dữ liệu cũ) là giữa dãy 1..5, Shelf 6 ô kế tiếp của dãy 1...
+DEFAULT_LAYOUT = {
+    "depot": [0, 0],
+    "zones": {"A": {"origin": [2, 2], "aisles": 5, "aisle_spacing": 3, "slots": 10, "slot_length": 1}},
+}
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS book_locations (
+        book_id INTEGER PRIMARY KEY,
+        zone TEXT NOT NULL,
+        aisle INTEGER NOT NULL,
+        shelf INTEGER NOT NULL,
+        slot INTEGER NOT NULL,
+        FOREIGN KEY(book_id) REFERENCES books(id) ON DELETE CASCADE
+    )
+    """,
+]
+
+_LOCATION = re.compile(r"^\s*([A-Za-z]+)\s*[-/ ]\s*(\d+)\s*[-/ ]\s*(\d+)\s*[-/ ]\s*(\d+)\s*$")
+_LEGACY_SHELF = re.compile(r"^\s*shelf\s*#?\s*(\d+)\s*$", re.IGNORECASE)
+
+
+class Location(namedtuple("Location", "zone aisle shelf slot")):
+    __slots__ = ()
+
+    def __str__(self):
+        return f"{self.zone}-{self.aisle:02d}-{self.shelf}-{self.slot:02d}"
+
+
+def parse_location(text):
+    """"B-03-2-07" / "B/3/2/7" -> Location; chuỗi khác -> None."""
+    match = _LOCATION.match(text or "")
+    if not match:
+        return None
+    zone, aisle, shelf, slot = match.groups()
+    return Location(zone.upper(), int(aisle), int(shelf), int(slot))
+
+
+class StoreLayout:
+    def __init__(self, data=None):
+        data = data or DEFAULT_LAYOUT
+        self.depot = tuple(data.get("depot", (0, 0)))
+        self.zones = data["zones"]
+        self.legacy = {k.strip().lower(): v for k, v in data.get("legacy_shelves", {}).items()}
+        self._nodes = None
+        self._matrix = None
+
+    @classmethod
+    def load(cls, path=None):
+        path = path or DEFAULT_LAYOUT_PATH
+        if not os.path.exists(path):
+            return cls()
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def locate(self, text):
+        """Vị trí có cấu trúc từ shelf_position (dạng mới hoặc tên kệ cũ); None nếu không đặt được."""
+        location = parse_location(text)
+        if location is None and text:
+            location = parse_location(self.legacy.get(text.strip().lower()))
+        if location is None and text:
+            match = _LEGACY_SHELF.match(text)
+            if match:
+                location = self.legacy_shelf(int(match.group(1)))
+        return location if self.contains(location) else None
+
+    def legacy_shelf(self, number):
+        """Vị trí của "Shelf number": dãy thứ (number - 1) mod số dãy, các kệ cùng dãy xếp từ giữa dãy."""
+        aisles = [(name, aisle) for name in sorted(self.zones) for aisle in range(1, self.zones[name]["aisles"] + 1)]
+        if number < 1 or not aisles:
+            return None
+        zone, aisle = aisles[(number - 1) % len(aisles)]
+        slots = self.zones[zone]["slots"]
+        return Location(zone, aisle, 1, (slots // 2 - 1 + (number - 1) // len(aisles)) % slots + 1)
+
+    def contains(self, location):
+        if location is None or location.zone not in self.zones:
+            return False
+        zone = self.zones[location.zone]
+        return 1 <= location.aisle <= zone["aisles"] and 1 <= location.slot <= zone["slots"]
+
+    def node(self, location):
+        """Chỉ số của ô trong distance_matrix (0 là quầy)."""
+        self._build_nodes()
+        return self._nodes[(location.zone, location.aisle, location.slot)]
+
+    def _build_nodes(self):
+        if self._nodes is not None:
+            return
+        # Mỗi điểm: toạ độ (x, y), lối ngang đầu / cuối dãy, khu và dãy chứa nó (-1: quầy)
+        x, y, front, back = [self.depot[0]], [self.depot[1]], [self.depot[1]], [self.depot[1]]
+        zone_ids, aisle_ids = [-1], [-1]
+        nodes = {}
+        for zone_id, zone_name in enumerate(sorted(self.zones)):
+            zone = self.zones[zone_name]
+            ox, oy = zone["origin"]
+            length = zone.get("slot_length", 1)
+            for aisle in range(1, zone["aisles"] + 1):
+                aisle_id = len(set(aisle_ids))
+                for slot in range(1, zone["slots"] + 1):
+                    nodes[(zone_name, aisle, slot)] = len(x)
+                    x.append(ox + (aisle - 1) * zone.get("aisle_spacing", 3))
+                    y.append(oy + (slot - 0.5) * length)
+                    front.append(oy)
+                    back.append(oy + zone["slots"] * length)
+                    zone_ids.append(zone_id)
+                    aisle_ids.append(aisle_id)
+        self._nodes = nodes
+        self._coords = [np.array(v, dtype=float) for v in (x, y, front, back, zone_ids)]
+        self._aisles = np.array(aisle_ids)
+
+    def distance_matrix(self):
+        """Ma trận khoảng cách đi bộ giữa mọi điểm (quầy + các ô), tính một lần cho cả layout."""
+        if self._matrix is None:
+            self._build_nodes()
+            x, y, front, back, zone = self._coords
+            dx = np.abs(x[:, None] - x[None, :])
+            same_aisle = (self._aisles[:, None] == self._aisles[None, :]) & (self._aisles >= 0)[:, None]
+            same_zone = (zone[:, None] == zone[None, :]) & (zone >= 0)[:, None]
+            # Cùng khu, khác dãy: ra lối ngang đầu hoặc cuối, chọn đường ngắn hơn
+            via_front = (y[:, None] - front[:, None]) + (y[None, :] - front[None, :])
+            via_back = (back[:, None] - y[:, None]) + (back[None, :] - y[None, :])
+            within = dx + np.minimum(via_front, via_back)
+            # Khác khu (hoặc từ quầy): ra đầu dãy, đi thẳng góc tới đầu dãy kia
+            across = via_front + dx + np.abs(front[:, None] - front[None, :])
+            self._matrix = np.where(same_aisle, np.abs(y[:, None] - y[None, :]),
+                                    np.where(same_zone, within, across))
+        return self._matrix
@@ -0,0 +1,466 @@
+"""
+Đồng bộ quầy offline với database trung tâm qua change journal.
+
+    python sync_engine.py --db till.db --central central.db --name till-1 sync
+    python sync_engine.py --db till.db --central http://server:8765 --name till-1 sync
+
+    engine = SyncEngine("till.db", LocalCentral("central.db"), "till-1")
+    engine.sync()        # {"pushed": 12, "pulled": 3}
+
+- Trigger trên books/orders/order_items ghi mỗi thay đổi vào change_journal (seq tăng dần, không
+  dùng lại). Đơn hàng là bất biến sau khi tạo nên chỉ ghi INSERT; xoá đơn (archive) là việc riêng
+  của từng quầy và không được đồng bộ.
+- Tồn kho được ghi dưới dạng delta (NEW.stock - OLD.stock) và áp dụng bằng stock = stock + delta,
+  nên thứ tự áp dụng giữa các quầy không quan trọng. Các trường khác chỉ gửi phần đã đổi
+  (ghi sau thắng).
+- Push: quầy gửi các bản ghi do chính nó tạo (origin = '') sau mốc sent_seq; trung tâm áp dụng cả lô
+  và cập nhật received_seq trong cùng một transaction, lô gửi lại được bỏ qua (idempotent).
+- Pull: quầy nhận thay đổi sách của trung tâm (kể cả từ quầy khác), trừ các thay đổi do chính nó gửi lên.
+- Sách tạo mới ở một bên có id khác ở bên kia: sync_id_map giữ ánh xạ; sách có sẵn từ bản sao ban đầu
+  dùng chung id.
+- Chi phí mỗi lần sync tỉ lệ với số thay đổi từ lần trước (đọc journal theo seq), không với kích thước database.
+"""
+import argparse
+import json
+import logging
+import sqlite3
+import threading
+
+from cache_utils import bump_table_versions
+
+BOOK_FIELDS = ("title", "author", "genre", "description", "shelf_position", "buy_price", "sell_price")
+ORDER_FIELDS = ("id", "total_qty", "total_amount", "created_at")
+ORDER_ITEM_FIELDS = ("order_id", "book_id", "quantity", "unit_price", "total")
+BATCH_SIZE = 500
+CENTRAL = "central"  # tên của trung tâm trong sync_peers / sync_id_map của quầy
+
+_ORIGIN = "COALESCE((SELECT origin FROM sync_session), '')"
+
+
+def _json_object(fields, prefix="NEW"):
+    return "json_object(" + ", ".join(f"'{f}', {prefix}.{f}" for f in fields) + ")"
+
+
+def _changed_books():
+    """JSON chỉ gồm các trường (trừ stock) đã đổi trong UPDATE."""
+    parts = " UNION ALL ".join(f"SELECT '{f}' AS k, NEW.{f} AS v WHERE NEW.{f} IS NOT OLD.{f}" for f in BOOK_FIELDS)
+    return f"(SELECT json_group_object(k, v) FROM ({parts}))"
+
+
+JOURNAL_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS change_journal (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        tbl TEXT NOT NULL,
+        op TEXT NOT NULL,
+        row_key,
+        data TEXT,
+        stock_delta INTEGER NOT NULL DEFAULT 0,
+        origin TEXT NOT NULL DEFAULT ''
+    )
+    """,
+    # Có một dòng trong lúc đang áp dụng thay đổi của peer: trigger ghi origin = peer
+    "CREATE TABLE IF NOT EXISTS sync_session (origin TEXT)",
+    """
+    CREATE TABLE IF NOT EXISTS sync_peers (
+        peer TEXT PRIMARY KEY,
+        sent_seq INTEGER NOT NULL DEFAULT 0,
+        received_seq INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS sync_id_map (
+        peer TEXT,
+        tbl TEXT,
+        remote_id,
+        local_id,
+        PRIMARY KEY (peer, tbl, remote_id)
+    ) WITHOUT ROWID
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS journal_books_insert AFTER INSERT ON books
+    BEGIN
+        INSERT INTO change_journal (tbl, op, row_key, data, stock_delta, origin)
+        VALUES ('books', 'I', NEW.id, {_json_object(BOOK_FIELDS + ("stock",))}, 0, {_ORIGIN});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS journal_books_update AFTER UPDATE ON books
+    WHEN NEW.stock IS NOT OLD.stock OR {" OR ".join(f"NEW.{f} IS NOT OLD.{f}" for f in BOOK_FIELDS)}
+    BEGIN
+        INSERT INTO change_journal (tbl, op, row_key, data, stock_delta, origin)
+        VALUES ('books', 'U', NEW.id, {_changed_books()},
+                COALESCE(NEW.stock, 0) - COALESCE(OLD.stock, 0), {_ORIGIN});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS journal_books_delete AFTER DELETE ON books
+    BEGIN
+        INSERT INTO change_journal (tbl, op, row_key, origin) VALUES ('books', 'D', OLD.id, {_ORIGIN});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS journal_orders_insert AFTER INSERT ON orders
+    BEGIN
+        INSERT INTO change_journal (tbl, op, row_key, data, origin)
+        VALUES ('orders', 'I', NEW.id, {_json_object(ORDER_FIELDS)}, {_ORIGIN});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS journal_order_items_insert AFTER INSERT ON order_items
+    BEGIN
+        INSERT INTO change_journal (tbl, op, row_key, data, origin)
+        VALUES ('order_items', 'I', NEW.id, {_json_object(ORDER_ITEM_FIELDS)}, {_ORIGIN});
+    END
+    """,
+]
+
+
+def install_journal(conn):
+    """Tạo journal + trigger (idempotent). Database phải đã có các bảng của DatabaseManager."""
+    with conn:
+        for statement in JOURNAL_SCHEMA:
+            conn.execute(statement)
+
+
+def prune_journal(conn):
+    """
+    Xoá bản ghi journal mà mọi peer đã xác nhận (seq <= MIN(sent_seq) của sync_peers); gọi trong transaction.
+    Ở quầy (peer duy nhất là trung tâm) cũng xoá các thay đổi nhận về, không bao giờ gửi lại.
+    Trả về số dòng đã xoá; 0 nếu database không đồng bộ.
+    """
+    try:
+        peers = dict(conn.execute("SELECT peer, sent_seq FROM sync_peers").fetchall())
+    except sqlite3.OperationalError:
+        return 0
+    if not peers:
+        return 0
+    if set(peers) == {CENTRAL}:
+        return conn.execute("DELETE FROM change_journal WHERE seq <= ? OR origin <> ''", (peers[CENTRAL],)).rowcount
+    return conn.execute("DELETE FROM change_journal WHERE seq <= ?", (min(peers.values()),)).rowcount
+
+
+def _peer_state(conn, peer):
+    conn.execute("INSERT OR IGNORE INTO sync_peers (peer) VALUES (?)", (peer,))
+    return conn.execute("SELECT sent_seq, received_seq FROM sync_peers WHERE peer = ?", (peer,)).fetchone()
+
+
+def read_journal(conn, after, limit=BATCH_SIZE, origin=None, exclude_origin=None, tables=None):
+    """
+    Các bản ghi journal sau seq `after` (tối đa limit dòng đọc), lọc theo origin/tables.
+    Trả về (entries, last_seq): last_seq là seq cuối đã đọc, kể cả khi dòng đó bị lọc bỏ.
+    """
+    rows = conn.execute(
+        "SELECT seq, tbl, op, row_key, data, stock_delta, origin FROM change_journal WHERE seq > ? ORDER BY seq LIMIT ?",
+        (after, limit),
+    ).fetchall()
+    entries = [
+        [seq, tbl, op, key, json.loads(data) if data else None, delta]
+        for seq, tbl, op, key, data, delta, row_origin in rows
+        if (origin is None or row_origin == origin)
+        and (exclude_origin is None or row_origin != exclude_origin)
+        and (tables is None or tbl in tables)
+    ]
+    return entries, rows[-1][0] if rows else after
+
+
+def compact(entries):
+    """Gộp các UPDATE liên tiếp của cùng một sách (cộng delta, giữ giá trị trường mới nhất)."""
+    result = []
+    last = {}  # book id -> vị trí bản ghi cuối của sách đó trong result
+    for entry in entries:
+        seq, table, op, key, data, delta = entry
+        if table == "books":
+            index = last.get(key)
+            if op == "U" and index is not None and result[index][2] == "U":
+                merged = result[index]
+                merged[4] = {**(merged[4] or {}), **(data or {})}
+                merged[5] += delta
+                merged[0] = seq
+                continue
+            last[key] = len(result)
+        result.append(list(entry))
+    return result
+
+
+def _local_id(conn, peer, table, remote_id):
+    row = conn.execute(
+        "SELECT local_id FROM sync_id_map WHERE peer = ? AND tbl = ? AND remote_id = ?", (peer, table, remote_id)
+    ).fetchone()
+    return row[0] if row else remote_id
+
+
+def _map_id(conn, peer, table, remote_id, local_id):
+    conn.execute(
+        "INSERT OR REPLACE INTO sync_id_map (peer, tbl, remote_id, local_id) VALUES (?, ?, ?, ?)",
+        (peer, table, remote_id, local_id),
+    )
+
+
+def apply_entries(conn, peer, entries):
+    """
+    Áp dụng các bản ghi journal của peer trong transaction đang mở.
+    Trả về {id sách bên peer: id sách tại đây} cho các sách vừa được tạo.
+    """
+    new_books = {}
+    skipped_orders = set()
+    conn.execute("DELETE FROM sync_session")
+    conn.execute("INSERT INTO sync_session (origin) VALUES (?)", (peer,))
+    for seq, table, op, key, data, delta in entries:
+        if table == "books":
+            if op == "I":
+                exists = conn.execute(
+                    "SELECT 1 FROM sync_id_map WHERE peer = ? AND tbl = 'books' AND remote_id = ?", (peer, key)
+                ).fetchone()
+                if exists:
+                    continue
+                fields = BOOK_FIELDS + ("stock",)
+                cursor = conn.execute(
+                    f"INSERT INTO books ({', '.join(fields)}) VALUES ({', '.join('?' * len(fields))})",
+                    [data.get(f) for f in fields],
+                )
+                _map_id(conn, peer, "books", key, cursor.lastrowid)
+                new_books[key] = cursor.lastrowid
+            elif op == "U":
+                changes = {f: v for f, v in (data or {}).items() if f in BOOK_FIELDS}
+                sets = [f"{f} = ?" for f in changes]
+                params = list(changes.values())
+                if delta:
+                    sets.append("stock = stock + ?")
+                    params.append(delta)
+                if sets:
+                    conn.execute(f"UPDATE books SET {', '.join(sets)} WHERE id = ?",
+                                 params + [_local_id(conn, peer, "books", key)])
+            elif op == "D":
+                conn.execute("DELETE FROM books WHERE id = ?", (_local_id(conn, peer, "books", key),))
+                conn.execute("DELETE FROM sync_id_map WHERE peer = ? AND tbl = 'books' AND remote_id = ?",
+                             (peer, key))
+        elif table == "orders" and op == "I":
+            order_id = key
+            existing = conn.execute(
+                "SELECT total_qty, total_amount, created_at FROM orders WHERE id = ?", (order_id,)
+            ).fetchone()
+            if existing:
+                if tuple(existing) == (data["total_qty"], data["total_amount"], data["created_at"]):
+                    skipped_orders.add(key)  # đã có (cùng nội dung): bỏ qua cả các dòng của đơn
+                    continue
+                # Trùng mã với đơn khác: giữ đơn của peer dưới mã có tiền tố peer
+                order_id = f"{peer}-{key}"
+                _map_id(conn, peer, "orders", key, order_id)
+            conn.execute(
+                "INSERT OR IGNORE INTO orders (id, total_qty, total_amount, created_at) VALUES (?, ?, ?, ?)",
+                (order_id, data["total_qty"], data["total_amount"], data["created_at"]),
+            )
+        elif table == "order_items" and op == "I":
+            if data["order_id"] in skipped_orders:
+                continue
+            conn.execute(
+                "INSERT INTO order_items (order_id, book_id, quantity, unit_price, total) VALUES (?, ?, ?, ?, ?)",
+                (_local_id(conn, peer, "orders", data["order_id"]), _local_id(conn, peer, "books", data["book_id"]),
+                 data["quantity"], data["unit_price"], data["total"]),
+            )
+    conn.execute("DELETE FROM sync_session")
+    bump_table_versions(conn, *{entry[1] for entry in entries})
+    return new_books
+
+
+class LocalCentral:
+    """Database trung tâm là một file SQLite (cùng máy hoặc trong api_server)."""
+
+    def __init__(self, path_or_conn, lock=None):
+        if isinstance(path_or_conn, sqlite3.Connection):
+            self.conn = path_or_conn
+        else:
+            from database_manager import DatabaseManager
+            self.conn = DatabaseManager(path_or_conn).conn
+        self._lock = lock or threading.Lock()
+        install_journal(self.conn)
+
+    def register(self, peer):
+        """Quầy mới được sao từ trung tâm: chỉ cần nhận các thay đổi sau thời điểm này."""
+        with self._lock, self.conn:
+            _peer_state(self.conn, peer)
+            high = self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM change_journal").fetchone()[0]
+            self.conn.execute("UPDATE sync_peers SET sent_seq = ? WHERE peer = ?", (high, peer))
+        return high
+
+    def push(self, peer, entries, last_seq):
+        """Nhận một lô từ peer. Bản ghi có seq <= received_seq đã được áp dụng trước đó và bị bỏ qua."""
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                _, received = _peer_state(self.conn, peer)
+                new_books = apply_entries(self.conn, peer, [e for e in entries if e[0] > received])
+                received = max(received, last_seq)
+                self.conn.execute("UPDATE sync_peers SET received_seq = ? WHERE peer = ?", (received, peer))
+                oversold = self._oversold(peer, entries)
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+        return {"received_seq": received, "book_ids": {str(k): v for k, v in new_books.items()}, "oversold": oversold}
+
+    def _oversold(self, peer, entries):
+        """Sách bị bán quá tồn kho sau khi cộng delta của lô này (các quầy cùng bán khi offline)."""
+        sold = {_local_id(self.conn, peer, "books", e[3]) for e in entries if e[1] == "books" and e[5] < 0}
+        if not sold:
+            return []
+        placeholders = ", ".join("?" * len(sold))
+        return [row[0] for row in self.conn.execute(
+            f"SELECT id FROM books WHERE id IN ({placeholders}) AND stock < 0", list(sold))]
+
+    def pull(self, peer, after, limit=BATCH_SIZE, tables=("books",)):
+        """Thay đổi sau seq `after` (trừ các thay đổi do chính peer gửi lên); after cũng là xác nhận đã nhận."""
+        with self._lock, self.conn:
+            _peer_state(self.conn, peer)
+            self.conn.execute("UPDATE sync_peers SET sent_seq = MAX(sent_seq, ?) WHERE peer = ?", (after, peer))
+            entries, last_seq = read_journal(self.conn, after, limit, exclude_origin=peer, tables=tables)
+        return {"entries": compact(entries), "last_seq": last_seq}
+
+    def prune(self):
+        """Xoá bản ghi journal mà mọi quầy đã nhận."""
+        with self._lock, self.conn:
+            return prune_journal(self.conn)
+
+
+class RemoteCentral:
+    """Trung tâm qua api_server (/sync/push, /sync/pull)."""
+
+    def __init__(self, base_url, timeout=30):
+        import requests
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def _post(self, path, body):
+        response = self.session.post(f"{self.base_url}{path}", json=body, timeout=self.timeout)
+        if response.status_code >= 400:
+            raise RuntimeError(f"Sync error {response.status_code}: {response.text}")
+        return response.json()
+
+    def register(self, peer):
+        return self._post("/sync/register", {"peer": peer})["sent_seq"]
+
+    def push(self, peer, entries, last_seq):
+        return self._post("/sync/push", {"peer": peer, "entries": entries, "last_seq": last_seq})
+
+    def pull(self, peer, after, limit=BATCH_SIZE, tables=("books",)):
+        return self._post("/sync/pull", {"peer": peer, "after": after, "limit": limit, "tables": list(tables)})
+
+
+class SyncEngine:
+    def __init__(self, db_path, central, name, batch_size=BATCH_SIZE):
+        from database_manager import DatabaseManager
+        self.db = DatabaseManager(db_path)
+        self.conn = self.db.conn
+        self.central = central
+        self.name = name
+        self.batch_size = batch_size
+        install_journal(self.conn)
+
+    def register(self):
+        """Gọi một lần sau khi sao database trung tâm về quầy: bắt đầu nhận thay đổi từ thời điểm này."""
+        high = self.central.register(self.name)
+        with self.conn:
+            _peer_state(self.conn, CENTRAL)
+            self.conn.execute("UPDATE sync_peers SET received_seq = ? WHERE peer = ?", (high, CENTRAL))
+        return high
+
+    def push(self):
+        """Gửi các thay đổi của quầy theo lô; trả về số bản ghi đã gửi."""
+        sent = 0
+        while True:
+            with self.conn:
+                after, _ = _peer_state(self.conn, CENTRAL)
+            entries, last_seq = read_journal(self.conn, after, self.batch_size, origin="")
+            if last_seq == after:
+                return sent
+            entries = compact(entries)
+            if entries:
+                result = self.central.push(self.name, entries, last_seq)
+                last_seq = result["received_seq"]
+                sent += len(entries)
+                if result["oversold"]:
+                    logging.warning(f"Oversold at central after sync: books {result['oversold']}")
+            else:
+                result = {"book_ids": {}}
+            with self.conn:
+                # Sách tạo ở quầy nhận id mới ở trung tâm: ghi nhớ để hiểu thay đổi trung tâm gửi về
+                for local_id, central_id in result["book_ids"].items():
+                    _map_id(self.conn, CENTRAL, "books", central_id, int(local_id))
+                self.conn.execute("UPDATE sync_peers SET sent_seq = ? WHERE peer = ?", (last_seq, CENTRAL))
+
+    def pull(self):
+        """Nhận thay đổi sách từ trung tâm theo lô; trả về số bản ghi đã áp dụng."""
+        received = 0
+        while True:
+            with self.conn:
+                _, after = _peer_state(self.conn, CENTRAL)
+            result = self.central.pull(self.name, after, self.batch_size)
+            if result["last_seq"] == after:
+                return received
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                apply_entries(self.conn, CENTRAL, result["entries"])
+                self.conn.execute("UPDATE sync_peers SET received_seq = ? WHERE peer = ?", (result["last_seq"], CENTRAL))
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+            received += len(result["entries"])
+
+    def sync(self):
+        return {"pushed": self.push(), "pulled": self.pull()}
+
+    def prune(self):
+        """Xoá bản ghi journal đã gửi lên trung tâm (và các thay đổi nhận về, không cần gửi lại)."""
+        with self.conn:
+            _peer_state(self.conn, CENTRAL)
+            return prune_journal(self.conn)
+
+    def pending(self):
+        """Số thay đổi của quầy chưa gửi lên trung tâm."""
+        with self.conn:
+            sent, _ = _peer_state(self.conn, CENTRAL)
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM change_journal WHERE seq > ? AND origin = ''", (sent,)
+        ).fetchone()[0]
+
+    def close(self):
+        self.db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync an offline till with the central database")
+    parser.add_argument("--db", default="bookstore.db")
+    parser.add_argument("--central", required=True, help="central database file or API server URL")
+    parser.add_argument("--name", required=True, help="unique name of this till")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("command", choices=("register", "sync", "push", "pull", "status", "prune"))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    if args.central.startswith(("http://", "https://")):
+        central = RemoteCentral(args.central)
+    else:
+        central = LocalCentral(args.central)
+    engine = SyncEngine(args.db, central, args.name, args.batch_size)
+    try:
+        if args.command == "register":
+            print(f"Registered {args.name} at central seq {engine.register()}")
+        elif args.command == "sync":
+            print(engine.sync())
+        elif args.command == "push":
+            print(f"Pushed {engine.push()} changes")
+        elif args.command == "pull":
+            print(f"Pulled {engine.pull()} changes")
+        elif args.command == "status":
+            print(f"{engine.pending()} changes waiting to be pushed")
+        else:
+            print(f"Pruned {engine.prune()} journal entries")
+    finally:
+        engine.close()
+
+
+if __name__ == "__main__":
+    main()
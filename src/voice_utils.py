@@ -1,8 +1,11 @@
 import logging
+import queue
+import threading
 from speech_recognition import Recognizer, Microphone
-from deep_translator import GoogleTranslator
 import pyttsx3
 
+from instrumentation import timed
+
 # Initialize pyttsx3 once (avoid re-init every call)
 engine = pyttsx3.init()
 engine.setProperty("rate", 160)  #speech speed
@@ -11,6 +14,7 @@ if len(voices) > 1:
     engine.setProperty("voice", voices[1].id)   #choose voice (0=male, 1=female depending on system)
 
 
+@timed("speech.recognize")
 def recognize_speech(language='en-US'):
     """Capture speech from microphone and convert to text."""
     recognizer = Recognizer()
@@ -24,15 +28,7 @@ def recognize_speech(language='en-US'):
             return ""
 
 
-def translate_text(text, src="auto", dest="en"):
-    """Translate text using Google Translator (deep-translator)."""
-    try:
-        return GoogleTranslator(source=src, target=dest).translate(text)
-    except Exception as e:
-        print(f"❌ Cannot translate: {e}")
-        return text
-
-
+@timed("tts")
 def speak_text(text, lang='en'):
     """Speak text aloud using pyttsx3 (offline)."""
     try:
@@ -40,3 +36,39 @@ def speak_text(text, lang='en'):
         engine.runAndWait()
     except Exception as e:
         logging.error(f"❌ Error in speak_text: {e}")
+
+
+class SpeechQueue:
+    """
+    Đọc lần lượt từng câu ở một thread riêng để UI không bị chặn khi đọc.
+    Câu đầu tiên được đọc ngay trong lúc các câu sau vẫn đang được sinh ra.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def say(self, text):
+        if not text or not text.strip():
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="speech", daemon=True)
+                self._thread.start()
+        self._queue.put(text)
+
+    def clear(self):
+        """Bỏ các câu chưa đọc (ví dụ khi tắt tiếng)."""
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+
+    def _run(self):
+        while True:
+            speak_text(self._queue.get())
+
+
+speech_queue = SpeechQueue()